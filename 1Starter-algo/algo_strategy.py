@@ -43,6 +43,8 @@ class AlgoStrategy(gamelib.AlgoCore):
         SP = 0
         # This is a good place to do initial setup
         self.scored_on_locations = []
+        # on_action_frame only looks at breaches, so skip decoding the other frames
+        self.register_action_frames(events=["breach"])
 
     def on_turn(self, turn_state):
         """
@@ -180,18 +182,16 @@ class AlgoStrategy(gamelib.AlgoCore):
     def least_damage_spawn_location(self, game_state, location_options):
         """
         This function will help us guess which location is the safest to spawn moving units from.
-        It gets the path the unit will take then checks locations on that path to 
-        estimate the path's damage risk.
+        It gets the path the unit will take then estimates how the scouts we can afford
+        would fare following it, frame by frame: most survivors first, then the latest
+        last death, then the least damage taken.
         """
         damages = []
+        scouts = [SCOUT] * max(1, game_state.number_affordable(SCOUT))
         # Get the damage estimate each path will take
         for location in location_options:
             path = game_state.find_path_to_edge(location)
-            damage = 0
-            for path_location in path:
-                # Get number of enemy turrets that can attack each location and multiply by turret damage
-                damage += len(game_state.get_attackers(path_location, 0)) * gamelib.GameUnit(TURRET, game_state.config).damage_i
-            damages.append(damage)
+            damages.append(game_state.estimate_path_damage(path, scouts).danger)
         
         # Now just return the location that takes the least damage
         return location_options[damages.index(min(damages))]
@@ -221,7 +221,7 @@ class AlgoStrategy(gamelib.AlgoCore):
         Full doc on format of a game frame at in json-docs.html in the root of the Starterkit.
         """
         # Let's record at what position we get scored on
-        state = json.loads(turn_string)
+        state = gamelib.decode_message(turn_string)
         events = state["events"]
         breaches = events["breach"]
         for breach in breaches:
@@ -16,14 +16,44 @@ Investigating it is useful for advanced players interested in getting data from
 The Navigation class in navigation.py contains functions related to pathfinding, which are used by GameState in pathing related functions. 
 Investigating it is useful for advanced player who want to optimize the slow default pathing algorithm we provide. \n 
 
-util.py contains a small handful of functions that help with communication, including the debug-printing function, debug_write().
+The StructureOverlay class in overlay.py layers hypothetical structures over a GameState, see GameState.create_overlay(). 
+Investigating it is useful for players who search over structure placements without copying the game state. \n
+
+The ActionSimulator class in simulator.py predicts an action phase frame by frame, see GameState.simulate_action_phase(). 
+Investigating it is useful for players who compare candidate turns by their outcome. \n
+
+The BatchSimulator class in batch.py simulates many candidate deployments in lockstep, using NumPy if it is installed, see GameState.simulate_deployments(). 
+It also estimates the damage a stack of units takes along a path, see GameState.estimate_path_damage(). 
+Investigating it is useful for players who try every spawn location and unit type each turn. \n
+
+The FidelityHarness class in fidelity.py compares simulated action phases with those recorded in .replay files, frame by frame. 
+Investigating it is useful for players who change a simulator and want to check it still matches the game engine. \n
+
+The ThreatMap class in threat.py records which cells each player's structures can attack and the damage they deal there, see GameState.get_threat_map(). 
+Investigating it is useful for players who estimate the damage units take along their paths. \n
+
+The TranspositionTable class in transposition.py is a bounded cache for results computed from a board state, usually keyed by GameMap.zobrist_hash. 
+Investigating it is useful for players who want to reuse expensive evaluations across turns or hypothetical states. \n
+
+The UnitTable class in unit_table.py stores the units of a turn column by column, see GameState.get_unit_table(). 
+Investigating it is useful for players who filter or total large numbers of units. \n
+
+The WorkerPool class in workers.py evaluates hypothetical turns in worker processes forked at the start of the game, within a deadline each turn. 
+Investigating it is useful for players who want to use every core for search, create it in on_game_start. \n
+
+board.py holds tables describing the board, such as the cells, their neighbours and the edges, computed once at import. 
+GameMap, GameState and the pathfinder use them instead of recomputing board geometry. \n
+
+util.py contains a small handful of functions that help with communication, including the debug-printing function, debug_write(), and decode_message() for reading messages from the game engine. 
+Debug output is buffered and written at the end of each turn, see set_debug_buffering().
 """
 
 from .algocore import AlgoCore
-from .util import debug_write
+from .util import debug_write, decode_message, set_debug_buffering
 from .game_state import GameState
 from .unit import GameUnit
 from .game_map import GameMap
+from .transposition import TranspositionTable
 
-__all__ = ["algocore", "game_state", "game_map", "navigation", "unit", "util"]
+__all__ = ["algocore", "batch", "board", "fidelity", "game_state", "game_map", "navigation", "overlay", "simulator", "threat", "transposition", "unit", "unit_table", "util", "workers"]
  
\ No newline at end of file
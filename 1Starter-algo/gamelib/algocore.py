@@ -1,7 +1,7 @@
 import json
 
 from .game_state import GameState
-from .util import get_command, debug_write, BANNER_TEXT, send_command
+from .util import get_command, debug_write, flush_debug, BANNER_TEXT, send_turn, EngineMessage, read_turn_info, has_event
 
 class AlgoCore(object):
     """
@@ -10,10 +10,12 @@ class AlgoCore(object):
 
     Attributes :
         * config (JSON): json object containing information about the game
+        * action_frame_rules (list): The (events, every) rules added by register_action_frames, None to receive every action frame
 
     """
     def __init__(self):
         self.config = None
+        self.action_frame_rules = None
 
     def on_game_start(self, config):
         """
@@ -27,12 +29,12 @@ class AlgoCore(object):
         """
         This step function is called at the start of each turn.
         It is passed the current game state, which can be used to initiate a new GameState object. 
+        The game state is an EngineMessage, a string that also carries its decoded JSON so GameState does not decode it again. 
         By default, it sends empty commands to the game engine. \n
         algo_strategy.py inherits from AlgoCore and overrides this on turn function. 
         Adjusting the on_turn function in algo_strategy is the main way to adjust your algo's logic. 
         """
-        send_command("[]")
-        send_command("[]")
+        send_turn([], [])
     
     def on_action_frame(self, action_frame_game_state):
         """
@@ -40,9 +42,42 @@ class AlgoCore(object):
         The action phase is made up of a sequence of distinct frames. 
         Each of these frames is sent to the algo in order. 
         They can be handled in this function. 
+        Each frame is an EngineMessage, use decode_message to read it without decoding it again. 
+        Use register_action_frames to only receive the frames you need. 
         """
         pass
 
+    def register_action_frames(self, events=None, every=None):
+        """
+        Asks for only some action frames to be passed to on_action_frame. \n
+        The others are skipped after reading their turnInfo, without decoding them. 
+        A frame is passed on if it has any of the given events, or if its frame number is a multiple of every. 
+        Each call adds to the frames already asked for. Set action_frame_rules to None to receive every frame again.
+
+        Args:
+            * events (list): Event names, such as ["breach", "death", "damage"]
+            * every (int): Also pass on every Nth frame, starting with the first
+
+        """
+        if self.action_frame_rules is None:
+            self.action_frame_rules = []
+        self.action_frame_rules.append((tuple(events or ()), every))
+
+    def _wants_action_frame(self, message, turn_info):
+        """
+        Checks an action frame against action_frame_rules using only the raw message.
+        """
+        if self.action_frame_rules is None:
+            return True
+        frame = turn_info[2] if len(turn_info) > 2 else 0
+        for events, every in self.action_frame_rules:
+            if every and frame % every == 0:
+                return True
+            for event in events:
+                if has_event(message, event):
+                    return True
+        return False
+
 
     def start(self):
         """ 
@@ -52,6 +87,7 @@ class AlgoCore(object):
         The algo continues this loop until it recieves the "End" turn message from the game.
         """
         debug_write(BANNER_TEXT)
+        flush_debug()
 
         while True:
             # Note: Python blocks and hangs on stdin. Can cause issues if connections aren't setup properly and may need to
@@ -64,7 +100,13 @@ class AlgoCore(object):
                 parsed_config = json.loads(game_state_string)
                 self.on_game_start(parsed_config)
             elif "turnInfo" in game_state_string:
+                if self.action_frame_rules is not None:
+                    turn_info = read_turn_info(game_state_string)
+                    if turn_info is not None and turn_info[0] == 1 and not self._wants_action_frame(game_state_string, turn_info):
+                        continue
                 state = json.loads(game_state_string)
+                # Decode once, the handlers and GameState read the decoded state from the message
+                game_state_string = EngineMessage(game_state_string, state)
                 stateType = int(state.get("turnInfo")[0])
                 if stateType == 0:
                     """
@@ -93,3 +135,6 @@ class AlgoCore(object):
                 Something is wrong? Received an incorrect or improperly formatted string.
                 """
                 debug_write("Got unexpected string : {}".format(game_state_string))
+            # Write out anything logged while handling the message, the engine is not waiting on us between messages
+            flush_debug()
+        flush_debug()
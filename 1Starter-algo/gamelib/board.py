@@ -0,0 +1,189 @@
+"""
+Static tables describing the diamond shaped game board, computed once at import.
+
+Cells are addressed either as (x, y) or by the flat index x * ARENA_SIZE + y, which is how
+the pathfinder and other array based code store per cell data. Edges are numbered like the
+GameMap constants: 0 top right, 1 top left, 2 bottom left, 3 bottom right.
+
+Attributes :
+    * ARENA_SIZE (int): The size of the arena
+    * HALF_ARENA (int): Half the size of the arena
+    * CELL_COUNT (int): The number of flat indices, ARENA_SIZE squared, including cells outside the diamond
+    * IN_BOUNDS (bytes): 1 at the flat index of every cell on the board
+    * CELLS (tuple): The (x, y) of all 420 cells on the board, in the order GameMap iterates them
+    * NEIGHBORS (list): For each flat index, the on board neighbours as (index, x, y) ordered up, down, right, left
+    * EDGES (tuple): The (x, y) cells of each edge, in the order of GameMap.get_edges
+    * EDGE_INDICES (tuple): The flat indices of each edge, in the same order
+    * EDGE_SETS (tuple): A frozenset of the flat indices of each edge
+    * EDGE_OF (dict): Maps the (x, y) of every edge cell to its edge
+    * CELL_EDGE (list): For each flat index, the edge the cell lies on or -1
+    * EDGE_DIRECTIONS (tuple): The [x, y] direction a unit heading for each edge moves in
+    * BOARD_BITS (int): A bitboard with the bit of every cell on the board set
+
+Bitboards are Python ints with bit x * ARENA_SIZE + y set for each cell (x, y) they contain, so set operations
+are the &, | and ^ operators and the helpers below.
+
+"""
+import math
+
+ARENA_SIZE = 28
+HALF_ARENA = ARENA_SIZE // 2
+CELL_COUNT = ARENA_SIZE * ARENA_SIZE
+
+
+def in_diamond(x, y):
+    """Checks if a coordinate is inside the diamond shaped board, for any numeric x and y.
+
+    Args:
+        x: The x coordinate
+        y: The y coordinate
+
+    Returns:
+        True if the location is on the board, False otherwise
+    """
+    if y < HALF_ARENA:
+        return HALF_ARENA - y - 1 <= x <= HALF_ARENA + y
+    return y - HALF_ARENA <= x <= ARENA_SIZE + HALF_ARENA - y - 1
+
+
+def _build_neighbors():
+    neighbors = [()] * CELL_COUNT
+    for x, y in CELLS:
+        adjacent = []
+        for nx, ny in ((x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y)):
+            if 0 <= nx < ARENA_SIZE and 0 <= ny < ARENA_SIZE and in_diamond(nx, ny):
+                adjacent.append((nx * ARENA_SIZE + ny, nx, ny))
+        neighbors[x * ARENA_SIZE + y] = tuple(adjacent)
+    return neighbors
+
+
+CELLS = tuple((x, y) for y in range(ARENA_SIZE) for x in range(ARENA_SIZE) if in_diamond(x, y))
+IN_BOUNDS = bytes(1 if in_diamond(index // ARENA_SIZE, index % ARENA_SIZE) else 0 for index in range(CELL_COUNT))
+NEIGHBORS = _build_neighbors()
+
+EDGES = (
+    tuple((HALF_ARENA + num, ARENA_SIZE - 1 - num) for num in range(HALF_ARENA)),
+    tuple((HALF_ARENA - 1 - num, ARENA_SIZE - 1 - num) for num in range(HALF_ARENA)),
+    tuple((HALF_ARENA - 1 - num, num) for num in range(HALF_ARENA)),
+    tuple((HALF_ARENA + num, num) for num in range(HALF_ARENA)),
+)
+EDGE_INDICES = tuple(tuple(x * ARENA_SIZE + y for x, y in edge) for edge in EDGES)
+EDGE_SETS = tuple(frozenset(edge) for edge in EDGE_INDICES)
+EDGE_OF = {cell: edge for edge, cells in enumerate(EDGES) for cell in cells}
+CELL_EDGE = [-1] * CELL_COUNT
+for _edge, _indices in enumerate(EDGE_INDICES):
+    for _index in _indices:
+        CELL_EDGE[_index] = _edge
+EDGE_DIRECTIONS = ([1, 1], [-1, 1], [-1, -1], [1, -1])
+BOARD_BITS = sum(1 << (x * ARENA_SIZE + y) for x, y in CELLS)
+# The bits of all cells with y < limit, used to stop shifted bits wrapping into the next column
+_ROWS_BELOW = [sum(1 << (x * ARENA_SIZE + y) for x in range(ARENA_SIZE) for y in range(limit)) for limit in range(ARENA_SIZE + 1)]
+
+
+def in_bounds(x, y):
+    """Checks if a coordinate is on the board, using the lookup table for integer coordinates.
+
+    Args:
+        x: The x coordinate
+        y: The y coordinate
+
+    Returns:
+        True if the location is on the board, False otherwise
+    """
+    if type(x) is int and type(y) is int:
+        return 0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE and IN_BOUNDS[x * ARENA_SIZE + y] == 1
+    return in_diamond(x, y)
+
+
+_STENCILS = {}
+
+
+def range_stencil(radius, hit_radius):
+    """Gets the offsets of every cell within range of a cell, built once per radius and hit radius.
+
+    A unit with a given range affects all locations whose centers are within that range plus the get hit radius.
+    The offsets are ordered like GameMap.get_locations_in_range, by x then by y.
+
+    Args:
+        radius: The radius of the search area
+        hit_radius: The getHitRadius of units, from the config
+
+    Returns:
+        A tuple of (dx, dy, dx * ARENA_SIZE + dy) offsets, including offsets that leave the board from some cells
+    """
+    key = (radius, hit_radius)
+    stencil = _STENCILS.get(key)
+    if stencil is None:
+        search_radius = math.ceil(radius)
+        offsets = range(-search_radius, search_radius + 1)
+        stencil = tuple((dx, dy, dx * ARENA_SIZE + dy) for dx in offsets for dy in offsets
+                        if math.sqrt(dx ** 2 + dy ** 2) < radius + hit_radius)
+        _STENCILS[key] = stencil
+    return stencil
+
+
+def popcount(bits):
+    """Counts the cells in a bitboard
+
+    Args:
+        bits: A bitboard
+
+    Returns:
+        The number of set bits
+    """
+    return bin(bits).count("1")
+
+
+def shift_bits(bits, dx, dy):
+    """Moves every cell of a bitboard by the same offset, dropping cells that leave the board
+
+    Args:
+        bits: A bitboard
+        dx: The change in x
+        dy: The change in y
+
+    Returns:
+        The shifted bitboard
+    """
+    if dy > 0:
+        bits &= _ROWS_BELOW[max(ARENA_SIZE - dy, 0)]
+    elif dy < 0:
+        bits &= ~_ROWS_BELOW[min(-dy, ARENA_SIZE)]
+    offset = dx * ARENA_SIZE + dy
+    bits = bits << offset if offset >= 0 else bits >> -offset
+    return bits & BOARD_BITS
+
+
+def bits_to_locations(bits):
+    """Lists the cells of a bitboard
+
+    Args:
+        bits: A bitboard
+
+    Returns:
+        The [x, y] locations of the set bits, sorted by x then y
+    """
+    locations = []
+    while bits:
+        lowest = bits & -bits
+        index = lowest.bit_length() - 1
+        locations.append([index // ARENA_SIZE, index % ARENA_SIZE])
+        bits ^= lowest
+    return locations
+
+
+def bits_to_mask(bits):
+    """Expands a bitboard into a byte per flat index, the blocked mask format of ShortestPathFinder
+
+    Args:
+        bits: A bitboard
+
+    Returns:
+        A bytearray of CELL_COUNT bytes, 1 where the bit is set
+    """
+    mask = bytearray(CELL_COUNT)
+    while bits:
+        lowest = bits & -bits
+        mask[lowest.bit_length() - 1] = 1
+        bits ^= lowest
+    return mask
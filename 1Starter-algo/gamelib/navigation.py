@@ -1,24 +1,109 @@
 import heapq
-import math
-import sys
-import queue
-from .util import debug_write
+from collections import deque
+from .util import debug_write, debug_write_raw
+from .board import ARENA_SIZE, HALF_ARENA, CELL_COUNT, CELLS, NEIGHBORS, EDGE_INDICES, CELL_EDGE, EDGE_DIRECTIONS, bits_to_mask, bits_to_locations, popcount
 
-class Node:
-    """A pathfinding node
+_CLEAR = bytes(CELL_COUNT)
+_UNSET = [-1] * CELL_COUNT
+
+
+class PocketIndex:
+    """The 'pockets' of a structure layout: groups of open cells a unit can walk between.
+
+    Built once per layout by ShortestPathFinder.get_pocket_index. Every open cell is labelled with
+    its pocket, and each pocket stores which edges it touches and the tile a unit would walk to and
+    self destruct on for each target edge it can not reach, so reachability questions are lookups.
+
+    Edges are numbered like GameMap: 0 top right, 1 top left, 2 bottom left, 3 bottom right.
 
     Attributes :
-        * visited_idealness (bool): Have we visited this node during the idealness search step?
-        * visited_validate (bool): Have we visited this node during the validation step?
-        * blocked (bool): Is there a structures at this node's location
-        * pathlength: The distance between this node and the target location
+        * labels (list): The pocket of each cell, indexed by x * 28 + y. -1 for blocked or out of bounds cells
+        * pocket_edges (list): For each pocket, a frozenset of the edges it touches
+        * self_destruct_tiles (list): For each pocket, the [x, y] tile a unit targeting each edge would self destruct on
 
     """
-    def __init__(self):
-        self.visited_idealness = False
-        self.visited_validate = False
-        self.blocked = False
-        self.pathlength = -1
+    def __init__(self, blocked):
+        """Labels the open cells of a layout
+
+        Args:
+            blocked: 784 bytes indexed by x * 28 + y, nonzero where a structure blocks the cell
+        """
+        labels = list(_UNSET)
+        self.labels = labels
+        self.pocket_edges = []
+        self.self_destruct_tiles = []
+
+        current = deque()
+        for x, y in CELLS:
+            start_index = x * ARENA_SIZE + y
+            if blocked[start_index] or labels[start_index] != -1:
+                continue
+            pocket = len(self.pocket_edges)
+            labels[start_index] = pocket
+            current.append(start_index)
+            edges = set()
+            # The best tile for a direction maximises 28 * y + x with both axes flipped to face the edge
+            best = [-1, -1, -1, -1]
+            best_tiles = [None, None, None, None]
+            while current:
+                index = current.popleft()
+                if CELL_EDGE[index] != -1:
+                    edges.add(CELL_EDGE[index])
+                cx, cy = index // ARENA_SIZE, index % ARENA_SIZE
+                for edge, direction in enumerate(EDGE_DIRECTIONS):
+                    idealness = 28 * (cy if direction[1] == 1 else 27 - cy) + (cx if direction[0] == 1 else 27 - cx)
+                    if idealness > best[edge]:
+                        best[edge] = idealness
+                        best_tiles[edge] = [cx, cy]
+                for neighbor, _, _ in NEIGHBORS[index]:
+                    if not blocked[neighbor] and labels[neighbor] == -1:
+                        labels[neighbor] = pocket
+                        current.append(neighbor)
+            self.pocket_edges.append(frozenset(edges))
+            self.self_destruct_tiles.append([None if edge in edges else best_tiles[edge] for edge in range(4)])
+
+    def get_pocket(self, location):
+        """Gets the pocket containing a location
+
+        Args:
+            location: The [x, y] location to look up
+
+        Returns:
+            The pocket id, or -1 if the location is blocked or out of bounds
+        """
+        x, y = int(location[0]), int(location[1])
+        if not (0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE):
+            return -1
+        return self.labels[x * ARENA_SIZE + y]
+
+    def can_reach_edge(self, location, edge):
+        """Checks if a unit at location can walk to any cell of the given edge
+
+        Args:
+            location: The [x, y] location of the unit
+            edge: The target edge, 0 to 3
+
+        Returns:
+            True if the edge is reachable, False if the unit would self destruct or the location is blocked
+        """
+        pocket = self.get_pocket(location)
+        return pocket != -1 and edge in self.pocket_edges[pocket]
+
+    def get_self_destruct_tile(self, location, edge):
+        """Gets the tile a unit at location would end its path on when it can not reach the edge
+
+        Args:
+            location: The [x, y] location of the unit
+            edge: The target edge, 0 to 3
+
+        Returns:
+            The [x, y] self destruct tile, or None if the edge is reachable or the location is blocked
+        """
+        pocket = self.get_pocket(location)
+        if pocket == -1:
+            return None
+        tile = self.self_destruct_tiles[pocket][edge]
+        return list(tile) if tile is not None else None
 
 """
 This class helps with pathfinding. We guarantee the results will
@@ -28,18 +113,40 @@ code to maximise time efficiency
 class ShortestPathFinder:
     """Handles pathfinding
 
+    Cells are stored in flat arrays indexed by x * 28 + y. The arrays are allocated
+    once and reused by every call, so a single finder can be kept for a whole turn.
+    Distance fields are kept between calls: one per target edge, shared by every start
+    that can reach that edge, plus one per sealed pocket. When a few structures are added
+    or removed the edge fields are repaired around the changed cells instead of recomputed.
+
     Attributes :
         * HORIZONTAL (int): A constant representing a horizontal movement
         * VERTICAL (int): A constant representing a vertical movement
 
         * game_state (:obj: GameState): The current gamestate
-        * game_map (:obj: GameMap): The current gamemap
+        * blocked (bytearray): 1 where a structure occupies the cell
+        * pathlength (list): The distance field used by the last query, -1 where unreached
+        * layout_key (int): The blocked cells as a bitboard, see gamelib.board. Usable as a cache key for the structure layout
+        * INCREMENTAL_UPDATE_LIMIT (int): The most cells becoming blocked or unblocked that sync_layout repairs before rebuilding from scratch
 
     """
+    INCREMENTAL_UPDATE_LIMIT = 16
+
     def __init__(self):
         self.HORIZONTAL = 1
         self.VERTICAL = 2
         self.initialized = False
+        self.game_state = None
+        self.layout_key = None
+        self._game_map = None
+        self._structure_version = None
+        self.blocked = bytearray(CELL_COUNT)
+        self.pathlength = list(_UNSET)
+        self._edge_fields = {}
+        self._pocket_fields = {}
+        self._pocket_index = None
+        self._visited = bytearray(CELL_COUNT)
+        self._queue = deque()
 
     def initialize_map(self, game_state):
         """Initializes the map
@@ -47,10 +154,247 @@ class ShortestPathFinder:
         Args:
             game_state: A GameState object representing the gamestate we want to traverse
         """
-        #Initialize map 
         self.initialized = True
         self.game_state = game_state
-        self.game_map = [[Node() for x in range(self.game_state.ARENA_SIZE)] for y in range(self.game_state.ARENA_SIZE)]
+        self.pathlength = list(_UNSET)
+        self._edge_fields = {}
+        self._pocket_fields = {}
+        self._pocket_index = None
+        game_map = game_state.game_map
+        self.blocked[:] = bits_to_mask(game_map.structure_bits)
+        self.layout_key = game_map.structure_bits
+        self._game_map = game_map
+        self._structure_version = game_map.structure_version
+
+    def sync_layout(self, game_state):
+        """Rebuilds the blocked cells if structures were added or removed since the last call
+
+        Args:
+            game_state: A GameState object representing the gamestate we want to traverse
+
+        Returns:
+            The layout_key of the current structure layout
+        """
+        game_map = game_state.game_map
+        if self._game_map is not game_map:
+            self.initialize_map(game_state)
+        elif self._structure_version != game_map.structure_version:
+            # Only cells that became blocked or unblocked matter, not upgrades or health changes
+            flipped = self.layout_key ^ game_map.structure_bits
+            if popcount(flipped) > self.INCREMENTAL_UPDATE_LIMIT:
+                self.initialize_map(game_state)
+                return self.layout_key
+            for location in bits_to_locations(flipped):
+                self.set_blocked(location, game_map.structure_bits >> (location[0] * ARENA_SIZE + location[1]) & 1)
+            self._structure_version = game_map.structure_version
+        self.game_state = game_state
+        return self.layout_key
+
+    def copy_from(self, other):
+        """Copies the layout and distance fields of another finder, so they can be changed with set_blocked
+        without affecting it
+
+        Args:
+            other: The ShortestPathFinder to copy
+        """
+        self.initialized = other.initialized
+        self.game_state = None
+        self._game_map = None
+        self.blocked[:] = other.blocked
+        self.layout_key = other.layout_key
+        self.pathlength = list(_UNSET)
+        self._edge_fields = {key: list(field) for key, field in other._edge_fields.items()}
+        self._pocket_fields = {key: [list(field) for field in fields] for key, fields in other._pocket_fields.items()}
+        self._pocket_index = other._pocket_index
+
+    def fork(self, game_state):
+        """Creates a finder for a GameState forked from the one this finder follows, see GameState.fork
+
+        The new finder starts from this finder's layout and distance fields if they are up to date,
+        and rebuilds from the forked map otherwise.
+
+        Args:
+            game_state: The forked GameState
+
+        Returns:
+            The new ShortestPathFinder
+        """
+        finder = ShortestPathFinder()
+        game_map = self._game_map
+        if game_map is not None and self._structure_version == game_map.structure_version:
+            finder.copy_from(self)
+            finder.game_state = game_state
+            finder._game_map = game_state.game_map
+            finder._structure_version = game_state.game_map.structure_version
+        return finder
+
+    def set_blocked(self, location, blocked):
+        """Blocks or unblocks a single cell, repairing the cached edge distance fields around it
+
+        Only the cells whose distance to the edge changes are visited. Fields of sealed pockets
+        are dropped, as the pockets themselves may have merged or split.
+
+        Args:
+            location: The [x, y] location that changed
+            blocked: True if a structure now occupies the location
+        """
+        index = int(location[0]) * ARENA_SIZE + int(location[1])
+        if bool(self.blocked[index]) == bool(blocked):
+            return
+        self.blocked[index] = 1 if blocked else 0
+        self.layout_key ^= 1 << index
+        self._pocket_fields = {}
+        self._pocket_index = None
+        for edge_key, field in self._edge_fields.items():
+            seeds = {x * ARENA_SIZE + y for x, y in edge_key}
+            if blocked:
+                self._repair_blocked(field, seeds, index)
+            else:
+                self._repair_unblocked(field, seeds, index)
+
+    def _repair_unblocked(self, field, seeds, index):
+        """
+        Lowers the pathlengths that can now route through the newly opened cell at index.
+        """
+        blocked = self.blocked
+        if index not in seeds:
+            best = -1
+            for neighbor, _, _ in NEIGHBORS[index]:
+                if not blocked[neighbor] and field[neighbor] != -1 and (best == -1 or field[neighbor] < best):
+                    best = field[neighbor]
+            if best == -1:
+                return
+            field[index] = best + 1
+
+        current = self._queue
+        current.append(index)
+        while current:
+            current_index = current.popleft()
+            next_pathlength = field[current_index] + 1
+            for neighbor, _, _ in NEIGHBORS[current_index]:
+                if blocked[neighbor] or neighbor in seeds:
+                    continue
+                if field[neighbor] == -1 or field[neighbor] > next_pathlength:
+                    field[neighbor] = next_pathlength
+                    current.append(neighbor)
+
+    def _repair_blocked(self, field, seeds, index):
+        """
+        Raises the pathlengths of cells whose every shortest route went through the newly blocked cell at index.
+        """
+        blocked = self.blocked
+        old_pathlength = field[index]
+        if index not in seeds:
+            field[index] = -1
+        if old_pathlength == -1:
+            return
+
+        # Find the cells left without a neighbour one step closer to the edge, nearest first,
+        # so that every possible support of a cell is decided before the cell itself.
+        affected = set()
+        current = self._queue
+        current.extend(neighbor for neighbor, _, _ in NEIGHBORS[index] if field[neighbor] == old_pathlength + 1)
+        while current:
+            current_index = current.popleft()
+            if current_index in affected or blocked[current_index] or current_index in seeds:
+                continue
+            pathlength = field[current_index]
+            supported = False
+            for neighbor, _, _ in NEIGHBORS[current_index]:
+                if field[neighbor] == pathlength - 1 and not blocked[neighbor] and neighbor not in affected:
+                    supported = True
+                    break
+            if supported:
+                continue
+            affected.add(current_index)
+            current.extend(neighbor for neighbor, _, _ in NEIGHBORS[current_index] if field[neighbor] == pathlength + 1)
+
+        # Settle the affected cells again from their unaffected neighbours
+        for affected_index in affected:
+            field[affected_index] = -1
+        frontier = []
+        for affected_index in affected:
+            best = -1
+            for neighbor, _, _ in NEIGHBORS[affected_index]:
+                if not blocked[neighbor] and field[neighbor] != -1 and (best == -1 or field[neighbor] < best):
+                    best = field[neighbor]
+            if best != -1:
+                frontier.append((best + 1, affected_index))
+        for pathlength, affected_index in frontier:
+            field[affected_index] = pathlength
+        heapq.heapify(frontier)
+        while frontier:
+            pathlength, current_index = heapq.heappop(frontier)
+            if field[current_index] != pathlength:
+                continue
+            for neighbor, _, _ in NEIGHBORS[current_index]:
+                if neighbor in affected and (field[neighbor] == -1 or field[neighbor] > pathlength + 1):
+                    field[neighbor] = pathlength + 1
+                    heapq.heappush(frontier, (pathlength + 1, neighbor))
+
+    def get_pocket_index(self):
+        """Gets the PocketIndex of the current layout, building it on first use after each layout change
+
+        Returns:
+            The PocketIndex of the loaded layout
+        """
+        if self._pocket_index is None:
+            self._pocket_index = PocketIndex(self.blocked)
+        return self._pocket_index
+
+    def find_cut_cells(self, start_points, edge):
+        """Finds the open cells whose blocking would stop units at start_points from reaching an edge
+
+        These are the articulation points of the open cells that separate a start from the edge,
+        found with a single depth first search rooted at a virtual cell joined to every edge cell.
+
+        Args:
+            * start_points: The starting locations of the units
+            * edge: The target edge, numbered like GameMap: 0 top right, 1 top left, 2 bottom left, 3 bottom right
+
+        Returns:
+            A set of flat indices x * 28 + y. A start is only included if it cuts off another start.
+        """
+        blocked = self.blocked
+        sink = CELL_COUNT
+        edge_cells = [index for index in EDGE_INDICES[edge] if not blocked[index]]
+        edge_set = set(edge_cells)
+
+        discovery = {sink: 0}
+        low = {sink: 0}
+        parent = {sink: None}
+        stack = [(sink, iter(edge_cells))]
+        while stack:
+            node, neighbors = stack[-1]
+            advanced = False
+            for neighbor in neighbors:
+                if neighbor not in discovery:
+                    discovery[neighbor] = low[neighbor] = len(discovery)
+                    parent[neighbor] = node
+                    adjacent = [index for index, _, _ in NEIGHBORS[neighbor] if not blocked[index]]
+                    if neighbor in edge_set:
+                        adjacent.append(sink)
+                    stack.append((neighbor, iter(adjacent)))
+                    advanced = True
+                    break
+                if neighbor != parent[node]:
+                    low[node] = min(low[node], discovery[neighbor])
+            if not advanced:
+                stack.pop()
+                if stack:
+                    low[stack[-1][0]] = min(low[stack[-1][0]], low[node])
+
+        cut_cells = set()
+        for start in start_points:
+            node = int(start[0]) * ARENA_SIZE + int(start[1])
+            if node not in discovery:
+                continue
+            # Walk up the search tree, a parent cuts the start off when its child's subtree can not climb above it
+            while parent[node] != sink:
+                if low[node] >= discovery[parent[node]]:
+                    cut_cells.add(parent[node])
+                node = parent[node]
+        return cut_cells
 
     def navigate_multiple_endpoints(self, start_point, end_points, game_state):
         """Finds the path a unit would take to reach a set of endpoints
@@ -68,58 +412,107 @@ class ShortestPathFinder:
         if game_state.contains_stationary_unit(start_point):
             return
 
-        #Initialize map 
-        self.initialize_map(game_state)
-        #Fill in walls
-        for location in self.game_state.game_map:
-            if self.game_state.contains_stationary_unit(location):
-                self.game_map[location[0]][location[1]].blocked = True
-        #Do pathfinding
-        ideal_endpoints = self._idealness_search(start_point, end_points)
-        self._validate(ideal_endpoints, end_points)
+        self.sync_layout(game_state)
+        return self.navigate(start_point, end_points)
+
+    def load_layout(self, blocked):
+        """Replaces the blocked cells with a mask that is not backed by a GameMap, such as a hypothetical layout
+
+        Args:
+            blocked: 784 bytes indexed by x * 28 + y, nonzero where a structure blocks the cell, or a bitboard such as GameMap.structure_bits
+        """
+        self.initialized = True
+        self.game_state = None
+        self._game_map = None
+        if isinstance(blocked, int):
+            self.blocked[:] = bits_to_mask(blocked)
+            self.layout_key = blocked
+        else:
+            self.blocked[:] = blocked
+            self.layout_key = sum(1 << index for index in range(CELL_COUNT) if self.blocked[index])
+        self.pathlength = list(_UNSET)
+        self._edge_fields = {}
+        self._pocket_fields = {}
+        self._pocket_index = None
+
+    def navigate(self, start_point, end_points):
+        """Finds the path a unit would take to reach a set of endpoints on the currently loaded layout
+
+        Args:
+            * start_point: The starting location of the unit, which must not be blocked
+            * end_points: The end points of the unit, should be a list of edge locations
+
+        Returns:
+            The path a unit at start_point would take when trying to reach end_points
+        """
+        self.pathlength = self._get_distance_field(start_point, end_points)
         return self._get_path(start_point, end_points)
 
+    def _get_distance_field(self, start, end_points):
+        """Gets the pathlengths towards the most ideal tile of start's pocket.
+
+        The field seeded from the edge does not depend on the start, so it is computed once per
+        edge and layout. Pockets that can not reach the edge get a field from their own ideal tile.
+        """
+        edge_key = tuple(tuple(location) for location in end_points)
+        field = self._edge_fields.get(edge_key)
+        if field is None:
+            field = self._validate(end_points[0], end_points)
+            self._edge_fields[edge_key] = field
+        start_index = int(start[0]) * ARENA_SIZE + int(start[1])
+        if field[start_index] != -1:
+            return field
+
+        pocket_fields = self._pocket_fields.setdefault(edge_key, [])
+        for field in pocket_fields:
+            if field[start_index] != -1:
+                return field
+        field = self._validate(self._idealness_search(start, end_points), end_points)
+        pocket_fields.append(field)
+        return field
+
     def _idealness_search(self, start, end_points):
         """
-        Finds the most ideal tile in our 'pocket' of pathable space. 
+        Finds the most ideal tile in our 'pocket' of pathable space.
         The edge if it is available, or the best self destruct location otherwise
         """
-        current = queue.Queue()
-        current.put(start)
-        best_idealness = self._get_idealness(start, end_points)
-        self.game_map[start[0]][start[1]].visited_idealness = True
-        most_ideal = start
-
-        while not current.empty():
-            search_location = current.get()
-            for neighbor in self._get_neighbors(search_location):
-                if not self.game_state.game_map.in_arena_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
-                    continue
-
-                x, y = neighbor
-                current_idealness = self._get_idealness(neighbor, end_points)
+        end_indices = {x * ARENA_SIZE + y for x, y in end_points}
+        start_index = int(start[0]) * ARENA_SIZE + int(start[1])
+        if start_index in end_indices:
+            return [int(start[0]), int(start[1])]
 
+        direction = self._get_direction_from_endpoints(end_points)
+        blocked = self.blocked
+        visited = self._visited
+        visited[:] = _CLEAR
+        visited[start_index] = 1
+        current = self._queue
+        current.append(start_index)
+        best_idealness = self._get_idealness(start_index // ARENA_SIZE, start_index % ARENA_SIZE, direction)
+        most_ideal = start_index
+
+        while current:
+            for neighbor, x, y in NEIGHBORS[current.popleft()]:
+                if blocked[neighbor] or visited[neighbor]:
+                    continue
+                # The first edge tile found can not be beaten, every edge tile is perfectly ideal
+                if neighbor in end_indices:
+                    current.clear()
+                    return [x, y]
+                current_idealness = self._get_idealness(x, y, direction)
                 if current_idealness > best_idealness:
                     best_idealness = current_idealness
                     most_ideal = neighbor
+                visited[neighbor] = 1
+                current.append(neighbor)
 
-                if not self.game_map[x][y].visited_idealness and not self.game_map[x][y].blocked:
-                    self.game_map[x][y].visited_idealness = True
-                    current.put(neighbor)
-
-        return most_ideal
-
-    def _get_neighbors(self, location):
-        """Get the locations adjacent to a location
-        """
-        x, y = location
-        return [[x, y + 1], [x, y - 1], [x + 1, y], [x - 1, y]]
+        return [most_ideal // ARENA_SIZE, most_ideal % ARENA_SIZE]
 
     def _get_direction_from_endpoints(self, end_points):
-        """Prints a message to the games debug output
+        """Gets the direction of an edge
 
         Args:
-            * end_points: A set of endpoints, should be an edge 
+            * end_points: A set of endpoints, should be an edge
 
         Returns:
             A direction [x,y] representing the edge. For example, [1,1] for the top right and [-1, 1] for the top left
@@ -128,131 +521,102 @@ class ShortestPathFinder:
         point = end_points[0]
         x, y = point
         direction = [1, 1]
-        if x < self.game_state.HALF_ARENA:
+        if x < HALF_ARENA:
            direction[0] = -1
-        if y < self.game_state.HALF_ARENA:
+        if y < HALF_ARENA:
             direction[1] = -1
         return direction
 
-    def _get_idealness(self, location, end_points):
-        """Get the idealness of a tile, the reachable tile the unit most wants to path to.
-        Better self destruct locations are more ideal. The endpoints are perfectly ideal. 
+    def _get_idealness(self, x, y, direction):
+        """Get the idealness of a tile that is not an endpoint, better self destruct locations are more ideal.
+        The endpoints themselves are perfectly ideal and handled by the caller.
 
         Returns:
-            A location the unit will attempt to reach
+            The idealness of the tile, higher is better
         """
-        if location in end_points:
-            return sys.maxsize
-
-        direction = self._get_direction_from_endpoints(end_points)
-
-        idealness = 0
-        if direction[1] == 1:
-            idealness += 28 * location[1]
-        else: 
-            idealness += 28 * (27 - location[1])
-        if direction[0] == 1:
-            idealness += location[0]
-        else: 
-            idealness += (27 - location[0])
-
+        idealness = 28 * y if direction[1] == 1 else 28 * (27 - y)
+        idealness += x if direction[0] == 1 else 27 - x
         return idealness
 
     def _validate(self, ideal_tile, end_points):
-        """Breadth first search of the grid, setting the pathlengths of each node
+        """Breadth first search of the grid, returning a new list with the pathlength of each cell
 
         """
-        #VALDIATION
-        #Add our most ideal tiles to current
-        current = queue.Queue()
+        pathlength = list(_UNSET)
+        blocked = self.blocked
+        current = self._queue
         if ideal_tile in end_points:
-            for location in end_points:
-               current.put(location)
-               #Set current pathlength to 0
-               self.game_map[location[0]][location[1]].pathlength = 0
-               self.game_map[location[0]][location[1]].visited_validate = True
+            for x, y in end_points:
+                index = x * ARENA_SIZE + y
+                pathlength[index] = 0
+                current.append(index)
         else:
-            current.put(ideal_tile)
-            self.game_map[ideal_tile[0]][ideal_tile[1]].pathlength = 0
-            self.game_map[ideal_tile[0]][ideal_tile[1]].visited_validate = True
-
-        #While current is not empty
-        while not current.empty():
-            current_location = current.get()
-            current_node = self.game_map[current_location[0]][current_location[1]]
-            for neighbor in self._get_neighbors(current_location):
-                if not self.game_state.game_map.in_arena_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
+            index = ideal_tile[0] * ARENA_SIZE + ideal_tile[1]
+            pathlength[index] = 0
+            current.append(index)
+
+        while current:
+            current_index = current.popleft()
+            # Blocked edge tiles are seeded with a pathlength of 0 but can not be walked through
+            if blocked[current_index]:
+                continue
+            next_pathlength = pathlength[current_index] + 1
+            for neighbor, _, _ in NEIGHBORS[current_index]:
+                if blocked[neighbor] or pathlength[neighbor] != -1:
                     continue
-
-                neighbor_node = self.game_map[neighbor[0]][neighbor[1]]
-                if not neighbor_node.visited_validate and not current_node.blocked:
-                    neighbor_node.pathlength = current_node.pathlength + 1
-                    neighbor_node.visited_validate = True
-                    current.put(neighbor)
-
-        #debug_write("Print after validate")
-        #self.print_map()
-        return
+                pathlength[neighbor] = next_pathlength
+                current.append(neighbor)
+        return pathlength
 
     def _get_path(self, start_point, end_points):
         """Once all nodes are validated, and a target is found, the unit can path to its target
 
         """
-        #GET THE PATH
         path = [start_point]
-        current = start_point
+        x, y = int(start_point[0]), int(start_point[1])
+        pathlength = self.pathlength
+        direction = self._get_direction_from_endpoints(end_points)
         move_direction = 0
 
-        while not self.game_map[current[0]][current[1]].pathlength == 0:
-            #debug_write("current tile {} has cost {}".format(current, self.game_map[current[0]][current[1]].pathlength))
-            next_move = self._choose_next_move(current, move_direction, end_points)
-            #debug_write(next_move)
-
-            if current[0] == next_move[0]:
+        while pathlength[x * ARENA_SIZE + y] != 0:
+            next_x, next_y = self._choose_next_move(x, y, move_direction, direction)
+            if x == next_x:
                 move_direction = self.VERTICAL
             else:
                 move_direction = self.HORIZONTAL
-            path.append(next_move)
-            current = next_move
-        
-        #debug_write(path)
+            path.append([next_x, next_y])
+            x, y = next_x, next_y
+
         return path
-  
-    def _choose_next_move(self, current_point, previous_move_direction, end_points):
+
+    def _choose_next_move(self, x, y, previous_move_direction, direction):
         """Given the current location and adjacent locations, return the best 'next step' for a given unit to take
         """
-        neighbors = self._get_neighbors(current_point)
-        #debug_write("Unit at {} previously moved {} and has these neighbors {}".format(current_point, previous_move_direction, neighbors))
-
+        pathlength = self.pathlength
+        blocked = self.blocked
+        current_point = (x, y)
         ideal_neighbor = current_point
-        best_pathlength = self.game_map[current_point[0]][current_point[1]].pathlength
-        for neighbor in neighbors:
-            #debug_write("Comparing champ {} and contender {}".format(ideal_neighbor, neighbor))
-            if not self.game_state.game_map.in_arena_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
+        best_pathlength = pathlength[x * ARENA_SIZE + y]
+        for neighbor, nx, ny in NEIGHBORS[x * ARENA_SIZE + y]:
+            if blocked[neighbor]:
                 continue
 
-            new_best = False
-            x, y = neighbor
-            current_pathlength = self.game_map[x][y].pathlength
+            current_pathlength = pathlength[neighbor]
 
             #Filter by pathlength
             if current_pathlength > best_pathlength:
                 continue
-            elif current_pathlength < best_pathlength:
-                #debug_write("Contender has better pathlength at {} vs champs {}".format(current_pathlength, best_pathlength))
-                new_best = True
 
             #Filter by direction based on prev move
-            if not new_best and not self._better_direction(current_point, neighbor, ideal_neighbor, previous_move_direction, end_points):
+            if current_pathlength == best_pathlength and not self._better_direction(current_point, (nx, ny), ideal_neighbor, previous_move_direction, direction):
                 continue
 
-            ideal_neighbor = neighbor
+            ideal_neighbor = (nx, ny)
             best_pathlength = current_pathlength
 
-        #debug_write("Gave unit at {} new tile {}".format(current_point, ideal_neighbor))
         return ideal_neighbor
 
-    def _better_direction(self, prev_tile, new_tile, prev_best, previous_move_direction, end_points):
+    def _better_direction(self, prev_tile, new_tile, prev_best, previous_move_direction, direction):
         """Compare two tiles and return True if the unit would rather move to the new one
 
         """
@@ -261,26 +625,24 @@ class ShortestPathFinder:
         if previous_move_direction == self.HORIZONTAL and not new_tile[0] == prev_best[0]:
             #We want to go up now. If we have not changed our y, we are not going up
             if prev_tile[1] == new_tile[1]:
-                return False 
+                return False
             return True
         if previous_move_direction == self.VERTICAL and not new_tile[1] == prev_best[1]:
             if prev_tile[0] == new_tile[0]:
-                #debug_write("contender {} has the same x coord as prev tile {} so we will keep best move {}".format(new_tile, prev_tile, prev_best))
                 return False
             return True
-        if previous_move_direction == 0: 
-            if prev_tile[1] == new_tile[1]: 
+        if previous_move_direction == 0:
+            if prev_tile[1] == new_tile[1]:
                 return False
             return True
-        
-        #To make it here, both moves are on the same axis 
-        direction = self._get_direction_from_endpoints(end_points)
+
+        #To make it here, both moves are on the same axis
         if new_tile[1] == prev_best[1]: #If they both moved horizontal...
             if direction[0] == 1 and new_tile[0] > prev_best[0]: #If we moved right and right is our direction, we moved towards our direction
-                return True 
+                return True
             if direction[0] == -1 and new_tile[0] < prev_best[0]: #If we moved left and left is our direction, we moved towards our direction
-                return True 
-            return False 
+                return True
+            return False
         if new_tile[0] == prev_best[0]: #If they both moved vertical...
             if direction[1] == 1 and new_tile[1] > prev_best[1]: #If we moved up and up is our direction, we moved towards our direction
                 return True
@@ -299,11 +661,11 @@ class ShortestPathFinder:
 
         for y in range(28):
             for x in range(28):
-                node = self.game_map[x][28 - y - 1]
-                if not node.blocked and not node.pathlength == -1:
-                    self._print_justified(node.pathlength)
+                index = x * ARENA_SIZE + 28 - y - 1
+                if not self.blocked[index] and not self.pathlength[index] == -1:
+                    self._print_justified(self.pathlength[index])
                 else:
-                    sys.stderr.write("   ")
+                    debug_write_raw("   ")
             debug_write("")
 
     def _print_justified(self, number):
@@ -311,6 +673,6 @@ class ShortestPathFinder:
 
         """
         if number < 10 and number > -1:
-            sys.stderr.write(" ")
-        sys.stderr.write(str(number))
-        sys.stderr.write(" ")
+            debug_write_raw(" ")
+        debug_write_raw(str(number))
+        debug_write_raw(" ")
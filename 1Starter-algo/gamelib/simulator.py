@@ -0,0 +1,515 @@
+from .board import ARENA_SIZE, HALF_ARENA, EDGE_SETS, in_bounds, bits_to_locations, range_stencil
+from .unit import GameUnit, get_prototype
+
+
+class SimulatedUnit:
+    """A unit taking part in a simulated action phase.
+
+    The simulation changes these instead of the GameUnits on the map, so the GameState it starts from is left as it was.
+
+    Attributes :
+        * unit_type (string): This unit's type
+        * player_index (integer): The player that controls this unit. 0 for you, 1 for your opponent.
+        * x (integer): The x coordinate of the unit
+        * y (integer): The y coordinate of the unit
+        * health (float): The current health of this unit, shields included
+        * prototype (:obj: UnitPrototype): The stats of this unit, see GameUnit
+        * pending_removal (boolean): If this structure is removed at the end of the action phase
+        * moves (integer): The number of steps this mobile unit has taken
+        * target_edge (integer): The edge this mobile unit is heading for
+        * unit_id (string): The engine's id for this unit, if known, see ActionSimulator.simulate_frames
+
+    """
+    __slots__ = ("unit_type", "player_index", "x", "y", "health", "prototype", "pending_removal", "stationary", "speed",
+                 "damage_f", "damage_i", "attack_reach", "order", "moves", "progress", "target_edge", "path", "path_index",
+                 "path_version", "shielded_by", "finished", "unit_id")
+
+    def __init__(self, prototype, player_index, x, y, health, order, hit_radius):
+        self.unit_type = prototype.unit_type
+        self.player_index = player_index
+        self.x = x
+        self.y = y
+        self.health = health
+        self.pending_removal = False
+        self.order = order
+        self.moves = 0
+        self.progress = 0
+        self.target_edge = None
+        self.path = None
+        self.path_index = 0
+        self.path_version = -1
+        self.shielded_by = set()
+        self.finished = False
+        self.unit_id = None
+        self.set_prototype(prototype, hit_radius)
+
+    def set_prototype(self, prototype, hit_radius):
+        self.prototype = prototype
+        self.stationary = prototype.stationary
+        self.speed = prototype.speed
+        self.damage_f = prototype.damage_f
+        self.damage_i = prototype.damage_i
+        # Squared, and with the hit radius added, to match GameMap.get_locations_in_range
+        self.attack_reach = (prototype.attackRange + hit_radius) ** 2
+
+    def __repr__(self):
+        owner = "Friendly" if self.player_index == 0 else "Enemy"
+        return "{} simulated {}, health: {} location: {}".format(owner, self.unit_type, self.health, [self.x, self.y])
+
+
+class SimulationResult:
+    """The outcome of a simulated action phase, see ActionSimulator.simulate.
+
+    Attributes :
+        * game_state (:obj: GameState): A fork of the simulated GameState as it stands after the action phase
+        * frames (int): The number of frames the action phase lasted
+        * health ([float, float]): Each player's health after the action phase, yours first
+        * resources ([[float, float], [float, float]]): Each player's [SP, MP] after the action phase, yours first
+        * breaches (list): (unit_type, player_index, [x, y], frame) for every unit that scored
+        * self_destructs (list): (unit_type, player_index, [x, y], frame) for every unit that self destructed
+        * destroyed (list): (unit_type, player_index, [x, y], frame) for every unit killed by damage
+        * removed (list): (unit_type, player_index, [x, y], refund) for every structure removed by its owner
+        * structure_damage ([float, float]): The damage taken by each player's structures
+        * damage_dealt ([float, float]): The health each player's breaches took from the other player
+        * units_lost ([int, int]): The number of each player's mobile units that did not score
+
+    """
+    def __init__(self, game_state, health, resources):
+        self.game_state = game_state
+        self.frames = 0
+        self.health = health
+        self.resources = resources
+        self.breaches = []
+        self.self_destructs = []
+        self.destroyed = []
+        self.removed = []
+        self.structure_damage = [0.0, 0.0]
+        self.damage_dealt = [0.0, 0.0]
+        self.units_lost = [0, 0]
+
+
+class FrameRecord:
+    """The units on the board at the end of one frame of an action phase, see ActionSimulator.simulate_frames.
+
+    Attributes :
+        * frame (int): The number of the frame, 0 being the frame units spawn on
+        * mobiles (dict): (unit_type, player_index, x, y, health) of every mobile unit on the board, by unit id
+        * structures (dict): (unit_type, player_index, health) of every structure on the board, by (x, y)
+        * breaches (set): The ids of the mobile units that scored during this frame
+
+    """
+    def __init__(self, frame):
+        self.frame = frame
+        self.mobiles = {}
+        self.structures = {}
+        self.breaches = set()
+
+
+class ActionSimulator:
+    """Steps through an action phase frame by frame to predict what a turn's builds and deployments will do.
+
+    Each frame, in order:
+        1. Mobile units move along their paths, every 1/speed frames. A unit reaching its target edge scores,
+           a unit that can go no further self destructs, damaging nearby enemies if it took selfDestructStepsRequired steps.
+        2. Structures with a shield give it once to each friendly mobile unit in shieldRange,
+           shieldPerUnit plus shieldBonusPerY for every row the structure is from its owner's side of the board.
+        3. Every unit attacks the target GameState.get_target would choose, mobile units first in the order they were deployed,
+           then structures. Units killed earlier in the frame cannot attack or be attacked.
+        4. Destroyed units are removed, and mobile units re-path if a structure was destroyed.
+
+    Once no mobile units remain, structures marked for removal are removed, refunding refundPercentage of their cost
+    in proportion to their remaining health. All stats come from the config.
+
+    Paths are found with the pathfinder of a fork of the GameState, so repeated simulations of the same
+    layout reuse its cached paths, see GameState.find_path_to_edge.
+
+    Attributes :
+        * config (JSON): Contains information about the game
+        * MAX_FRAMES (int): The longest action phase simulated, as a guard against units that never finish
+
+    """
+    MAX_FRAMES = 1000
+
+    def __init__(self, config):
+        """ Reads the unit stats used by the simulation from the config
+
+        Args:
+            * config (JSON): Contains information about the game
+
+        """
+        self.config = config
+        unit_information = config["unitInformation"]
+        self._remove = unit_information[6]["shorthand"]
+        self._upgrade = unit_information[7]["shorthand"]
+        self._hit_radius = unit_information[0].get("getHitRadius", 0)
+        breach_reward = config.get("resources", {}).get("coresForPlayerDamage", 1)
+        self._type_info = {}
+        for type_config in unit_information:
+            if "unitCategory" not in type_config:
+                continue
+            self._type_info[type_config["shorthand"]] = {
+                "breach_damage": type_config.get("playerBreachDamage", 1),
+                "breach_reward": type_config.get("metalForBreach", breach_reward),
+                "self_destruct_steps": type_config.get("selfDestructStepsRequired", 5),
+                "self_destruct_range": type_config.get("selfDestructRange", 0),
+                "self_destruct_mobile": type_config.get("selfDestructDamageWalker", 0),
+                "self_destruct_stationary": type_config.get("selfDestructDamageTower", 0),
+                "refund": type_config.get("refundPercentage", 0),
+                "upgrade_cost": type_config.get("upgrade", {}).get("cost1", type_config.get("cost1", 0)),
+            }
+
+    def simulate(self, game_state, build_stacks=None, deploy_stacks=None):
+        """Simulates the action phase that follows a build and deploy phase
+
+        Structures and mobile units already on game_state's map take part as they are, so a GameState
+        after your attempt_spawn and attempt_upgrade calls only needs the enemy's stacks. Stack entries that
+        are blocked, out of the player's territory or cannot be afforded are skipped, like the game does.
+
+        Args:
+            * game_state (:obj: GameState): The state at the start of the action phase. It is not changed.
+            * build_stacks: For each player, a list of (unit_type, x, y) structures, upgrades and removals to apply first
+            * deploy_stacks: For each player, a list of (unit_type, x, y) mobile units to deploy
+
+        Returns:
+            A SimulationResult
+        """
+        state, structures, mobiles, result = self.__setup(game_state, build_stacks, deploy_stacks)
+        for _ in self.__run(state, structures, mobiles, result):
+            pass
+        self.__finish(state, structures, result)
+        return result
+
+    def simulate_frames(self, game_state, spawns=None):
+        """Simulates an action phase from its first frame, recording the board after every frame
+
+        This is the interface FidelityHarness compares with replays. Structures marked for removal stay on the board,
+        as their removal happens after the last frame.
+
+        Args:
+            * game_state (:obj: GameState): The state at frame 0 of the action phase, with the units that spawned on its map
+            * spawns: (unit_id, unit_type, player_index, [x, y]) of the mobile units on the map, in the order they spawned.
+              Units take these ids in the records, and act in this order.
+
+        Returns:
+            A generator of FrameRecords, starting with frame 0
+        """
+        state, structures, mobiles, result = self.__setup(game_state, None, None)
+        unclaimed = {}
+        for unit in mobiles:
+            unclaimed.setdefault((unit.unit_type, unit.player_index, unit.x, unit.y), []).append(unit)
+        for order, (unit_id, unit_type, player_index, location) in enumerate(spawns or []):
+            units = unclaimed.get((unit_type, player_index, location[0], location[1]))
+            if units:
+                unit = units.pop(0)
+                unit.unit_id = unit_id
+                unit.order = order - len(spawns)
+        mobiles.sort(key=lambda unit: unit.order)
+
+        yield self.__record(0, structures, mobiles, [])
+        for frame, remaining, scored in self.__run(state, structures, mobiles, result):
+            yield self.__record(frame, structures, remaining, scored)
+
+    def __record(self, frame, structures, mobiles, scored):
+        """
+        Copies the simulated units into a FrameRecord.
+        """
+        record = FrameRecord(frame)
+        for unit in mobiles:
+            unit_id = unit.unit_id if unit.unit_id is not None else "#{}".format(unit.order)
+            record.mobiles[unit_id] = (unit.unit_type, unit.player_index, unit.x, unit.y, unit.health)
+        for structure in structures.values():
+            record.structures[(structure.x, structure.y)] = (structure.unit_type, structure.player_index, structure.health)
+        for unit in scored:
+            record.breaches.add(unit.unit_id if unit.unit_id is not None else "#{}".format(unit.order))
+        return record
+
+    def __setup(self, game_state, build_stacks, deploy_stacks):
+        """
+        Forks the state, applies the stacks and collects the units taking part.
+        """
+        state = game_state.fork()
+        state.suppress_warnings(True)
+        game_map = state.game_map
+        resources = [state.get_resources(0), state.get_resources(1)]
+        result = SimulationResult(state, [state.my_health, state.enemy_health], resources)
+        hit_radius = self._hit_radius
+        config = self.config
+
+        structures = {}
+        mobiles = []
+        order = 0
+        for location in bits_to_locations(game_map.get_occupied_bits()):
+            units = game_map[location]
+            if any(not unit.stationary for unit in units):
+                # Mobile units are simulated off the map, any structure sharing their cell stays
+                game_map[location[0], location[1]] = [unit for unit in units if unit.stationary]
+            for unit in units:
+                order += 1
+                simulated = SimulatedUnit(unit.prototype, unit.player_index, unit.x, unit.y, unit.health, order, hit_radius)
+                if unit.stationary:
+                    simulated.pending_removal = unit.pending_removal
+                    structures[unit.x * ARENA_SIZE + unit.y] = simulated
+                else:
+                    mobiles.append(simulated)
+
+        for player_index, stack in enumerate(build_stacks or []):
+            for unit_type, x, y in stack or []:
+                order += 1
+                self.__build(state, structures, resources[player_index], player_index, unit_type, x, y, order)
+        deploy_cells = (EDGE_SETS[2] | EDGE_SETS[3], EDGE_SETS[0] | EDGE_SETS[1])
+        for player_index, stack in enumerate(deploy_stacks or []):
+            for unit_type, x, y in stack or []:
+                cost = get_prototype(unit_type, config).cost
+                index = x * ARENA_SIZE + y
+                if index not in deploy_cells[player_index] or index in structures or resources[player_index][0] < cost[0] or resources[player_index][1] < cost[1]:
+                    continue
+                resources[player_index][0] -= cost[0]
+                resources[player_index][1] -= cost[1]
+                order += 1
+                mobiles.append(SimulatedUnit(get_prototype(unit_type, config), player_index, x, y, None, order, hit_radius))
+
+        for unit in mobiles:
+            if not unit.health:
+                unit.health = unit.prototype.max_health
+            unit.target_edge = state.get_target_edge([unit.x, unit.y])
+        mobiles.sort(key=lambda unit: unit.order)
+        return state, structures, mobiles, result
+
+    def __finish(self, state, structures, result):
+        """
+        Removes the structures marked for removal and writes the outcome back to the forked state.
+        """
+        game_map = state.game_map
+        resources = result.resources
+        # Structures marked for removal go once the action phase is over
+        for index, structure in sorted(structures.items()):
+            if structure.pending_removal:
+                info = self._type_info[structure.unit_type]
+                refund = info["refund"] * structure.prototype.cost[0] * min(1, structure.health / structure.prototype.max_health)
+                resources[structure.player_index][0] += refund
+                result.removed.append((structure.unit_type, structure.player_index, [structure.x, structure.y], refund))
+                game_map.remove_unit([structure.x, structure.y])
+                del structures[index]
+
+        # Bring the map in the result up to date with the surviving structures' health
+        for structure in structures.values():
+            location = [structure.x, structure.y]
+            units = game_map[location]
+            if units and units[0].health != structure.health:
+                unit = GameUnit(structure.unit_type, self.config, structure.player_index, structure.health, structure.x, structure.y)
+                if structure.prototype.upgraded:
+                    unit.upgrade()
+                unit.pending_removal = structure.pending_removal
+                game_map.remove_unit(location)
+                game_map.place_unit(unit)
+
+        state.my_health, state.enemy_health = result.health
+        for player_index in range(2):
+            state._player_resources[player_index] = {'SP': resources[player_index][0], 'MP': resources[player_index][1]}
+
+    def __build(self, state, structures, resources, player_index, unit_type, x, y, order):
+        """
+        Applies one entry of a build stack to the simulated structures and the forked map.
+        """
+        index = x * ARENA_SIZE + y
+        structure = structures.get(index)
+        if unit_type == self._remove:
+            if structure is not None and structure.player_index == player_index:
+                structure.pending_removal = True
+        elif unit_type == self._upgrade:
+            if structure is None or structure.player_index != player_index or structure.prototype.upgraded:
+                return
+            cost = self._type_info[structure.unit_type]["upgrade_cost"]
+            if resources[0] < cost:
+                return
+            resources[0] -= cost
+            state.game_map.upgrade_unit([x, y])
+            structure.set_prototype(structure.prototype.upgrade, self._hit_radius)
+        else:
+            prototype = get_prototype(unit_type, self.config)
+            if structure is not None or not in_bounds(x, y) or (y < HALF_ARENA) != (player_index == 0) or resources[0] < prototype.cost[0] or resources[1] < prototype.cost[1]:
+                return
+            resources[0] -= prototype.cost[0]
+            resources[1] -= prototype.cost[1]
+            state.game_map.add_unit(unit_type, [x, y], player_index)
+            structures[index] = SimulatedUnit(prototype, player_index, x, y, prototype.max_health, order, self._hit_radius)
+
+    def __run(self, state, structures, mobiles, result):
+        """
+        Steps frames until no mobile units remain, yielding the frame, the mobile units left and those that scored after each.
+        """
+        hit_radius = self._hit_radius
+        type_info = self._type_info
+        health = result.health
+        resources = result.resources
+        layout_version = 0
+        in_range_cache = {}
+        structure_order = None
+        frame = 0
+
+        while mobiles and frame < self.MAX_FRAMES:
+            frame += 1
+            destroyed_structures = []
+            scored = []
+
+            # Movement, scoring and self destructs
+            for unit in mobiles:
+                if unit.health <= 0 or unit.finished:
+                    continue
+                unit.progress += unit.speed
+                if unit.progress < 1 - 1e-9:
+                    continue
+                unit.progress -= 1
+                if unit.path_version != layout_version:
+                    # A unit standing on a structure's cell has no path, and stays where it is
+                    unit.path = state.find_path_to_edge([unit.x, unit.y], unit.target_edge) or [[unit.x, unit.y]]
+                    unit.path_index = 0
+                    unit.path_version = layout_version
+                if unit.path_index + 1 < len(unit.path):
+                    unit.path_index += 1
+                    unit.x, unit.y = unit.path[unit.path_index]
+                    unit.moves += 1
+                    if unit.x * ARENA_SIZE + unit.y in EDGE_SETS[unit.target_edge]:
+                        info = type_info[unit.unit_type]
+                        health[1 - unit.player_index] -= info["breach_damage"]
+                        result.damage_dealt[unit.player_index] += info["breach_damage"]
+                        resources[unit.player_index][0] += info["breach_reward"]
+                        result.breaches.append((unit.unit_type, unit.player_index, [unit.x, unit.y], frame))
+                        unit.finished = True
+                        scored.append(unit)
+                else:
+                    info = type_info[unit.unit_type]
+                    if unit.moves >= info["self_destruct_steps"]:
+                        self.__self_destruct(unit, info, structures, mobiles, destroyed_structures, result)
+                    result.self_destructs.append((unit.unit_type, unit.player_index, [unit.x, unit.y], frame))
+                    result.units_lost[unit.player_index] += 1
+                    unit.finished = True
+
+            # Shielding
+            for structure in structures.values():
+                prototype = structure.prototype
+                if structure.health <= 0 or prototype.shieldRange <= 0 or (prototype.shieldPerUnit <= 0 and prototype.shieldBonusPerY <= 0):
+                    continue
+                reach = (prototype.shieldRange + hit_radius) ** 2
+                rows = structure.y if structure.player_index == 0 else ARENA_SIZE - 1 - structure.y
+                amount = prototype.shieldPerUnit + prototype.shieldBonusPerY * rows
+                key = structure.x * ARENA_SIZE + structure.y
+                for unit in mobiles:
+                    if (unit.player_index == structure.player_index and unit.health > 0 and not unit.finished and key not in unit.shielded_by
+                            and (unit.x - structure.x) ** 2 + (unit.y - structure.y) ** 2 < reach):
+                        unit.health += amount
+                        unit.shielded_by.add(key)
+
+            # Attacks
+            cells = ({}, {})
+            for unit in mobiles:
+                if unit.health > 0 and not unit.finished:
+                    cells[unit.player_index].setdefault(unit.x * ARENA_SIZE + unit.y, []).append(unit)
+            if structure_order is None:
+                structure_order = sorted(structures.values(), key=lambda structure: structure.order)
+            for attacker in mobiles + structure_order:
+                if attacker.health <= 0 or attacker.finished or (attacker.damage_i <= 0 and attacker.damage_f <= 0):
+                    continue
+                target = None
+                if attacker.damage_i > 0:
+                    target = self.__choose_target(attacker, self.__mobiles_in_range(attacker, cells[1 - attacker.player_index]))
+                if target is None and attacker.damage_f > 0:
+                    cache_key = (attacker.x, attacker.y, attacker.attack_reach, attacker.player_index, layout_version)
+                    candidates = in_range_cache.get(cache_key)
+                    if candidates is None:
+                        candidates = in_range_cache[cache_key] = self.__structures_in_range(attacker, structures)
+                    target = self.__choose_target(attacker, candidates)
+                if target is None:
+                    continue
+                if target.stationary:
+                    target.health -= attacker.damage_f
+                    result.structure_damage[target.player_index] += attacker.damage_f
+                    if target.health <= 0:
+                        destroyed_structures.append(target)
+                else:
+                    target.health -= attacker.damage_i
+
+            # Removing destroyed units
+            for structure in destroyed_structures:
+                index = structure.x * ARENA_SIZE + structure.y
+                if structures.get(index) is structure:
+                    del structures[index]
+                    state.game_map.remove_unit([structure.x, structure.y])
+                    result.destroyed.append((structure.unit_type, structure.player_index, [structure.x, structure.y], frame))
+                    layout_version += 1
+                    structure_order = None
+            remaining = []
+            for unit in mobiles:
+                if unit.finished:
+                    continue
+                if unit.health > 0:
+                    remaining.append(unit)
+                else:
+                    result.destroyed.append((unit.unit_type, unit.player_index, [unit.x, unit.y], frame))
+                    result.units_lost[unit.player_index] += 1
+            mobiles = remaining
+            if len(in_range_cache) > 4096:
+                in_range_cache.clear()
+            result.frames = frame
+            yield frame, mobiles, scored
+
+    def __self_destruct(self, unit, info, structures, mobiles, destroyed_structures, result):
+        """
+        Damages the enemies around a unit that self destructs.
+        """
+        reach = (info["self_destruct_range"] + self._hit_radius) ** 2
+        for other in mobiles:
+            if other.player_index != unit.player_index and other.health > 0 and not other.finished and (other.x - unit.x) ** 2 + (other.y - unit.y) ** 2 < reach:
+                other.health -= info["self_destruct_mobile"]
+        for dx, dy, offset in range_stencil(info["self_destruct_range"], self._hit_radius):
+            structure = structures.get(unit.x * ARENA_SIZE + unit.y + offset) if 0 <= unit.y + dy < ARENA_SIZE else None
+            if structure is not None and structure.player_index != unit.player_index and structure.health > 0:
+                structure.health -= info["self_destruct_stationary"]
+                result.structure_damage[structure.player_index] += info["self_destruct_stationary"]
+                if structure.health <= 0:
+                    destroyed_structures.append(structure)
+
+    def __mobiles_in_range(self, attacker, cells):
+        """
+        Gets the enemy mobile units an attacker can reach, from the cells the enemy's units occupy.
+        """
+        candidates = []
+        for index, units in cells.items():
+            dx = index // ARENA_SIZE - attacker.x
+            dy = index % ARENA_SIZE - attacker.y
+            if dx * dx + dy * dy < attacker.attack_reach:
+                candidates.extend(units)
+        return candidates
+
+    def __structures_in_range(self, attacker, structures):
+        """
+        Gets the enemy structures an attacker can reach.
+        """
+        candidates = []
+        reach = attacker.attack_reach
+        for structure in structures.values():
+            if structure.player_index != attacker.player_index:
+                dx = structure.x - attacker.x
+                dy = structure.y - attacker.y
+                if dx * dx + dy * dy < reach:
+                    candidates.append(structure)
+        return candidates
+
+    def __choose_target(self, attacker, candidates):
+        """
+        Picks a target like GameState.get_target: nearest, then lowest health, then closest to the attacker's
+        side of the board, then furthest from the center column.
+        """
+        target = None
+        best = None
+        for unit in candidates:
+            if unit.health <= 0:
+                continue
+            dx = unit.x - attacker.x
+            dy = unit.y - attacker.y
+            key = (dx * dx + dy * dy, unit.health, unit.y if attacker.player_index == 0 else -unit.y,
+                   -abs(HALF_ARENA - 0.5 - unit.x), unit.x, unit.y, unit.order)
+            if best is None or key < best:
+                best = key
+                target = unit
+        return target
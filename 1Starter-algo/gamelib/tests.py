@@ -1,7 +1,25 @@
 import unittest
 import json
+import io
+import sys
+import os
+import tempfile
+import copy
+import time
 from .game_state import GameState
 from .unit import GameUnit
+from .board import popcount, shift_bits, bits_to_locations
+from .transposition import TranspositionTable
+from .util import EngineMessage, decode_message, read_turn_info, has_event, encode_turn, debug_write, flush_debug, set_debug_buffering
+from .algocore import AlgoCore
+from .fidelity import FidelityHarness
+from .workers import WorkerPool, simulate_action_phase, path_damage
+from .game_map import _ZOBRIST_KEYS
+from . import batch
+
+def sleep_task(game_state, seconds):
+    time.sleep(seconds)
+    return seconds
 
 class BasicTests(unittest.TestCase):
 
@@ -239,6 +257,347 @@ class BasicTests(unittest.TestCase):
         game = self.make_turn_0_map()
         self.assertEqual(1, len(game.game_map.get_locations_in_range([13,13], 0)), "We should be in 0 range of ourself")
         self.assertEqual(37, len(game.game_map.get_locations_in_range([13,13], 3.5)), "Wrong number of tiles in range")
+        self.assertEqual(5, len(game.game_map.get_locations_in_range([13,0], 1.5)), "Tiles off the board should not be in range")
+
+    def test_locations_in_range_formats(self):
+        game = self.make_turn_0_map()
+        game_map = game.game_map
+        locations = game_map.get_locations_in_range([13,13], 2.5)
+        self.assertEqual([tuple(location) for location in locations], game_map.get_locations_in_range([13,13], 2.5, "tuple"), "Tuples should match the default lists")
+        self.assertEqual([x * 28 + y for x, y in locations], game_map.get_locations_in_range([13,13], 2.5, "index"), "Indices should match the default lists")
+        self.assertEqual(locations, game_map.get_locations_in_range([13.0,13.0], 2.5), "Float locations should give the same tiles")
+
+    def test_board_tables(self):
+        game = self.make_turn_0_map()
+        game_map = game.game_map
+        locations = list(game_map)
+        self.assertEqual(420, len(locations), "The board should have 420 cells")
+        self.assertEqual([[13, 0], [14, 0], [12, 1]], locations[:3], "The map should be iterated row by row")
+        self.assertEqual([14, 27], locations[-1], "The last cell of the map should be [14, 27]")
+        self.assertEqual(True, game_map.in_arena_bounds([13.5, 0.5]), "Fractional locations inside the board should be in bounds")
+        self.assertEqual(False, game_map.in_arena_bounds([28, 14]), "Locations past the board should be out of bounds")
+        self.assertEqual([13, 0], game_map.get_edge_locations(game_map.BOTTOM_LEFT)[0], "The bottom left edge should start at [13, 0]")
+        self.assertEqual(True, game.can_spawn("SI", [27, 13]), "We should be able to spawn on the bottom right edge")
+        self.assertEqual(False, game.can_spawn("SI", [26, 13]), "We should not be able to spawn next to the edge")
+
+    def test_bitboards(self):
+        game = self.make_turn_0_map()
+        game_map = game.game_map
+        game_map.add_unit("FF", [13, 5], 0)
+        game_map.add_unit("DF", [14, 5], 0)
+        game_map.add_unit("DF", [14, 20], 1)
+        game_map.add_unit("PI", [13, 6], 0)
+        self.assertEqual(3, popcount(game_map.structure_bits), "Mobile units should not be in the structure bitboard")
+        self.assertEqual([[13, 5], [14, 5]], bits_to_locations(game_map.get_bitboard(0)), "Wrong structures for player 0")
+        self.assertEqual([[14, 5], [14, 20]], bits_to_locations(game_map.get_bitboard(unit_type="DF")), "Wrong turrets")
+        self.assertEqual([[14, 6]], bits_to_locations(shift_bits(game_map.get_bitboard(0, "FF"), 1, 1)), "Wrong shifted wall")
+        game_map.remove_unit([14, 5])
+        self.assertEqual([[14, 20]], bits_to_locations(game_map.get_bitboard(unit_type="DF")), "Removed turret is still in the bitboard")
+        self.assertEqual(False, game.contains_stationary_unit([14, 5]), "Removed turret is still on the map")
+        self.assertEqual(game_map.structure_bits, game._shortest_path_finder.sync_layout(game), "The pathfinder should use the structure bitboard")
+
+    def test_zobrist_hash(self):
+        game = self.make_turn_0_map()
+        other = self.make_turn_0_map()
+        self.assertEqual(0, game.game_map.zobrist_hash, "An empty map should hash to 0")
+        game.game_map.add_unit("FF", [13, 5], 0)
+        game.game_map.add_unit("DF", [14, 5], 1)
+        other.game_map.add_unit("DF", [14, 5], 1)
+        other.game_map.add_unit("FF", [13, 5], 0)
+        self.assertEqual(game.game_map.zobrist_hash, other.game_map.zobrist_hash, "The hash should not depend on the order units were added")
+        other.game_map.upgrade_unit([14, 5])
+        self.assertNotEqual(game.game_map.zobrist_hash, other.game_map.zobrist_hash, "Upgrading should change the hash")
+        other.game_map.remove_unit([14, 5])
+        other.game_map.add_unit("DF", [14, 5], 0)
+        self.assertNotEqual(game.game_map.zobrist_hash, other.game_map.zobrist_hash, "The owner should change the hash")
+        other.game_map[14, 5] = []
+        game.game_map.remove_unit([14, 5])
+        self.assertEqual(game.game_map.zobrist_hash, other.game_map.zobrist_hash, "Removing units should restore the hash")
+
+        hashes = set()
+        keys = len(_ZOBRIST_KEYS)
+        for health in range(1, 76):
+            other.game_map[14, 5] = [GameUnit("FF", game.config, 1, health - 0.5, 14, 5)]
+            hashes.add(other.game_map.zobrist_hash)
+        self.assertEqual(75, len(hashes), "Health should change the hash")
+        self.assertEqual(keys + 1, len(_ZOBRIST_KEYS), "Keys should not be stored per health value")
+
+    def test_fork(self):
+        game = self.make_walled_map()
+        path = game.find_path_to_edge([13, 0])
+        fork = game.fork()
+        fork.game_map.remove_unit([13, 11])
+        fork.game_map.upgrade_unit([14, 11])
+        fork.attempt_spawn("DF", [13, 5])
+        self.assertEqual(1, len(game.game_map[13, 11]), "Removing from the fork changed the original")
+        self.assertEqual(False, game.game_map[14, 11][0].upgraded, "Upgrading in the fork changed the original")
+        self.assertEqual(True, fork.game_map[14, 11][0].upgraded, "The fork was not upgraded")
+        self.assertEqual([], game._build_stack, "Spawning in the fork changed the original build stack")
+        self.assertEqual(25, game.get_resource(game.SP), "Spawning in the fork spent the original's SP")
+        self.assertEqual(path, game.find_path_to_edge([13, 0]), "The original path should not change")
+        self.assertIn([13, 11], fork.find_path_to_edge([13, 0]), "The fork should path through the removed wall")
+        self.assertEqual([], game.game_map[13, 5], "Spawning in the fork changed the original map")
+        game.game_map.add_unit("FF", [12, 5], 0)
+        self.assertEqual([], fork.game_map[12, 5], "Adding to the original changed the fork")
+        with self.assertRaises(TypeError):
+            fork.game_map[12, 5].append(GameUnit("FF", game.config, 0, None, 12, 5))
+        self.assertEqual((False, []), (fork.contains_stationary_unit([12, 5]), fork.game_map[12, 5]), "Cells should only change through the map")
+        self.assertEqual(["FF"], [unit.unit_type for unit in copy.deepcopy(game.game_map[12, 5])], "Cells should still copy")
+        self.assertEqual(([[12, 5]], [[13, 5]]), (game.game_map.get_structure_changes(game.game_map.structure_version - 1),
+                                                  fork.game_map.get_structure_changes(fork.game_map.structure_version - 1)), "Wrong structure changes")
+        second = fork.fork()
+        self.assertEqual(([], None), (second.game_map.structure_changes, second.game_map.get_structure_changes(0)),
+                         "A fork should not copy the change log")
+
+    def test_transposition_table(self):
+        table = TranspositionTable(2)
+        self.assertEqual(4, table.get_or_compute(1, lambda: 4), "The value should be computed on a miss")
+        self.assertEqual(4, table.get_or_compute(1, lambda: 5), "The value should be reused on a hit")
+        table.put(2, "b")
+        table.get(1)
+        table.put(3, "c")
+        self.assertEqual(False, 2 in table, "The least recently used entry should be evicted")
+        self.assertEqual(2, len(table), "The table should be bounded")
+        self.assertEqual((2, 1), (table.hits, table.misses), "Hits and misses are counted wrong")
+
+    def test_unit_table(self):
+        config = self.make_turn_0_map().config
+        turn = """{"p2Units":[[[13,20,75.0,"4"]],[],[[14,20,90.0,"5"]],[],[],[],[],[[14,20,0.0,"6"]]],"turnInfo":[1,0,-1],"p1Stats":[30.0,25.0,5.0,0],"p1Units":[[[13,5,75.0,"1"],[14,5,30.0,"2"]],[],[[13,6,90.0,"3"]],[[3,10,15.0,"7"],[3,10,15.0,"8"]],[],[],[[13,5,0.0,"9"]]],"p2Stats":[30.0,25.0,5.0,0],"events":{"selfDestruct":[],"breach":[],"damage":[],"shield":[],"move":[],"spawn":[],"death":[],"attack":[],"melee":[]}}"""
+        GameState.BUILD_UNIT_TABLE = True
+        try:
+            parsed = GameState(config, turn).get_unit_table()
+        finally:
+            GameState.BUILD_UNIT_TABLE = False
+        built = GameState(config, turn).get_unit_table()
+        for table in [parsed, built]:
+            self.assertEqual(7, len(table), "Every unit should have a row")
+            self.assertEqual(3, table.count(player_index=0, stationary=True), "Wrong number of structures")
+            self.assertEqual(2, table.count(unit_type="PI", x_range=(0, 5)), "Wrong number of mobile units")
+            self.assertEqual(["DF"], [unit.unit_type for unit in table.get_units(table.select(upgraded=True))], "The upgrade was not recorded")
+            self.assertEqual([[13, 5]], [[unit.x, unit.y] for unit in table.get_units(table.select(pending_removal=True))], "The removal was not recorded")
+            rows = table.select(player_index=1, y_range=(14, 27))
+            self.assertEqual(165.0, table.total("health", rows), "Wrong total health")
+            self.assertEqual(15.0, table.total("damage_i", rows), "Wrong total damage")
+            self.assertEqual((1, 0), (table.total("upgraded"), table.total("player_index", [])), "Wrong column totals")
+            table.add_unit(GameUnit("PI", config, 1, None, 3, 17))
+            self.assertEqual(rows + [7], table.select(player_index=1, y_range=(14, 27)), "Selecting should not stop the table growing")
+
+    def test_decoded_state(self):
+        game = self.make_turn_0_map()
+        turn = """{"p2Units":[[],[],[[14,20,90.0,"5"]],[],[],[],[],[]],"turnInfo":[0,3,-1],"p1Stats":[30.0,12.0,7.0,0],"p1Units":[[[13,5,75.0,"1"]],[],[],[],[],[],[],[]],"p2Stats":[28.0,25.0,5.0,0],"events":{}}"""
+        message = EngineMessage(turn, json.loads(turn))
+        self.assertEqual(turn, message, "The message should still be the string")
+        self.assertIs(message.state, decode_message(message), "The message should not be decoded again")
+        for serialized in [turn, json.loads(turn), message]:
+            state = GameState(game.config, serialized)
+            self.assertEqual((3, 12, 28), (state.turn_number, state.get_resource(state.SP), state.enemy_health), "Wrong fields for {}".format(type(serialized)))
+            self.assertEqual(["FF", "DF"], [state.game_map[13, 5][0].unit_type, state.game_map[14, 20][0].unit_type], "Wrong units for {}".format(type(serialized)))
+
+    def test_lazy_parse(self):
+        config = self.make_turn_0_map().config
+        turn = """{"p2Units":[[],[],[[14,20,90.0,"5"]],[],[],[],[],[[14,20,0.0,"6"]]],"turnInfo":[0,3,-1],"p1Stats":[30.0,12.0,7.0,0],"p1Units":[[[13,5,75.0,"1"]],[],[],[],[],[],[],[]],"p2Stats":[28.0,25.0,5.0,0],"events":{}}"""
+        GameState.LAZY_PARSE = True
+        try:
+            state = GameState(config, turn)
+        finally:
+            GameState.LAZY_PARSE = False
+        self.assertEqual((3, 7, 28), (state.turn_number, state.get_resource(state.MP), state.enemy_health), "Stats should be read immediately")
+        self.assertEqual(False, "game_map" in state.__dict__, "The map should not be built yet")
+        self.assertEqual("FF", state.contains_stationary_unit([13, 5]).unit_type, "The map should be built on first use")
+        self.assertEqual(True, state.game_map[14, 20][0].upgraded, "The upgrade was not parsed")
+        self.assertEqual(False, hasattr(state, "missing"), "Other attributes should still be missing")
+
+    def test_previous_state(self):
+        config = self.make_turn_0_map().config
+        turn_1 = """{"p2Units":[[],[],[[14,20,90.0,"5"]],[],[],[],[],[]],"turnInfo":[0,1,-1],"p1Stats":[30.0,12.0,7.0,0],"p1Units":[[[13,5,75.0,"1"],[12,5,75.0,"2"]],[],[[13,6,90.0,"3"]],[],[],[],[],[]],"p2Stats":[28.0,25.0,5.0,0],"events":{}}"""
+        turn_2 = """{"p2Units":[[],[],[[14,20,40.0,"5"]],[],[],[],[],[[14,20,0.0,"6"]]],"turnInfo":[0,2,-1],"p1Stats":[30.0,12.0,7.0,0],"p1Units":[[[13,5,75.0,"1"]],[],[[13,6,90.0,"3"]],[],[],[],[[13,5,0.0,"7"]],[]],"p2Stats":[28.0,25.0,5.0,0],"events":{}}"""
+        previous = GameState(config, turn_1)
+        previous.suppress_warnings(True)
+        path = previous.find_path_to_edge([13, 0])
+        previous.attempt_spawn("FF", [11, 5])
+        state = GameState(config, turn_2, previous)
+        fresh = GameState(config, turn_2)
+        for x, y in [[13, 5], [12, 5], [11, 5], [13, 6], [14, 20]]:
+            self.assertEqual([str(unit) for unit in fresh.game_map[x, y]], [str(unit) for unit in state.game_map[x, y]], "Wrong units at {}".format([x, y]))
+        self.assertIs(previous.game_map[13, 6][0], state.game_map[13, 6][0], "Unchanged units should be kept")
+        self.assertEqual(fresh.game_map.zobrist_hash, state.game_map.zobrist_hash, "The hash should match a fresh state")
+        self.assertEqual(fresh.find_path_to_edge([13, 0]), state.find_path_to_edge([13, 0]), "The path should match a fresh state")
+        self.assertEqual(fresh.get_threat_map(1).get_damage([14, 17]), state.get_threat_map(1).get_damage([14, 17]), "The threat should match a fresh state")
+        self.assertEqual(path, previous.find_path_to_edge([13, 0]), "The previous state should not change")
+        self.assertEqual(2, len(previous.game_map[11, 5]) + len(previous.game_map[12, 5]), "The previous state should not change")
+
+        # A cell holding several units gets its upgrade and removal on the same unit as when parsed fresh
+        turn_3 = """{"p2Units":[[],[],[],[],[],[],[],[]],"turnInfo":[0,3,-1],"p1Stats":[30.0,12.0,7.0,0],"p1Units":[[[13,5,75.0,"1"]],[],[[13,5,90.0,"8"]],[[13,5,15.0,"9"]],[],[],[[13,5,0.0,"10"]],[[13,5,0.0,"11"]]],"p2Stats":[28.0,25.0,5.0,0],"events":{}}"""
+        fresh = GameState(config, turn_3)
+        state = GameState(config, turn_3, GameState(config, turn_2))
+        for x, y in fresh.game_map:
+            self.assertEqual([(unit.unit_type, unit.player_index, unit.health, unit.upgraded, unit.pending_removal) for unit in fresh.game_map[x, y]],
+                             [(unit.unit_type, unit.player_index, unit.health, unit.upgraded, unit.pending_removal) for unit in state.game_map[x, y]],
+                             "Wrong units at {}".format([x, y]))
+
+    def test_turn_output(self):
+        game = self.make_turn_0_map()
+        game.attempt_spawn("FF", [13, 5])
+        game.attempt_spawn("PI", [13, 0], 2)
+        self.assertEqual('[["FF", 13, 5]]\n[["PI", 13, 0], ["PI", 13, 0]]\n', encode_turn(game._build_stack, game._deploy_stack), "Wrong command lines")
+
+        stderr, sys.stderr = sys.stderr, io.StringIO()
+        try:
+            debug_write("a", 1)
+            self.assertEqual("", sys.stderr.getvalue(), "Debug output should be buffered")
+            flush_debug()
+            self.assertEqual("a, 1\n", sys.stderr.getvalue(), "Flushing should write the buffer")
+            set_debug_buffering(False)
+            debug_write("b")
+            self.assertEqual("a, 1\nb\n", sys.stderr.getvalue(), "Unbuffered output should be written at once")
+        finally:
+            set_debug_buffering(True)
+            sys.stderr = stderr
+
+    def test_action_frame_filter(self):
+        quiet = """{"p2Units":[],"turnInfo":[1,4,10],"events":{"breach":[],"death":[],"damage":[]}}"""
+        breach = """{"p2Units":[],"turnInfo": [1, 4, 7],"events": {"breach": [[[13,0],1.0,3,"12",2]], "death": []}}"""
+        self.assertEqual([[1, 4, 10], [1, 4, 7]], [read_turn_info(quiet), read_turn_info(breach)], "Wrong turnInfo")
+        self.assertEqual([False, True, False], [has_event(quiet, "breach"), has_event(breach, "breach"), has_event(breach, "death")], "Wrong events")
+        algo = AlgoCore()
+        self.assertEqual(True, algo._wants_action_frame(quiet, [1, 4, 10]), "Every frame should be wanted by default")
+        algo.register_action_frames(events=["breach"])
+        self.assertEqual([False, True], [algo._wants_action_frame(quiet, [1, 4, 10]), algo._wants_action_frame(breach, [1, 4, 7])], "Only breaches should be wanted")
+        algo.register_action_frames(every=5)
+        self.assertEqual(True, algo._wants_action_frame(quiet, [1, 4, 10]), "Every 5th frame should be wanted")
+
+    def make_walled_map(self):
+        game = self.make_turn_0_map()
+        for x in range(3, 25):
+            game.game_map.add_unit("FF", [x, 11], 0)
+        for x in range(5, 23):
+            game.game_map.add_unit("FF", [x, 16], 1)
+        return game
+
+    def test_find_path_to_edge(self):
+        game = self.make_walled_map()
+        self_destruct_path = [[13, 0], [13, 1], [14, 1], [14, 2], [15, 2], [15, 3], [16, 3], [16, 4], [17, 4], [17, 5], [18, 5],
+                              [18, 6], [19, 6], [19, 7], [20, 7], [20, 8], [21, 8], [21, 9], [22, 9], [22, 10], [23, 10], [24, 10]]
+        self.assertEqual(self_destruct_path, game.find_path_to_edge([13, 0]), "Sealed units should walk to their best self destruct tile")
+        edge_path = [[2, 11], [2, 12], [3, 12], [3, 13], [4, 13], [4, 14], [5, 14], [5, 15], [6, 15], [7, 15], [8, 15], [9, 15], [10, 15],
+                     [11, 15], [12, 15], [13, 15], [14, 15], [15, 15], [16, 15], [17, 15], [18, 15], [19, 15], [20, 15], [21, 15],
+                     [22, 15], [23, 15], [23, 16], [24, 16], [24, 17]]
+        self.assertEqual(edge_path, game.find_path_to_edge([2, 11]), "Wrong path around the walls")
+        self.assertEqual(self_destruct_path, game.find_path_to_edge([13, 0]), "Reusing the pathfinder changed the result")
+        self.assertIsNone(game.find_path_to_edge([13, 11]), "Pathing from a blocked location should fail")
+
+    def test_path_cache(self):
+        game = self.make_walled_map()
+        path = game.find_path_to_edge([2, 11])
+        path.append([0, 0])
+        cached = game.find_path_to_edge([2, 11])
+        self.assertEqual(path[:-1], cached, "Cached path differs from the computed one")
+        self.assertEqual(1, len(game._path_cache), "The repeated query should have been a cache hit")
+
+        game.game_map.add_unit("FF", [4, 13], 0)
+        self.assertNotIn([4, 13], game.find_path_to_edge([2, 11]), "Adding a structure should invalidate cached paths")
+        game.game_map.remove_unit([4, 13])
+        self.assertEqual(cached, game.find_path_to_edge([2, 11]), "Removing the structure should restore the original path")
+        self.assertEqual(2, len(game._path_cache), "Paths of a previously seen layout should be reused")
+
+    def test_find_paths_from_edges(self):
+        game = self.make_walled_map()
+        starts = game.game_map.get_edge_locations(game.game_map.BOTTOM_LEFT) + game.game_map.get_edge_locations(game.game_map.BOTTOM_RIGHT)
+        paths = game.find_paths_from_edges(starts)
+        for start, path in zip(starts, paths):
+            fresh = self.make_walled_map()
+            self.assertEqual(fresh.find_path_to_edge(start), path, "Batched path from {} differs".format(start))
+        finder = game._shortest_path_finder
+        self.assertEqual(2, len(finder._edge_fields), "Expected one distance field per target edge")
+        self.assertEqual(2, sum(len(fields) for fields in finder._pocket_fields.values()), "Expected one distance field per sealed pocket")
+
+    def test_incremental_path_update(self):
+        game = self.make_walled_map()
+        starts = [[2, 11], [13, 0], [25, 11]]
+        game.find_paths_from_edges(starts)
+        edge_fields = dict(game._shortest_path_finder._edge_fields)
+
+        game.attempt_spawn("FF", [4, 13])
+        game.game_map.remove_unit([24, 11])
+        fresh = self.make_walled_map()
+        fresh.game_map.add_unit("FF", [4, 13], 0)
+        fresh.game_map.remove_unit([24, 11])
+        self.assertEqual(fresh.find_paths_from_edges(starts), game.find_paths_from_edges(starts), "Repaired paths differ from a rebuild")
+        for key, field in game._shortest_path_finder._edge_fields.items():
+            self.assertIs(edge_fields[key], field, "Distance fields should be repaired in place rather than rebuilt")
+            self.assertEqual(fresh._shortest_path_finder._edge_fields[key], field, "Repaired distance field differs from a rebuild")
+
+    def test_pocket_index(self):
+        game = self.make_walled_map()
+        pockets = game.get_pocket_index()
+        self.assertFalse(game.can_reach_edge([13, 0]), "The bottom pocket is sealed off")
+        self.assertTrue(game.can_reach_edge([2, 11]), "The left gap leads to the top right edge")
+        self.assertFalse(game.can_reach_edge([3, 11]), "Blocked locations can not reach anything")
+        self.assertEqual(pockets.get_pocket([13, 0]), pockets.get_pocket([18, 5]), "Both tiles are in the sealed pocket")
+        self.assertNotEqual(pockets.get_pocket([13, 0]), pockets.get_pocket([13, 13]), "The walls split the board")
+        self.assertEqual(game.find_path_to_edge([13, 0])[-1], pockets.get_self_destruct_tile([13, 0], game.game_map.TOP_RIGHT), "Wrong self destruct tile")
+        self.assertIsNone(pockets.get_self_destruct_tile([2, 11], game.game_map.TOP_RIGHT), "Units that reach the edge do not self destruct")
+
+        overlay = game.create_overlay()
+        overlay.remove_structure([12, 11])
+        self.assertTrue(overlay.can_reach_edge([13, 0]), "Opening the wall should connect the pockets")
+        self.assertIs(pockets, game.get_pocket_index(), "The overlay should not change the base pockets")
+
+    def test_critical_cells(self):
+        game = self.make_walled_map()
+        path = game.find_path_to_edge([2, 11])
+        self.assertEqual(sorted(path), game.get_critical_cells([2, 11]), "Every path cell is critical")
+        cut_cells = game.get_cut_cells([[2, 11], [13, 0]])
+        self.assertIn([2, 12], cut_cells, "Blocking the gap cuts the unit off")
+        self.assertNotIn([13, 15], cut_cells, "The unit can walk around this cell")
+        self.assertNotIn([13, 1], cut_cells, "Sealed units have no route to cut")
+        overlay = game.create_overlay()
+        for location in cut_cells:
+            overlay.discard()
+            overlay.add_structure("FF", location)
+            self.assertFalse(overlay.can_reach_edge([2, 11]), "Blocking {} should cut the route".format(location))
+
+    def test_overlay(self):
+        game = self.make_walled_map()
+        real = self.make_walled_map()
+        overlay = game.create_overlay()
+        self.assertEqual(game.find_path_to_edge([13, 0]), overlay.find_path_to_edge([13, 0]), "An empty overlay should match its base")
+
+        overlay.remove_structure([24, 11])
+        overlay.add_structure("DF", [20, 13], 1)
+        real.game_map.remove_unit([24, 11])
+        real.game_map.add_unit("DF", [20, 13], 1)
+        self.assertEqual(real.find_path_to_edge([13, 0]), overlay.find_path_to_edge([13, 0]), "Overlay path ignores the hypothetical structures")
+        self.assertEqual(str(real.get_attackers([20, 12], 0)), str(overlay.get_attackers([20, 12], 0)), "Overlay attackers ignore the hypothetical turret")
+        self.assertEqual(1, len(overlay.get_attackers([20, 12], 0)), "The hypothetical turret should attack")
+        self.assertTrue(game.contains_stationary_unit([24, 11]), "The overlay should not change the real map")
+        self.assertEqual([], game.get_attackers([20, 12], 0), "The overlay should not change the real map")
+
+        overlay.discard()
+        self.assertEqual(game.find_path_to_edge([13, 0]), overlay.find_path_to_edge([13, 0]), "Discarding should restore the base layout")
+
+    def test_threat_map(self):
+        game = self.make_turn_0_map()
+        threat_map = game.get_threat_map(1)
+        self.assertEqual(0, threat_map.get_damage([13, 13]), "Nothing should threaten an empty map")
+        game.game_map.add_unit("DF", [12, 14], 1)
+        game.game_map.add_unit("FF", [14, 14], 1)
+        self.assertEqual(["DF"], [unit.unit_type for unit in game.get_attackers([13, 13], 0)], "Only the turret should attack")
+        game.game_map.add_unit("PI", [13, 14], 1)
+        self.assertEqual(["DF"], [unit.unit_type for unit in game.get_attackers([13, 13], 0)], "Mobile units should not be attackers")
+        # Locations that are not integer cells take the range scan instead of the threat map
+        self.assertEqual(["DF"], [unit.unit_type for unit in game.get_attackers([13.5, 13], 0)], "Mobile units should not be attackers off the grid")
+        self.assertEqual(["DF"], [unit.unit_type for unit in game.get_attackers([13.0, 13.0], 0)], "Mobile units should not be attackers for float locations")
+        game.game_map.remove_unit([13, 14])
+        self.assertEqual(5, game.get_threat_map(1).get_damage([13, 13]), "The turret should deal 5 damage per frame")
+        self.assertEqual(0, game.get_threat_map(1).get_damage([13, 13], True), "The turret should not damage structures")
+        self.assertEqual([], game.get_attackers([12, 11], 0), "[12, 11] should be out of the turret's range")
+        game.game_map.upgrade_unit([12, 14])
+        self.assertEqual(15, game.get_threat_map(1).get_damage([13, 13]), "The upgraded turret should deal 15 damage per frame")
+        self.assertEqual(1, len(game.get_attackers([12, 11], 0)), "The upgraded turret should reach [12, 11]")
+        self.assertEqual(30, game.get_threat_map(1).get_path_damage([[13, 13], [13, 12]]), "Damage should add up along a path")
+        game.game_map.remove_unit([12, 14])
+        self.assertEqual([], game.get_attackers([13, 13], 0), "The removed turret should not attack")
 
     def _test_get_attackers(self):
         game = self.make_turn_0_map()
@@ -256,6 +615,155 @@ class BasicTests(unittest.TestCase):
         game.game_map.add_unit("DF", [14,14], 1)
         self.assertEqual(3, len(game.get_attackers([13,13], 0)), "We should be in danger from 3 places")
 
+    def test_simulator(self):
+        game = self.make_turn_0_map()
+        game.attempt_spawn("PI", [13, 0], 5)
+        result = game.simulate_action_phase()
+        self.assertEqual((28, 5, [30.0, 25.0]), (result.frames, len(result.breaches), result.health), "Unblocked scouts should all score")
+        self.assertEqual([30.0, 0.0], result.resources[0], "Breaches should earn SP")
+        self.assertEqual((30.0, 5), (game.enemy_health, len(game.game_map[13, 0])), "Simulating changed the game state")
+
+        game = self.make_walled_map()
+        game.suppress_warnings(True)
+        game.attempt_spawn("PI", [13, 0], 3)
+        result = game.simulate_action_phase()
+        self.assertEqual(([], 3), (result.breaches, len(result.self_destructs)), "Sealed scouts should self destruct")
+        self.assertEqual([24, 10], result.self_destructs[0][2], "Scouts should self destruct at the end of their path")
+
+        game = self.make_turn_0_map()
+        game.attempt_spawn("PI", [13, 0])
+        game.attempt_spawn("FF", [5, 10])
+        game.attempt_remove([5, 10])
+        result = game.simulate_action_phase([("DF", 24, 14), ("DF", 25, 15), ("DF", 23, 14), ("DF", 5, 10)])
+        self.assertEqual(([], [1, 0]), (result.breaches, result.units_lost), "The scout should be destroyed by the turrets")
+        self.assertEqual([("FF", 0, [5, 10], 0.75)], result.removed, "Removal should refund part of the cost")
+        self.assertEqual([[24.75, 4.0], [19.0, 5.0]], result.resources, "Wrong resources after the action phase")
+        self.assertEqual(84.0, result.game_state.game_map[24, 14][0].health, "Damage should be kept on the resulting map")
+        self.assertEqual(False, result.game_state.contains_stationary_unit([5, 10]), "Removed structure still on the map")
+
+        game = self.make_turn_0_map()
+        game.game_map.add_unit("FF", [13, 1], 0)
+        game.game_map.place_unit(GameUnit("PI", game.config, 0, None, 13, 1))
+        result = game.simulate_action_phase()
+        self.assertEqual(["FF"], [unit.unit_type for unit in result.game_state.game_map[13, 1]], "A structure sharing a cell with a mobile unit was lost")
+
+    def test_fidelity_harness(self):
+        game = self.make_turn_0_map()
+
+        def frame(number, scout_location):
+            return {"turnInfo": [1, 3, number], "p1Stats": [30, 25, 5, 0], "p2Stats": [30, 25, 5, 0],
+                    "p1Units": [[], [], [], [scout_location + [15.0, "7"]], [], [], [], []],
+                    "p2Units": [[[14, 20, 75.0, "3"]], [], [], [], [], [], [], []],
+                    "events": {"spawn": [[[13, 0], 3, "7", 1]] if number == 0 else []}}
+
+        def write_replay(frames):
+            replay_file = tempfile.NamedTemporaryFile("w", suffix=".replay", delete=False)
+            with replay_file:
+                replay_file.write(json.dumps(game.config) + "\n")
+                for frame_state in [dict(frame(0, [13, 0]), turnInfo=[0, 3, -1])] + frames:
+                    replay_file.write(json.dumps(frame_state) + "\n")
+            self.addCleanup(os.remove, replay_file.name)
+            return replay_file.name
+
+        reports = FidelityHarness().check_replay(write_replay([frame(0, [13, 0]), frame(1, [13, 1]), frame(2, [14, 1])]))
+        self.assertEqual(1, len(reports), "Only the action phase should be checked")
+        self.assertEqual((2, 28, 3), (reports[0].recorded_frames, reports[0].simulated_frames, reports[0].first_divergence),
+                         "The recorded frames should match until the recording ends")
+
+        report = FidelityHarness().check_replay(write_replay([frame(0, [13, 0]), frame(1, [13, 1]), frame(2, [13, 2])]))[0]
+        self.assertEqual(2, report.first_divergence, "The scout's wrong move should be the first divergence")
+        self.assertEqual((27, 26, 0, 1), (report.divergent_frames, report.position_errors, report.health_errors, report.death_errors),
+                         "Frames past the recording should be compared with its last frame")
+
+    def test_batch_simulation(self):
+        game = self.make_turn_0_map()
+        for location in ([24, 14], [25, 15], [23, 14]):
+            game.game_map.add_unit("DF", location, 1)
+        candidates = [[("PI", 13, 0)] * 5, [("PI", 13, 0)], [("PI", 13, 5)], [("SI", 14, 0), ("PI", 13, 0)]]
+        result = game.simulate_deployments(candidates)
+        self.assertEqual([5, 1, 0, 2], result.units_deployed, "Units off the edges should not be deployed")
+        self.assertEqual(([2.0, 0.0, 0.0, 1.0], [3, 1, 0, 1]), (result.damage_dealt, result.units_lost), "Wrong breaches")
+        fork = game.fork()
+        fork.attempt_spawn("PI", [13, 0])
+        single = fork.simulate_action_phase()
+        self.assertEqual((single.frames, sum(single.units_lost), single.structure_damage[1]),
+                         (result.frames[1], result.units_lost[1], result.structure_damage[1]), "A lone scout should fare as in the full simulation")
+        self.assertEqual(0, result.best(), "The largest stack should do the most damage")
+
+        walled = self.make_walled_map()
+        walled.suppress_warnings(True)
+        result = walled.simulate_deployments([[("PI", 13, 0)] * 3])
+        self.assertEqual(([3], [3], [22]), (result.self_destructs, result.units_lost, result.frames), "Sealed scouts should self destruct")
+
+        if batch.numpy is not None:
+            vectorised = game.simulate_deployments(candidates)
+            batch.numpy, saved = None, batch.numpy
+            try:
+                fallback = game.simulate_deployments(candidates)
+            finally:
+                batch.numpy = saved
+            for field in vectorised.FIELDS:
+                self.assertEqual(getattr(vectorised, field), getattr(fallback, field), "NumPy and Python differ on " + field)
+
+    def test_worker_pool(self):
+        game = self.make_turn_0_map()
+        deltas = [[("PI", 13, 0)] * count for count in range(1, 4)] + [[("DF", 13, 2), ("PI", 14, 0), ("BAD", 1, 1)]]
+        expected = []
+        for delta in deltas:
+            fork = game.fork()
+            for unit_type, x, y in delta:
+                if unit_type != "BAD":
+                    fork.attempt_spawn(unit_type, [x, y])
+            expected.append(fork.simulate_action_phase().health)
+
+        for processes in (0, 2):
+            pool = WorkerPool(game.config, processes)
+            self.addCleanup(pool.close)
+            self.assertEqual(processes == 0, pool.in_process, "Wrong execution mode")
+            pool.start_turn(game)
+            results = pool.map(simulate_action_phase, deltas)
+            self.assertEqual(expected, [result.health for result in results], "Tasks should see the turn's state after their delta")
+            path, damage = pool.map(path_damage, [None], [13, 0])[0]
+            self.assertEqual(([13, 0], 0), (path[0], damage), "Wrong path damage")
+
+            pool.start_turn(game, 0.5)
+            slow = pool.submit(sleep_task, None, 0.7)
+            fast = [pool.submit(sleep_task, None, 0) for _ in range(processes)]
+            start = time.perf_counter()
+            results = pool.collect()
+            self.assertLess(time.perf_counter() - start, 0.9, "Collecting should stop at the deadline")
+            self.assertNotIn(slow, results, "Late results should be dropped")
+            self.assertEqual(set(fast), set(results), "Results in time should be kept")
+
+    def test_path_damage_estimate(self):
+        game = self.make_turn_0_map()
+        path = game.find_path_to_edge([13, 0])
+        estimates = [game.estimate_path_damage(path, [unit_type]) for unit_type in ("PI", "EI", "SI")]
+        self.assertEqual([28, 56, 112], [estimate.frames for estimate in estimates], "Slower units should spend longer on the path")
+        self.assertEqual(([None], 1, 0), (estimates[0].death_frames, estimates[0].breaches, estimates[0].total_damage), "An unguarded scout should score")
+
+        estimator = game._path_estimator
+        for location in ([24, 14], [25, 15], [23, 14]):
+            game.game_map.add_unit("DF", location, 1)
+        estimate = game.estimate_path_damage(path, ["PI"] * 5)
+        self.assertIsNot(estimator, game._path_estimator, "Changing the structures should rebuild the coverage")
+        self.assertEqual(([24, 25, 27, None, None], 45.0), (estimate.death_frames, estimate.total_damage), "Wrong deaths")
+        self.assertLessEqual(max(estimate.damage_per_frame), 15, "Each turret should attack one unit per frame")
+        result = game.simulate_deployments([[("PI", 13, 0)] * 5])
+        self.assertEqual((result.frames[0], result.structure_damage[0], result.breaches[0]),
+                         (estimate.frames, estimate.structure_damage, estimate.breaches), "The estimate should match the batch simulation")
+        lightly_defended = [[x, 13] for x in range(2, 13)]
+        heavily_defended = [[x, 13] for x in range(15, 26)]
+        game.game_map.add_unit("DF", [6, 14], 1)
+        for location in ([16, 14], [17, 14], [18, 14]):
+            game.game_map.add_unit("DF", location, 1)
+        estimates = [game.estimate_path_damage(path, ["PI"]) for path in (heavily_defended, lightly_defended)]
+        self.assertEqual([0, 0], [estimate.survivors for estimate in estimates], "Both paths should destroy the scout")
+        self.assertEqual(1, estimates.index(min(estimates, key=lambda estimate: estimate.danger)), "The lightly defended path should be safer")
+        estimator = game._path_estimator
+        game.estimate_path_damage(game.find_path_to_edge([14, 0]), ["PI"])
+        self.assertIs(estimator, game._path_estimator, "The coverage should be reused while the structures are unchanged")
+
     def test_print_unit(self):
         game = self.make_turn_0_map()
 
@@ -264,6 +772,17 @@ class BasicTests(unittest.TestCase):
         expected_string = "Enemy FF, health: 75.0 location: [14, 13] removal:  upgrade: False "
         self.assertEqual(got_string, expected_string, "Expected {} from print_unit test got {} ".format(expected_string, got_string))
 
+    def test_unit_prototypes(self):
+        game = self.make_turn_0_map()
+        turret = GameUnit("DF", game.config, 0, None, 13, 5)
+        other = GameUnit("DF", game.config, 1, 40.0, 14, 5)
+        self.assertIs(turret.prototype, other.prototype, "Units of the same type should share a prototype")
+        self.assertEqual((90.0, 40.0), (turret.health, other.health), "Health should come from the config unless given")
+        turret.upgrade()
+        self.assertEqual((True, 3.5, 15.0, [6.0, 0]), (turret.upgraded, turret.attackRange, turret.damage_i, turret.cost), "Wrong upgraded stats")
+        self.assertEqual((False, 2.5, 5.0, [2.0, 0]), (other.upgraded, other.attackRange, other.damage_i, other.cost), "Upgrading changed another unit")
+        self.assertEqual(False, hasattr(turret, "__dict__"), "Units should use slots")
+
     def test_future_MP(self):
         game = self.make_turn_0_map()
 
@@ -0,0 +1,162 @@
+import math
+from .board import ARENA_SIZE, CELL_COUNT, CELLS
+
+
+class ThreatMap:
+    """The cells threatened by one player's structures, and how much damage each cell takes per frame.
+
+    Built from a GameMap the first time it is used and kept in step with it afterwards through
+    GameMap.get_structure_changes, so only the cells around added, removed or upgraded structures are updated.
+    Created and synced by GameState.get_threat_map.
+
+    Attributes :
+        * player_index (int): The player whose structures this map holds, 0 for you 1 for the enemy
+        * attackers (list): The structures that can attack each cell, indexed by x * 28 + y, as tuples sorted by location
+        * damage_mobile (list): The summed damage per frame each cell takes if it holds a mobile unit, indexed by x * 28 + y
+        * damage_stationary (list): The summed damage per frame each cell takes if it holds a structure, indexed by x * 28 + y
+
+    """
+    def __init__(self, player_index):
+        """ Creates an empty threat map
+
+        Args:
+            * player_index (int): The player whose structures are tracked, 0 for you 1 for the enemy
+
+        """
+        self.player_index = player_index
+        self.attackers = [()] * CELL_COUNT
+        self.damage_mobile = [0] * CELL_COUNT
+        self.damage_stationary = [0] * CELL_COUNT
+        self._coverage = {}
+        self._game_map = None
+        self._structure_version = 0
+        self._max_range = 0
+        self._hit_radius = 0
+
+    def sync(self, game_map):
+        """Brings the threat map up to date with a game map
+
+        Args:
+            * game_map (:obj: GameMap): The map to track
+        """
+        if game_map is not self._game_map:
+            self._rebuild(game_map)
+            return
+        if game_map.structure_version != self._structure_version:
+            changes = game_map.get_structure_changes(self._structure_version)
+            if changes is None:
+                self._rebuild(game_map)
+                return
+            for index in {x * ARENA_SIZE + y for x, y in changes}:
+                self._remove_structure(index)
+                self._add_structure(index)
+            self._structure_version = game_map.structure_version
+
+    def fork(self, game_map):
+        """Creates a threat map for a GameMap forked from the one this map follows, see GameMap.fork
+
+        Args:
+            * game_map (:obj: GameMap): The forked map
+
+        Returns:
+            A copy of this threat map following game_map, or an empty one if this map is out of date
+        """
+        threat_map = ThreatMap(self.player_index)
+        if self._game_map is not None and self._structure_version == self._game_map.structure_version:
+            threat_map.attackers = list(self.attackers)
+            threat_map.damage_mobile = list(self.damage_mobile)
+            threat_map.damage_stationary = list(self.damage_stationary)
+            threat_map._coverage = dict(self._coverage)
+            threat_map._game_map = game_map
+            threat_map._structure_version = game_map.structure_version
+            threat_map._max_range = self._max_range
+            threat_map._hit_radius = self._hit_radius
+        return threat_map
+
+    def _rebuild(self, game_map):
+        self._game_map = game_map
+        self._structure_version = game_map.structure_version
+        self.attackers = [()] * CELL_COUNT
+        self.damage_mobile = [0] * CELL_COUNT
+        self.damage_stationary = [0] * CELL_COUNT
+        self._coverage = {}
+        # get_attackers only ever searched the longest attack range in the config, keep that limit
+        self._max_range = max([unit.get('attackRange', 0) for unit in game_map.config["unitInformation"]] + [0])
+        self._hit_radius = game_map.config["unitInformation"][0]['getHitRadius']
+        for x, y in CELLS:
+            self._add_structure(x * ARENA_SIZE + y)
+
+    def _add_structure(self, index):
+        """
+        Adds the threat of the structure at a flat index, if it is an attacking structure of this player.
+        """
+        x, y = index // ARENA_SIZE, index % ARENA_SIZE
+        unit = None
+        for location_unit in self._game_map[x, y]:
+            if location_unit.stationary:
+                unit = location_unit
+        if unit is None or unit.player_index != self.player_index or unit.damage_i + unit.damage_f <= 0:
+            return
+
+        cells = []
+        limit = self._max_range + self._hit_radius
+        for cell in self._game_map.get_locations_in_range([x, y], unit.attackRange, "index"):
+            distance = math.sqrt((cell // ARENA_SIZE - x) ** 2 + (cell % ARENA_SIZE - y) ** 2)
+            if distance <= unit.attackRange and distance < limit:
+                cells.append(cell)
+                self.attackers[cell] = tuple(sorted(self.attackers[cell] + (unit,), key=lambda attacker: (attacker.x, attacker.y)))
+                self._sum_damage(cell)
+        self._coverage[index] = (unit, cells)
+
+    def _remove_structure(self, index):
+        """
+        Removes the threat recorded for the structure at a flat index, using the cells it covered when it was added.
+        """
+        coverage = self._coverage.pop(index, None)
+        if coverage is None:
+            return
+        unit, cells = coverage
+        for cell in cells:
+            self.attackers[cell] = tuple(attacker for attacker in self.attackers[cell] if attacker is not unit)
+            self._sum_damage(cell)
+
+    def _sum_damage(self, cell):
+        attackers = self.attackers[cell]
+        self.damage_mobile[cell] = sum(attacker.damage_i for attacker in attackers)
+        self.damage_stationary[cell] = sum(attacker.damage_f for attacker in attackers)
+
+    def get_attackers(self, location):
+        """Gets this player's structures that can attack a location
+
+        Args:
+            location: The [x, y] location to look up
+
+        Returns:
+            A list of the attacking structures, sorted by location
+        """
+        return list(self.attackers[int(location[0]) * ARENA_SIZE + int(location[1])])
+
+    def get_damage(self, location, stationary=False):
+        """Gets the damage per frame a unit at a location takes from this player's structures
+
+        Args:
+            location: The [x, y] location to look up
+            stationary: True for the damage taken by a structure, False for a mobile unit
+
+        Returns:
+            The summed damage per frame of every structure that can attack the location
+        """
+        index = int(location[0]) * ARENA_SIZE + int(location[1])
+        return self.damage_stationary[index] if stationary else self.damage_mobile[index]
+
+    def get_path_damage(self, path):
+        """Gets the damage per frame a mobile unit takes summed over a path, such as one from find_path_to_edge
+
+        Args:
+            path: A list of [x, y] locations
+
+        Returns:
+            The summed damage per frame over every location of the path
+        """
+        damage_mobile = self.damage_mobile
+        return sum(damage_mobile[x * ARENA_SIZE + y] for x, y in path)
@@ -9,9 +9,87 @@ def is_stationary(unit_type, structure_types):
     return unit_type in structure_types
 
 
+_PROTOTYPES = {}
+
+
+class UnitPrototype:
+    """The stats shared by every unit of one type, either upgraded or not, read from the config once.
+
+    Attributes :
+        * unit_type (string): The type of the units
+        * config (JSON): Contains information about the game
+        * upgraded (boolean): If these are the stats of an upgraded unit
+        * upgrade (:obj: UnitPrototype): The prototype of these units once upgraded
+        * stationary, speed, damage_f, damage_i, attackRange, shieldRange, max_health, shieldPerUnit, shieldBonusPerY, cost: See GameUnit
+
+    """
+    __slots__ = ("unit_type", "config", "upgraded", "upgrade", "stationary", "speed", "damage_f", "damage_i", "attackRange",
+                 "shieldRange", "max_health", "shieldPerUnit", "shieldBonusPerY", "cost")
+
+    def __init__(self, unit_type, config, type_config, base=None):
+        """ Reads the stats of a unit type, or of its upgrade if base is the prototype being upgraded
+
+        """
+        self.unit_type = unit_type
+        self.config = config
+        self.upgraded = base is not None
+        self.upgrade = None
+        if base is None:
+            self.stationary = type_config["unitCategory"] == 0
+            self.speed = type_config.get("speed", 0)
+            self.damage_f = type_config.get("attackDamageTower", 0)
+            self.damage_i = type_config.get("attackDamageWalker", 0)
+            self.attackRange = type_config.get("attackRange", 0)
+            self.shieldRange = type_config.get("shieldRange", 0)
+            self.max_health = type_config.get("startHealth", 0)
+            self.shieldPerUnit = type_config.get("shieldPerUnit", 0)
+            self.shieldBonusPerY = type_config.get("shieldBonusPerY", 0)
+            self.cost = (type_config.get("cost1", 0), type_config.get("cost2", 0))
+        else:
+            self.stationary = base.stationary
+            self.speed = type_config.get("speed", base.speed)
+            self.damage_f = type_config.get("attackDamageTower", base.damage_f)
+            self.damage_i = type_config.get("attackDamageWalker", base.damage_i)
+            self.attackRange = type_config.get("attackRange", base.attackRange)
+            self.shieldRange = type_config.get("shieldRange", base.shieldRange)
+            self.max_health = type_config.get("startHealth", base.max_health)
+            self.shieldPerUnit = type_config.get("shieldPerUnit", base.shieldPerUnit)
+            self.shieldBonusPerY = type_config.get("shieldBonusPerY", base.shieldBonusPerY)
+            self.cost = (type_config.get("cost1", 0) + base.cost[0], type_config.get("cost2", 0) + base.cost[1])
+
+
+def get_prototype(unit_type, config):
+    """Gets the prototype of a unit type, building the prototypes of every type in the config the first time
+
+    Args:
+        unit_type: A unit type
+        config: Contains information about the game
+
+    Returns:
+        The UnitPrototype of an unupgraded unit of that type
+    """
+    entry = _PROTOTYPES.get(id(config))
+    if entry is None or entry[0] is not config:
+        if len(_PROTOTYPES) >= 16:
+            _PROTOTYPES.clear()
+        prototypes = {}
+        for type_config in config["unitInformation"]:
+            if "unitCategory" not in type_config:
+                continue
+            prototype = UnitPrototype(type_config["shorthand"], config, type_config)
+            prototype.upgrade = UnitPrototype(type_config["shorthand"], config, type_config.get("upgrade", {}), prototype)
+            prototype.upgrade.upgrade = prototype.upgrade
+            prototypes[type_config["shorthand"]] = prototype
+        # Keeping the config in the entry stops its id being reused while the entry exists
+        entry = _PROTOTYPES[id(config)] = (config, prototypes)
+    return entry[1][unit_type]
+
+
 class GameUnit:
     """Holds information about a Unit. 
 
+    The stats of a unit are read from its UnitPrototype, which is shared by all units of the same type and upgrade.
+
     Attributes :
         * unit_type (string): This unit's type
         * config (JSON): Contains information about the game
@@ -30,51 +108,38 @@ class GameUnit:
         * shieldPerUnit (float): how much shield is given per unit
         * pending_removal (boolean): If this unit is marked for removal by its owner
         * upgraded (boolean): If this unit is upgraded
+        * prototype (:obj: UnitPrototype): The stats shared with other units of this type
 
     """
+    __slots__ = ("unit_type", "player_index", "pending_removal", "x", "y", "health", "prototype")
+
     def __init__(self, unit_type, config, player_index=None, health=None, x=-1, y=-1):
         """ Initialize unit variables using args passed
 
         """
         self.unit_type = unit_type
-        self.config = config
         self.player_index = player_index
         self.pending_removal = False
-        self.upgraded = False
         self.x = x
         self.y = y
-        self.__serialize_type()
-        self.health = self.max_health if not health else health
-
-    def __serialize_type(self):
-        from .game_state import STRUCTURE_TYPES, UNIT_TYPE_TO_INDEX, SUPPORT
-        type_config = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[self.unit_type]]
-        self.stationary = type_config["unitCategory"] == 0
-        self.speed = type_config.get("speed", 0)
-        self.damage_f = type_config.get("attackDamageTower", 0)
-        self.damage_i = type_config.get("attackDamageWalker", 0)
-        self.attackRange = type_config.get("attackRange", 0)
-        self.shieldRange = type_config.get("shieldRange", 0)
-        self.max_health = type_config.get("startHealth", 0)
-        self.shieldPerUnit = type_config.get("shieldPerUnit", 0)
-        self.shieldBonusPerY = type_config.get("shieldBonusPerY", 0)
-        self.cost = [type_config.get("cost1", 0), type_config.get("cost2", 0)]
+        self.prototype = get_prototype(unit_type, config)
+        self.health = self.prototype.max_health if not health else health
 
+    config = property(lambda self: self.prototype.config)
+    upgraded = property(lambda self: self.prototype.upgraded)
+    stationary = property(lambda self: self.prototype.stationary)
+    speed = property(lambda self: self.prototype.speed)
+    damage_f = property(lambda self: self.prototype.damage_f)
+    damage_i = property(lambda self: self.prototype.damage_i)
+    attackRange = property(lambda self: self.prototype.attackRange)
+    shieldRange = property(lambda self: self.prototype.shieldRange)
+    max_health = property(lambda self: self.prototype.max_health)
+    shieldPerUnit = property(lambda self: self.prototype.shieldPerUnit)
+    shieldBonusPerY = property(lambda self: self.prototype.shieldBonusPerY)
+    cost = property(lambda self: list(self.prototype.cost))
 
     def upgrade(self):
-        from .game_state import UNIT_TYPE_TO_INDEX
-        type_config = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[self.unit_type]].get("upgrade", {})
-        self.speed = type_config.get("speed", self.speed)
-        self.damage_f = type_config.get("attackDamageTower", self.damage_f)
-        self.damage_i = type_config.get("attackDamageWalker", self.damage_i)
-        self.attackRange = type_config.get("attackRange", self.attackRange)
-        self.shieldRange = type_config.get("shieldRange", self.shieldRange)
-        self.max_health = type_config.get("startHealth", self.max_health)
-        self.shieldPerUnit = type_config.get("shieldPerUnit", self.shieldPerUnit)
-        self.shieldBonusPerY = type_config.get("shieldBonusPerY", self.shieldBonusPerY)
-        self.cost = [type_config.get("cost1", 0) + self.cost[0], type_config.get("cost2", 0) + self.cost[1]]
-        self.upgraded = True
-
+        self.prototype = self.prototype.upgrade
 
     def __toString(self):
         owner = "Friendly" if self.player_index == 0 else "Enemy"
@@ -86,4 +151,3 @@ class GameUnit:
 
     def __repr__(self):
         return self.__toString()
-
@@ -0,0 +1,229 @@
+from array import array
+from .board import ARENA_SIZE
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class UnitTable:
+    """The units of a turn stored column by column, for bulk questions over many units.
+
+    Each unit is a row, and each column holds one field of every unit in an array. Filtering and
+    summing work on whole columns, and use NumPy when it is installed. The GameUnit of each row is
+    kept in units, so rows found here can be handed to the rest of the library.
+
+    GameState fills the table while parsing the turn, or from its game_map when first asked, see
+    GameState.get_unit_table. Changes made to game_map afterwards are not reflected.
+
+    Attributes :
+        * type_index (array): The index of each unit's type in config["unitInformation"]
+        * player_index (array): The player controlling each unit, 0 for you 1 for your opponent
+        * x (array): The x coordinate of each unit
+        * y (array): The y coordinate of each unit
+        * health (array): The health of each unit
+        * upgraded (array): 1 if the unit is upgraded
+        * pending_removal (array): 1 if the unit is marked for removal by its owner
+        * units (list): The GameUnit of each row
+
+    """
+    COLUMNS = ("type_index", "player_index", "x", "y", "health", "upgraded", "pending_removal")
+
+    def __init__(self, config):
+        """ Creates an empty table
+
+        Args:
+            * config (JSON): Contains information about the game
+
+        """
+        self.config = config
+        self.type_index = array('b')
+        self.player_index = array('b')
+        self.x = array('b')
+        self.y = array('b')
+        self.health = array('d')
+        self.upgraded = array('b')
+        self.pending_removal = array('b')
+        self.units = []
+        self._type_ids = {}
+        self._stationary_types = set()
+        for index, type_config in enumerate(config["unitInformation"]):
+            self._type_ids[type_config.get("shorthand")] = index
+            if type_config.get("unitCategory") == 0:
+                self._stationary_types.add(index)
+        self._structure_rows = {}
+        if numpy is not None:
+            self._stationary_lookup = numpy.zeros(len(config["unitInformation"]), dtype=bool)
+            self._stationary_lookup[list(self._stationary_types)] = True
+
+    @classmethod
+    def from_game_map(cls, game_map):
+        """Creates a table of every unit on a map
+
+        Args:
+            * game_map (:obj: GameMap): The map to read
+
+        Returns:
+            The new UnitTable
+        """
+        table = cls(game_map.config)
+        for location in game_map:
+            for unit in game_map[location]:
+                table.add_unit(unit)
+        return table
+
+    def __len__(self):
+        return len(self.units)
+
+    def add_unit(self, unit):
+        """Adds a row for a unit
+
+        Args:
+            unit: The GameUnit to add
+        """
+        row = len(self.units)
+        self.type_index.append(self._type_ids[unit.unit_type])
+        self.player_index.append(-1 if unit.player_index is None else unit.player_index)
+        self.x.append(int(unit.x))
+        self.y.append(int(unit.y))
+        self.health.append(unit.health)
+        self.upgraded.append(1 if unit.upgraded else 0)
+        self.pending_removal.append(1 if unit.pending_removal else 0)
+        self.units.append(unit)
+        if unit.stationary:
+            self._structure_rows[unit.x * ARENA_SIZE + unit.y] = row
+
+    def refresh_structure(self, location):
+        """Copies the upgrade and removal flags of the structure at a location back into its row
+
+        Args:
+            location: The [x, y] location of the structure
+        """
+        row = self._structure_rows.get(location[0] * ARENA_SIZE + location[1])
+        if row is not None:
+            unit = self.units[row]
+            self.upgraded[row] = 1 if unit.upgraded else 0
+            self.pending_removal[row] = 1 if unit.pending_removal else 0
+
+    def select(self, unit_type=None, player_index=None, stationary=None, upgraded=None, pending_removal=None, x_range=None, y_range=None):
+        """Finds the rows of the units matching every given condition
+
+        Args:
+            unit_type: Only units of this type. Use the constants provided in algo_strategy.
+            player_index: Only units of this player, 0 for you 1 for your opponent
+            stationary: True for only structures, False for only mobile units
+            upgraded: True for only upgraded units, False for only units that are not
+            pending_removal: True for only units marked for removal, False for only units that are not
+            x_range: Only units with min_x <= x <= max_x, given as (min_x, max_x)
+            y_range: Only units with min_y <= y <= max_y, given as (min_y, max_y)
+
+        Returns:
+            A list of the matching rows, in the order they were added
+        """
+        if numpy is not None and len(self) > 0:
+            return self.__select_numpy(unit_type, player_index, stationary, upgraded, pending_removal, x_range, y_range)
+
+        rows = range(len(self))
+        if unit_type is not None:
+            type_id = self._type_ids.get(unit_type, -1)
+            rows = [row for row in rows if self.type_index[row] == type_id]
+        if player_index is not None:
+            rows = [row for row in rows if self.player_index[row] == player_index]
+        if stationary is not None:
+            rows = [row for row in rows if (self.type_index[row] in self._stationary_types) == stationary]
+        if upgraded is not None:
+            rows = [row for row in rows if self.upgraded[row] == upgraded]
+        if pending_removal is not None:
+            rows = [row for row in rows if self.pending_removal[row] == pending_removal]
+        if x_range is not None:
+            rows = [row for row in rows if x_range[0] <= self.x[row] <= x_range[1]]
+        if y_range is not None:
+            rows = [row for row in rows if y_range[0] <= self.y[row] <= y_range[1]]
+        return list(rows)
+
+    def __select_numpy(self, unit_type, player_index, stationary, upgraded, pending_removal, x_range, y_range):
+        # Only the columns a condition needs are viewed, and the views share the columns' memory
+        column = self.__column
+        mask = numpy.ones(len(self), dtype=bool)
+        if unit_type is not None:
+            mask &= column("type_index") == self._type_ids.get(unit_type, -1)
+        if player_index is not None:
+            mask &= column("player_index") == player_index
+        if stationary is not None:
+            mask &= self._stationary_lookup[column("type_index")] == stationary
+        if upgraded is not None:
+            mask &= column("upgraded") == upgraded
+        if pending_removal is not None:
+            mask &= column("pending_removal") == pending_removal
+        if x_range is not None:
+            x = column("x")
+            mask &= (x >= x_range[0]) & (x <= x_range[1])
+        if y_range is not None:
+            y = column("y")
+            mask &= (y >= y_range[0]) & (y <= y_range[1])
+        return numpy.flatnonzero(mask).tolist()
+
+    def __column(self, name):
+        """
+        Gets a NumPy view of a column without copying it. An array cannot grow while a view of it exists, so views are not kept.
+        """
+        column = getattr(self, name)
+        return numpy.frombuffer(column, dtype=numpy.float64 if column.typecode == 'd' else numpy.int8)
+
+    def as_numpy(self):
+        """Gets copies of the columns as NumPy arrays
+
+        The copies can be kept and changed freely. select and total read the columns in place instead.
+
+        Returns:
+            A dict from column name to array, or None if NumPy is not installed
+        """
+        if numpy is None:
+            return None
+        return {name: numpy.array(getattr(self, name), dtype=numpy.float64 if name == "health" else numpy.int8) for name in self.COLUMNS}
+
+    def get_units(self, rows):
+        """Gets the GameUnit of each row
+
+        Args:
+            rows: A list of rows, such as from select
+
+        Returns:
+            A list of GameUnits
+        """
+        return [self.units[row] for row in rows]
+
+    def total(self, field, rows=None):
+        """Sums a field over some rows
+
+        Args:
+            field: A column name, or a GameUnit attribute such as 'damage_i' or 'max_health'
+            rows: The rows to sum over, such as from select. Every row if None
+
+        Returns:
+            The sum of the field over the rows
+        """
+        if field in self.COLUMNS:
+            column = getattr(self, field)
+            if numpy is not None and len(column) > 0:
+                values = self.__column(field)
+                if rows is not None:
+                    values = values[numpy.asarray(rows, dtype=numpy.intp)]
+                total = values.sum(dtype=numpy.float64 if field == "health" else numpy.int64)
+                return float(total) if field == "health" else int(total)
+            if rows is None:
+                return sum(column)
+            return sum(column[row] for row in rows)
+        units = self.units
+        if rows is None:
+            return sum(getattr(unit, field) for unit in units)
+        return sum(getattr(units[row], field) for row in rows)
+
+    def count(self, **conditions):
+        """Counts the units matching every given condition, see select
+
+        Returns:
+            The number of matching units
+        """
+        return len(self.select(**conditions))
@@ -1,7 +1,15 @@
 import sys
+import json
+import re
+import atexit
 
 
 BANNER_TEXT = "---------------- Starting Your Algo --------------------"
+DEBUG_BUFFER_LIMIT = 65536
+
+_debug_buffer = []
+_debug_buffer_size = 0
+_debug_buffering = True
 
 
 def get_command():
@@ -21,6 +29,77 @@ def get_command():
         exit()
     return ret
 
+class EngineMessage(str):
+    """A message from the game engine, carrying the JSON object it was decoded to.
+
+    It is still the string the engine sent, so it can be used anywhere the message string was,
+    while GameState and decode_message read the decoded object instead of decoding it again.
+
+    Attributes :
+        * state (dict): The decoded message
+
+    """
+    def __new__(cls, string, state):
+        message = str.__new__(cls, string)
+        message.state = state
+        return message
+
+def decode_message(message):
+    """Decodes a message from the game engine, reusing the decoding AlgoCore already did if there is one
+
+    Args:
+        message: The message string, an EngineMessage, or an already decoded dict
+
+    Returns:
+        The message as a dict
+    """
+    if isinstance(message, EngineMessage):
+        return message.state
+    if isinstance(message, dict):
+        return message
+    return json.loads(message)
+
+_TURN_INFO = re.compile(r'"turnInfo"\s*:\s*\[([^\]]*)\]')
+
+def read_turn_info(message):
+    """Reads the turnInfo of a message from the game engine without decoding the rest of it
+
+    Args:
+        message: The message string
+
+    Returns:
+        turnInfo as a list of ints, the message type first then the turn and frame numbers, or None if it could not be read
+    """
+    start = message.find('"turnInfo":[')
+    if start >= 0:
+        start += 12
+        end = message.find("]", start)
+    else:
+        match = _TURN_INFO.search(message)
+        if match is None:
+            return None
+        start, end = match.span(1)
+    try:
+        return [int(value) for value in message[start:end].split(",")]
+    except ValueError:
+        return None
+
+def has_event(message, event):
+    """Checks whether a message from the game engine has any events of a type, without decoding it
+
+    Args:
+        message: The message string
+        event: The name of the event list, such as 'breach', 'death' or 'damage'
+
+    Returns:
+        True if the event list is present and not empty
+    """
+    start = message.find('"{}":['.format(event))
+    if start >= 0:
+        return message[start + len(event) + 4] != "]"
+    match = re.search(r'"{}"\s*:\s*\[\s*(.)'.format(re.escape(event)), message)
+    return match is not None and match.group(1) != "]"
+
 def send_command(cmd):
     """Sends your turn to standard output.
     Should usually only be called by 'GameState.submit_turn()'
@@ -29,13 +108,88 @@ def send_command(cmd):
     sys.stdout.write(cmd.strip() + "\n")
     sys.stdout.flush()
 
+def encode_turn(build_stack, deploy_stack):
+    """Encodes the two command lines of a turn
+
+    Args:
+        build_stack: The structures to build, removals and upgrades, as (unit_type, x, y)
+        deploy_stack: The mobile units to deploy, as (unit_type, x, y)
+
+    Returns:
+        The build line and the deploy line, each ending in a newline
+    """
+    return "{}\n{}\n".format(json.dumps(build_stack), json.dumps(deploy_stack))
+
+def send_turn(build_stack, deploy_stack):
+    """Sends both command lines of a turn to standard output in a single write, then flushes the debug output.
+    Should usually only be called by 'GameState.submit_turn()'
+
+    Args:
+        build_stack: The structures to build, removals and upgrades, as (unit_type, x, y)
+        deploy_stack: The mobile units to deploy, as (unit_type, x, y)
+
+    """
+    sys.stdout.write(encode_turn(build_stack, deploy_stack))
+    sys.stdout.flush()
+    flush_debug()
+
 def debug_write(*msg):
     """Prints a message to the games debug output
 
+    The output is buffered until the end of the turn, see set_debug_buffering.
+
     Args:
         msg: The message to output
 
     """
     #Printing to STDERR is okay and printed out by the game but doesn't effect turns.
-    sys.stderr.write(", ".join(map(str, msg)).strip() + "\n")
-    sys.stderr.flush()
+    debug_write_raw(", ".join(map(str, msg)).strip() + "\n")
+
+def debug_write_raw(text):
+    """Prints text to the games debug output as it is, without separators or a newline
+
+    Args:
+        text: The text to output
+
+    """
+    global _debug_buffer_size
+    if not _debug_buffering:
+        sys.stderr.write(text)
+        sys.stderr.flush()
+        return
+    _debug_buffer.append(text)
+    _debug_buffer_size += len(text)
+    if _debug_buffer_size >= DEBUG_BUFFER_LIMIT:
+        flush_debug()
+
+def flush_debug():
+    """Writes out any buffered debug output
+
+    Called by GameState.submit_turn, after each message AlgoCore handles, and when the algo exits.
+
+    """
+    global _debug_buffer_size
+    if _debug_buffer:
+        text = "".join(_debug_buffer)
+        _debug_buffer.clear()
+        _debug_buffer_size = 0
+        sys.stderr.write(text)
+        sys.stderr.flush()
+
+def set_debug_buffering(enabled):
+    """Chooses whether debug output is buffered, or written and flushed on every call
+
+    Buffering is on by default. The buffer is written out at the end of each turn and action frame, when it
+    holds DEBUG_BUFFER_LIMIT characters, and when the algo exits. Turn it off to see output as it happens,
+    for example when an algo hangs mid turn.
+
+    Args:
+        enabled: True to buffer debug output
+
+    """
+    global _debug_buffering
+    _debug_buffering = enabled
+    if not enabled:
+        flush_debug()
+
+atexit.register(flush_debug)
@@ -0,0 +1,289 @@
+import json
+import os
+import time
+import multiprocessing
+from queue import Empty
+from .game_state import GameState
+from .util import debug_write, flush_debug, set_debug_buffering
+
+
+def apply_delta(game_state, delta):
+    """Applies a turn's worth of builds and deployments to a game state
+
+    Args:
+        game_state: The GameState to change
+        delta: A list of (unit_type, x, y), in the format of the build and deploy stacks sent to the engine.
+               Upgrades and removals use the UPGRADE and REMOVE shorthands.
+
+    Returns:
+        The same GameState
+    """
+    unit_information = game_state.config["unitInformation"]
+    remove, upgrade = unit_information[6]["shorthand"], unit_information[7]["shorthand"]
+    for unit_type, x, y in delta or []:
+        if unit_type == remove:
+            game_state.attempt_remove([x, y])
+        elif unit_type == upgrade:
+            game_state.attempt_upgrade([x, y])
+        else:
+            game_state.attempt_spawn(unit_type, [x, y])
+    return game_state
+
+
+def simulate_action_phase(game_state, enemy_build_stack=None, enemy_deploy_stack=None):
+    """A task that simulates the action phase after the delta, see GameState.simulate_action_phase
+
+    Returns:
+        The SimulationResult, without its game_state so it is small to send back
+    """
+    result = game_state.simulate_action_phase(enemy_build_stack, enemy_deploy_stack)
+    result.game_state = None
+    return result
+
+
+def simulate_deployments(game_state, candidates, player_index=0):
+    """A task that simulates candidate deployments after the delta, see GameState.simulate_deployments
+
+    Returns:
+        The BatchResult
+    """
+    return game_state.simulate_deployments(candidates, player_index)
+
+
+def path_damage(game_state, location, player_index=0):
+    """A task that finds the path from a location after the delta and the damage a unit takes along it
+
+    Args:
+        location: The [x, y] location a mobile unit would spawn on
+        player_index: The player the unit belongs to, 0 for you 1 for the enemy
+
+    Returns:
+        The path, and the damage per frame summed over it from the other player's structures, see ThreatMap.get_path_damage
+    """
+    path = game_state.find_path_to_edge(location)
+    if path is None:
+        return None, 0
+    return path, game_state.get_threat_map(1 - player_index).get_path_damage(path)
+
+
+class WorkerPool:
+    """Evaluates hypothetical turns in worker processes, so a turn can use more than one core.
+
+    Create the pool in on_game_start. The workers are forked then and inherit the config and the board tables,
+    and they stay alive for the rest of the game. Each turn:
+
+        1. start_turn sends the turn's game state to every worker once, as the string the engine sent, and starts the turn's deadline.
+        2. submit queues a task: a function called with a fork of the turn's state, after a delta of builds and deployments
+           has been applied to it with apply_delta. Functions must be defined at module level, such as simulate_action_phase,
+           simulate_deployments and path_damage in this module, and return something that can be pickled.
+        3. collect gathers the results that arrive before the deadline. Later results are dropped, and tasks not
+           yet started when the deadline passes or cancel is called are skipped.
+
+    With one core, or where processes cannot be forked, the pool runs tasks in the algo's own process when collect is called,
+    stopping at the deadline, so the same code works everywhere.
+
+    A task that raises is reported with debug_write and left out of the results.
+
+    Attributes :
+        * config (JSON): Contains information about the game
+        * processes (int): The number of worker processes, 0 when tasks run in process
+
+    """
+    def __init__(self, config, processes=None):
+        """ Forks the worker processes
+
+        Args:
+            * config (JSON): Contains information about the game
+            * processes: The number of workers. One fewer than the number of cores if None, leaving one for the algo.
+              Tasks run in process if this is below 1.
+
+        """
+        self.config = config
+        if processes is None:
+            processes = (os.cpu_count() or 1) - 1
+        if "fork" not in multiprocessing.get_all_start_methods():
+            processes = 0
+        self.processes = max(0, processes)
+        self._turn = 0
+        self._generation = 0
+        self._deadline = None
+        self._next_task = 0
+        self._pending = {}
+        self._state = None
+        self._workers = []
+        if self.processes > 0:
+            context = multiprocessing.get_context("fork")
+            self._tasks = context.Queue()
+            self._results = context.Queue()
+            self._shared_generation = context.Value("i", 0, lock=False)
+            # Output buffered before the fork would otherwise be written again by every worker
+            flush_debug()
+            for _ in range(self.processes):
+                inbox = context.Queue()
+                worker = context.Process(target=_worker_main, args=(config, inbox, self._tasks, self._results, self._shared_generation),
+                                         daemon=True)
+                worker.start()
+                self._workers.append((worker, inbox))
+
+    @property
+    def in_process(self):
+        return self.processes == 0
+
+    def start_turn(self, game_state, time_limit=None):
+        """Starts a new turn, cancelling any tasks of the last one
+
+        Args:
+            game_state: The GameState of the turn, as created from the engine's message
+            time_limit: The seconds from now that results are accepted for, or None for no deadline
+
+        """
+        self.cancel()
+        self._turn += 1
+        self._deadline = None if time_limit is None else time.perf_counter() + time_limit
+        serialized = game_state.serialized_string
+        serialized = json.dumps(serialized) if isinstance(serialized, dict) else str(serialized)
+        if self.in_process:
+            self._state = GameState(self.config, serialized, self._state)
+            self._state.suppress_warnings(True)
+            return
+        for worker, inbox in self._workers:
+            inbox.put((self._turn, serialized))
+
+    def submit(self, function, delta=None, *args):
+        """Queues a task for the current turn
+
+        Args:
+            function: A module level function taking a GameState and args
+            delta: The builds and deployments to apply to the turn's state first, see apply_delta
+            args: Further arguments for the function
+
+        Returns:
+            The id of the task, which its result is keyed by in collect
+        """
+        task_id = self._next_task
+        self._next_task += 1
+        self._pending[task_id] = (function, delta, args)
+        if not self.in_process:
+            self._tasks.put((self._turn, self._generation, task_id, function, delta, args))
+        return task_id
+
+    def collect(self, timeout=None):
+        """Waits for the results of the turn's tasks
+
+        Args:
+            timeout: The most seconds to wait. Waits until the deadline, or until every task is done, if None
+
+        Returns:
+            A dict from task id to result, for the tasks finished in time. Tasks left over are still collected by later calls,
+            until the deadline or the next turn.
+        """
+        end = self._deadline
+        if timeout is not None:
+            end = time.perf_counter() + timeout if end is None else min(end, time.perf_counter() + timeout)
+        results = {}
+        if self.in_process:
+            for task_id in sorted(self._pending):
+                if end is not None and time.perf_counter() >= end:
+                    break
+                function, delta, args = self._pending.pop(task_id)
+                succeeded, result = _run_task(self._state, function, delta, args)
+                if succeeded and (end is None or time.perf_counter() < end):
+                    results[task_id] = result
+            self.__expire()
+            return results
+
+        while self._pending:
+            wait = None if end is None else end - time.perf_counter()
+            if wait is not None and wait <= 0:
+                break
+            try:
+                generation, task_id, (succeeded, result) = self._results.get(timeout=wait)
+            except Empty:
+                break
+            if generation != self._generation or task_id not in self._pending:
+                continue
+            del self._pending[task_id]
+            if succeeded:
+                results[task_id] = result
+        self.__expire()
+        return results
+
+    def map(self, function, deltas, *args):
+        """Runs a function over many deltas and waits for the results
+
+        Args:
+            function: A module level function taking a GameState and args
+            deltas: A list of deltas, see apply_delta
+            args: Further arguments for the function, the same for every delta
+
+        Returns:
+            A list with the result for each delta, None for those not finished before the deadline
+        """
+        task_ids = [self.submit(function, delta, *args) for delta in deltas]
+        results = self.collect()
+        return [results.get(task_id) for task_id in task_ids]
+
+    def cancel(self):
+        """Drops every queued task, and any result still to come for them"""
+        self._pending.clear()
+        self._generation += 1
+        if not self.in_process:
+            self._shared_generation.value = self._generation
+
+    def close(self):
+        """Stops the worker processes, after which tasks run in process"""
+        self.cancel()
+        for worker, inbox in self._workers:
+            inbox.put(None)
+            self._tasks.put(None)
+        for worker, inbox in self._workers:
+            worker.join(1)
+            if worker.is_alive():
+                worker.terminate()
+        self._workers = []
+        self.processes = 0
+
+    def __expire(self):
+        """
+        Cancels the turn's remaining tasks once its deadline has passed.
+        """
+        if self._deadline is not None and time.perf_counter() >= self._deadline and self._pending:
+            self.cancel()
+
+
+def _run_task(state, function, delta, args):
+    """
+    Runs one task on a fork of a state, returning whether it succeeded and its result.
+    """
+    try:
+        game_state = state.fork()
+        game_state.suppress_warnings(True)
+        return True, function(apply_delta(game_state, delta), *args)
+    except Exception as error:
+        debug_write("Worker task {} failed: {!r}".format(getattr(function, "__name__", function), error))
+        return False, None
+
+
+def _worker_main(config, inbox, tasks, results, generation):
+    """
+    The loop of a worker process. Takes tasks from the queue shared by all workers, reading the state of each
+    new turn from its own inbox when the first task of that turn arrives, and skips tasks that were cancelled.
+    """
+    set_debug_buffering(False)
+    state = None
+    turn = 0
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        task_turn, task_generation, task_id, function, delta, args = task
+        while turn < task_turn:
+            update = inbox.get()
+            if update is None:
+                return
+            turn, serialized = update
+            state = GameState(config, serialized, state)
+            state.suppress_warnings(True)
+        if task_turn != turn or task_generation != generation.value:
+            continue
+        results.put((task_generation, task_id, _run_task(state, function, delta, args)))
@@ -91,9 +91,8 @@ class AlgoStrategy(gamelib.AlgoCore):
             if game_state.can_spawn(SCOUT, start):
                 open_edges.append(start)
         gamelib.debug_write("Preventing blocking")
-        for start in open_edges:
-            for local in game_state.find_path_to_edge((self.least_damage_spawn_location(game_state, open_edges))):
-                necessary.append(locals)
+        if len(open_edges) > 0:
+            necessary = game_state.get_cut_cells(open_edges)
         gamelib.debug_write("Assembing my board")
         for x in range(28):
             for y in range(14):
@@ -132,11 +131,7 @@ class AlgoStrategy(gamelib.AlgoCore):
             if game_state.can_spawn(SCOUT, location):
                 for location in game_state.find_path_to_edge(location):
                     path.append(location)
-                damage = 0
-                for path_location in path:
-                        damage += len(game_state.get_attackers(path_location, 0)) * gamelib.GameUnit(TURRET,
-                                                                                             game_state.config).damage_i
-                damages.append(damage)
+                damages.append(game_state.estimate_path_damage(path, [SCOUT] * max(1, game_state.number_affordable(SCOUT))).danger)
         chosen = [[0, 2]]
         while (not chosen[-1] in enemy_edges) and len(damages) > 0:
             chosen = location_options[damages.index(min(damages))]
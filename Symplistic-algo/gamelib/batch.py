@@ -0,0 +1,570 @@
+from .board import ARENA_SIZE, HALF_ARENA, EDGE_SETS, EDGE_INDICES, bits_to_locations
+from .unit import get_prototype
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class BatchResult:
+    """The outcomes of a batch of simulated deployments, see BatchSimulator.simulate.
+
+    Each attribute is a list with one entry per candidate, in the order the candidates were given.
+
+    Attributes :
+        * damage_dealt (list): The health the candidate's breaches took from the opponent
+        * breaches (list): The number of the candidate's units that scored
+        * sp_gained (list): The SP the candidate's breaches earned
+        * units_lost (list): The number of the candidate's units destroyed or self destructed
+        * self_destructs (list): The number of the candidate's units that self destructed
+        * structure_damage (list): The damage the candidate's units did to the opponent's structures
+        * structures_destroyed (list): The number of the opponent's structures the candidate destroyed
+        * frames (list): The number of frames until the candidate's last unit was gone
+        * units_deployed (list): The number of the candidate's units that could be deployed
+
+    """
+    FIELDS = ("damage_dealt", "breaches", "sp_gained", "units_lost", "self_destructs", "structure_damage",
+              "structures_destroyed", "frames", "units_deployed")
+    FLOAT_FIELDS = ("damage_dealt", "sp_gained", "structure_damage")
+
+    def __init__(self, count):
+        for field in self.FIELDS:
+            setattr(self, field, [0.0] * count if field in self.FLOAT_FIELDS else [0] * count)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def best(self, key=None):
+        """Gets the index of the best candidate
+
+        Args:
+            key: A function from a candidate's index to its score. Damage dealt, then structure damage, if None
+
+        Returns:
+            The index of the candidate with the highest score, or None if there are no candidates
+        """
+        if len(self) == 0:
+            return None
+        if key is None:
+            key = lambda index: (self.damage_dealt[index], self.structure_damage[index])
+        return max(range(len(self)), key=key)
+
+
+class PathDamage:
+    """The expected outcome of a stack of mobile units following one path, see BatchSimulator.estimate_path.
+
+    Attributes :
+        * damage_per_frame (list): The damage the stack takes on each frame, starting with frame 1. Damage beyond the health a unit has left is not counted
+        * death_frames (list): The frame each unit of the stack is destroyed on, in the order given, or None if it breached or self destructed
+        * structure_damage (float): The damage the stack does to the opponent's structures
+        * breaches (int): The number of units that scored
+        * frames (int): The number of frames until the stack's last unit was gone
+
+    """
+    def __init__(self, count):
+        self.damage_per_frame = []
+        self.death_frames = [None] * count
+        self.structure_damage = 0.0
+        self.breaches = 0
+        self.frames = 0
+
+    @property
+    def total_damage(self):
+        return sum(self.damage_per_frame)
+
+    @property
+    def survivors(self):
+        return sum(1 for frame in self.death_frames if frame is None)
+
+    @property
+    def danger(self):
+        """A key to compare paths by, lowest for the safest
+
+        Paths are ranked by the units that survive, then by how long the last unit to be destroyed lasts,
+        then by the damage taken. total_damage alone stops at the stack's health, so it ties every path that
+        destroys the whole stack, however heavily defended.
+        """
+        last_death = max([frame for frame in self.death_frames if frame is not None] + [0])
+        return (-self.survivors, -last_death, self.total_damage)
+
+
+class BatchSimulator:
+    """Simulates the action phases of many candidate deployments of one player at once, against the same structures.
+
+    Every candidate starts from the same GameState and deploys its own stack of mobile units. The candidates are
+    stepped through the action phase in lockstep, sharing what does not change between them: the path from every
+    spawn location, the shields given along each path, the opponent's threat map and the distance from every path
+    cell to every structure, all worked out once for the batch. With NumPy installed, the health, positions and damage
+    of every candidate are arrays and each frame is a handful of array operations, otherwise the candidates are
+    stepped one after another.
+
+    To share this data the batch simplifies the action phase compared with ActionSimulator:
+        * The opponent's mobile units are not simulated, only their structures
+        * Paths are not recomputed when a structure is destroyed
+        * Within a frame every attacker picks its target before any damage is dealt
+
+    Movement, shielding, target priority, breaches and self destructs otherwise follow ActionSimulator.
+
+    The same tables serve estimate_path, which follows one stack along a given path and records the damage it takes each frame.
+
+    Attributes :
+        * game_state (:obj: GameState): The state every candidate starts from. Mobile units on its map are ignored.
+        * player_index (int): The player deploying the candidates, 0 for you 1 for the enemy
+        * MAX_FRAMES (int): The longest action phase simulated
+
+    """
+    MAX_FRAMES = 1000
+
+    def __init__(self, game_state, player_index=0):
+        """ Collects the structures of both players
+
+        Args:
+            * game_state (:obj: GameState): The state every candidate starts from
+            * player_index (int): The player deploying the candidates, 0 for you 1 for the enemy
+
+        """
+        self.game_state = game_state
+        self.player_index = player_index
+        config = game_state.config
+        unit_information = config["unitInformation"]
+        self._hit_radius = unit_information[0].get("getHitRadius", 0)
+        self._type_info = {}
+        for type_config in unit_information:
+            if type_config.get("unitCategory") == 1:
+                shorthand = type_config["shorthand"]
+                self._type_info[shorthand] = (
+                    type_config.get("playerBreachDamage", 1),
+                    type_config.get("metalForBreach", config.get("resources", {}).get("coresForPlayerDamage", 1)),
+                    type_config.get("selfDestructStepsRequired", 5),
+                    (type_config.get("selfDestructRange", 0) + self._hit_radius) ** 2,
+                    type_config.get("selfDestructDamageTower", 0))
+
+        game_map = game_state.game_map
+        self._structures = []
+        self._supports = []
+        for x, y in bits_to_locations(game_map.get_occupied_bits()):
+            for unit in game_map[x, y]:
+                if not unit.stationary:
+                    continue
+                if unit.player_index != player_index:
+                    self._structures.append(unit)
+                elif unit.shieldRange > 0 and (unit.shieldPerUnit > 0 or unit.shieldBonusPerY > 0):
+                    self._supports.append(unit)
+        self._structure_index = {structure.x * ARENA_SIZE + structure.y: s for s, structure in enumerate(self._structures)}
+        self._threat_map = game_state.get_threat_map(1 - player_index)
+        self._paths = {}
+        self._path_table = []
+        self._rows = {}
+        self._distances = []
+        self._coverage = []
+        self._unit_keys = []
+        self._structure_keys = self.__structure_keys()
+        self._in_reach = {}
+
+    def edge_candidates(self, unit_types, num=None):
+        """Makes a candidate for every unit type at every free edge location the player can deploy to
+
+        Args:
+            unit_types: The mobile unit types to try
+            num: The number of units in each candidate. As many as the player can afford if None
+
+        Returns:
+            A list of deploy stacks, as taken by simulate
+        """
+        edges = (2, 3) if self.player_index == 0 else (0, 1)
+        mp = self.game_state.get_resource(self.game_state.MP, self.player_index)
+        candidates = []
+        for edge in edges:
+            for index in EDGE_INDICES[edge]:
+                x, y = index // ARENA_SIZE, index % ARENA_SIZE
+                if self.game_state.contains_stationary_unit([x, y]):
+                    continue
+                for unit_type in unit_types:
+                    cost = get_prototype(unit_type, self.game_state.config).cost[1]
+                    count = num if num is not None else (int(mp // cost) if cost > 0 else 1)
+                    if count > 0:
+                        candidates.append([(unit_type, x, y)] * count)
+        return candidates
+
+    def simulate(self, candidates):
+        """Simulates the action phase of every candidate
+
+        Args:
+            candidates: A list of deploy stacks, each a list of (unit_type, x, y) mobile units. Units that cannot be
+                        deployed, because their location is blocked, off the player's edges or they cannot be afforded, are skipped.
+
+        Returns:
+            A BatchResult
+        """
+        result = BatchResult(len(candidates))
+        stacks = [self.__deployable(stack) for stack in candidates]
+        for n, units in enumerate(stacks):
+            result.units_deployed[n] = len(units)
+        if numpy is not None and any(stacks):
+            self.__run_numpy(stacks, result)
+        else:
+            self.__run_python(stacks, result)
+        return result
+
+    def __deployable(self, stack):
+        """
+        Gets the units of a stack that can be deployed, as (prototype, path id).
+        """
+        deploy_cells = EDGE_SETS[2] | EDGE_SETS[3] if self.player_index == 0 else EDGE_SETS[0] | EDGE_SETS[1]
+        mp = self.game_state.get_resource(self.game_state.MP, self.player_index)
+        units = []
+        for unit_type, x, y in stack:
+            prototype = get_prototype(unit_type, self.game_state.config)
+            if x * ARENA_SIZE + y not in deploy_cells or self.game_state.contains_stationary_unit([x, y]) or prototype.cost[1] > mp:
+                continue
+            mp -= prototype.cost[1]
+            units.append((prototype, self.__path_id(x, y)))
+        return units
+
+    def estimate_path(self, path, unit_types):
+        """Estimates what happens to a stack of mobile units following a path, frame by frame
+
+        The units start together on the first cell of the path and move at the speeds in the config, taking
+        shields from the player's supports and damage from the opponent's turrets as in simulate, so each turret
+        attacks only one unit of the stack per frame. The tables for the structures and the path are kept,
+        so estimating many paths with one BatchSimulator only works out what is new to each.
+
+        Args:
+            path: A list of [x, y] locations, such as one from find_path_to_edge. The units breach if it ends on
+                  the edge opposite its first location.
+            unit_types: The mobile unit types in the stack, one entry per unit
+
+        Returns:
+            A PathDamage
+        """
+        key = tuple((x, y) for x, y in path)
+        path_id = self._paths.get(key)
+        if path_id is None:
+            target_edge = self.game_state.get_target_edge(path[0])
+            last = path[-1][0] * ARENA_SIZE + path[-1][1]
+            path_id = self.__add_path(key, path, len(path) > 1 and last in EDGE_SETS[target_edge])
+        stack = [(get_prototype(unit_type, self.game_state.config), path_id) for unit_type in unit_types]
+        result = BatchResult(1)
+        estimate = PathDamage(len(stack))
+        self.__run_stack(0, stack, result, estimate)
+        estimate.structure_damage = result.structure_damage[0]
+        estimate.breaches = result.breaches[0]
+        estimate.frames = result.frames[0]
+        return estimate
+
+    def __path_id(self, x, y):
+        """
+        Gets the id of the path from a spawn location, working out its cells, shields and distances the first time.
+        """
+        path_id = self._paths.get((x, y))
+        if path_id is not None:
+            return path_id
+        path = self.game_state.find_path_to_edge([x, y])
+        target_edge = self.game_state.get_target_edge([x, y])
+        breaches = len(path) > 1 and path[-1][0] * ARENA_SIZE + path[-1][1] in EDGE_SETS[target_edge]
+        return self.__add_path((x, y), path, breaches)
+
+    def __add_path(self, key, path, breaches):
+        """
+        Adds the cells, shields and breach of a path to the path table, returning its id.
+        """
+        rows = [self.__row(cell[0] * ARENA_SIZE + cell[1]) for cell in path]
+        shields = []
+        given = set()
+        total = 0
+        for cell_x, cell_y in path:
+            for s, support in enumerate(self._supports):
+                if s not in given and (support.x - cell_x) ** 2 + (support.y - cell_y) ** 2 < (support.shieldRange + self._hit_radius) ** 2:
+                    given.add(s)
+                    rows_from_side = support.y if support.player_index == 0 else ARENA_SIZE - 1 - support.y
+                    total += support.shieldPerUnit + support.shieldBonusPerY * rows_from_side
+            shields.append(total)
+        path_id = self._paths[key] = len(self._path_table)
+        self._path_table.append((rows, breaches, shields))
+        return path_id
+
+    def __row(self, index):
+        """
+        Gets the row of a path cell in the distance, coverage and targeting tables, adding it the first time.
+        The coverage of a row lists the opponent's structures that attack mobile units there, from the threat map.
+        """
+        row = self._rows.get(index)
+        if row is None:
+            row = self._rows[index] = len(self._distances)
+            x, y = index // ARENA_SIZE, index % ARENA_SIZE
+            self._distances.append([(structure.x - x) ** 2 + (structure.y - y) ** 2 for structure in self._structures])
+            self._coverage.append([self._structure_index[attacker.x * ARENA_SIZE + attacker.y]
+                                   for attacker in self._threat_map.attackers[index] if attacker.damage_i > 0])
+            sign = 1 if self.player_index == 1 else -1
+            # The parts of the targeting priority that depend on a mobile unit's cell, for structures choosing a target
+            self._unit_keys.append((sign * y, -abs(HALF_ARENA - 0.5 - x), x, y))
+        return row
+
+    def __structure_keys(self):
+        """
+        Gets the parts of the targeting priority that depend on a structure's location, for mobile units choosing a target.
+        """
+        sign = 1 if self.player_index == 0 else -1
+        return [(sign * structure.y, -abs(HALF_ARENA - 0.5 - structure.x), structure.x, structure.y) for structure in self._structures]
+
+    def __run_python(self, stacks, result):
+        """
+        Steps each candidate through the action phase in turn.
+        """
+        for n, stack in enumerate(stacks):
+            self.__run_stack(n, stack, result)
+
+    def __run_stack(self, n, stack, result, estimate=None):
+        """
+        Steps one candidate through the action phase, adding its outcome to entry n of the result,
+        and recording the damage taken each frame and the frame each unit dies in estimate if given.
+        """
+        paths = self._path_table
+        coverage = self._coverage
+        unit_keys = self._unit_keys
+        structure_keys = self._structure_keys
+        distances = self._distances
+        structures = self._structures
+        hit_radius = self._hit_radius
+        in_reach = self._in_reach
+
+        structure_health = [structure.health for structure in structures]
+        # [health, progress, position, path id, prototype, shield given, attack reach, index in the stack]
+        units = [[prototype.max_health, 0, 0, path_id, prototype, 0, (prototype.attackRange + hit_radius) ** 2, u]
+                 for u, (prototype, path_id) in enumerate(stack)]
+        frame = 0
+        while units and frame < self.MAX_FRAMES:
+            frame += 1
+            remaining = []
+            for unit in units:
+                prototype = unit[4]
+                rows, breaches, shields = paths[unit[3]]
+                unit[1] += prototype.speed
+                if unit[1] >= 1 - 1e-9:
+                    unit[1] -= 1
+                    if unit[2] + 1 >= len(rows):
+                        breach_damage, reward, steps, reach, damage = self._type_info[prototype.unit_type]
+                        result.self_destructs[n] += 1
+                        result.units_lost[n] += 1
+                        if unit[2] >= steps:
+                            row_distances = distances[rows[unit[2]]]
+                            for s in range(len(structures)):
+                                if structure_health[s] > 0 and row_distances[s] < reach:
+                                    structure_health[s] -= damage
+                                    result.structure_damage[n] += damage
+                        continue
+                    unit[2] += 1
+                    if breaches and unit[2] + 1 == len(rows):
+                        breach_damage, reward = self._type_info[prototype.unit_type][:2]
+                        result.breaches[n] += 1
+                        result.damage_dealt[n] += breach_damage
+                        result.sp_gained[n] += reward
+                        continue
+                unit[0] = unit[0] + shields[unit[2]] - unit[5]
+                unit[5] = shields[unit[2]]
+                remaining.append(unit)
+            units = remaining
+
+            # Every attacker chooses its target before damage is dealt
+            chosen = {}
+            for u, unit in enumerate(units):
+                row = paths[unit[3]][0][unit[2]]
+                for s in coverage[row]:
+                    if structure_health[s] > 0:
+                        key = (distances[row][s], unit[0]) + unit_keys[row] + (u,)
+                        if s not in chosen or key < chosen[s]:
+                            chosen[s] = key
+            unit_damage = [0] * len(units)
+            for s in sorted(chosen):
+                unit_damage[chosen[s][-1]] += structures[s].damage_i
+            structure_damage = []
+            for unit in units:
+                prototype = unit[4]
+                if prototype.damage_f <= 0:
+                    continue
+                row = paths[unit[3]][0][unit[2]]
+                targets = in_reach.get((row, unit[6]))
+                if targets is None:
+                    targets = in_reach[(row, unit[6])] = [s for s in range(len(structures)) if distances[row][s] < unit[6]]
+                best = None
+                for s in targets:
+                    if structure_health[s] > 0:
+                        key = (distances[row][s], structure_health[s]) + structure_keys[s] + (s,)
+                        if best is None or key < best:
+                            best = key
+                if best is not None:
+                    structure_damage.append((best[-1], prototype.damage_f))
+            for s, damage in structure_damage:
+                structure_health[s] -= damage
+                result.structure_damage[n] += damage
+
+            if estimate is not None:
+                estimate.damage_per_frame.append(float(sum(min(damage, unit[0]) for unit, damage in zip(units, unit_damage))))
+            remaining = []
+            for unit, damage in zip(units, unit_damage):
+                unit[0] -= damage
+                if unit[0] > 0:
+                    remaining.append(unit)
+                else:
+                    result.units_lost[n] += 1
+                    if estimate is not None:
+                        estimate.death_frames[unit[7]] = frame
+            units = remaining
+        result.frames[n] = frame
+        result.structures_destroyed[n] = sum(1 for s, structure in enumerate(structures) if structure.health > 0 >= structure_health[s])
+
+    def __run_numpy(self, stacks, result):
+        """
+        Steps every candidate through the action phase at once, as arrays of candidates by units.
+        """
+        paths = self._path_table
+        count, width = len(stacks), max(len(stack) for stack in stacks)
+        structure_count = len(self._structures)
+        length = max(len(rows) for rows, breaches, shields in paths)
+
+        path_rows = numpy.zeros((len(paths), length), dtype=numpy.int64)
+        path_length = numpy.zeros(len(paths), dtype=numpy.int64)
+        path_breaches = numpy.zeros(len(paths), dtype=bool)
+        path_shields = numpy.zeros((len(paths), length))
+        for path_id, (rows, breaches, shields) in enumerate(paths):
+            path_rows[path_id] = rows + [rows[-1]] * (length - len(rows))
+            path_shields[path_id] = shields + [shields[-1]] * (length - len(shields))
+            path_length[path_id] = len(rows)
+            path_breaches[path_id] = breaches
+
+        distances = numpy.array(self._distances, dtype=numpy.float64).reshape(len(self._distances), structure_count)
+        coverage = self.__padded(self._coverage)
+        unit_keys = numpy.array(self._unit_keys, dtype=numpy.float64).reshape(len(self._unit_keys), 4)
+        structure_keys = numpy.array(self._structure_keys, dtype=numpy.float64).reshape(structure_count, 4)
+        turret_damage = numpy.array([structure.damage_i for structure in self._structures], dtype=numpy.float64)
+        initial_health = numpy.array([structure.health for structure in self._structures], dtype=numpy.float64)
+        reaches = sorted({(prototype.attackRange + self._hit_radius) ** 2 for stack in stacks for prototype, path_id in stack if prototype.damage_f > 0})
+        targets_in_reach = [self.__padded([[s for s in range(structure_count) if self._distances[row][s] < value] for row in range(len(self._distances))])
+                            for value in reaches]
+
+        alive = numpy.zeros((count, width), dtype=bool)
+        health = numpy.zeros((count, width))
+        speed = numpy.zeros((count, width))
+        damage_f = numpy.zeros((count, width))
+        reach_class = numpy.full((count, width), -1, dtype=numpy.int64)
+        path = numpy.zeros((count, width), dtype=numpy.int64)
+        info = numpy.zeros((count, width, 5))
+        for n, stack in enumerate(stacks):
+            for u, (prototype, path_id) in enumerate(stack):
+                alive[n, u] = True
+                health[n, u] = prototype.max_health
+                speed[n, u] = prototype.speed
+                damage_f[n, u] = prototype.damage_f
+                if prototype.damage_f > 0:
+                    reach_class[n, u] = reaches.index((prototype.attackRange + self._hit_radius) ** 2)
+                path[n, u] = path_id
+                info[n, u] = self._type_info[prototype.unit_type]
+        progress = numpy.zeros((count, width))
+        position = numpy.zeros((count, width), dtype=numpy.int64)
+        shield_given = numpy.zeros((count, width))
+        structure_health = numpy.tile(initial_health, (count, 1))
+
+        totals = {field: numpy.zeros(count) for field in BatchResult.FIELDS}
+        frame = 0
+        while alive.any() and frame < self.MAX_FRAMES:
+            frame += 1
+            totals["frames"][alive.any(axis=1)] = frame
+
+            # Movement, breaches and self destructs
+            progress = numpy.where(alive, progress + speed, progress)
+            moving = alive & (progress >= 1 - 1e-9)
+            progress = numpy.where(moving, progress - 1, progress)
+            lengths = path_length[path]
+            ending = moving & (position + 1 >= lengths)
+            position = position + (moving & ~ending)
+            arrived = moving & ~ending & (position + 1 == lengths) & path_breaches[path]
+            totals["breaches"] += arrived.sum(axis=1)
+            totals["damage_dealt"] += (info[:, :, 0] * arrived).sum(axis=1)
+            totals["sp_gained"] += (info[:, :, 1] * arrived).sum(axis=1)
+            totals["self_destructs"] += ending.sum(axis=1)
+            totals["units_lost"] += ending.sum(axis=1)
+            rows = path_rows[path, position]
+            for n, u in zip(*numpy.nonzero(ending & (position >= info[:, :, 2]))):
+                hit = (structure_health[n] > 0) & (distances[rows[n, u]] < info[n, u, 3])
+                structure_health[n, hit] -= info[n, u, 4]
+                totals["structure_damage"][n] += info[n, u, 4] * hit.sum()
+            alive &= ~(ending | arrived)
+
+            shields = path_shields[path, position]
+            health = numpy.where(alive, health + shields - shield_given, health)
+            shield_given = numpy.where(alive, shields, shield_given)
+
+            # Every attacker chooses its target before damage is dealt. Each unit is paired with the structures
+            # in range of its cell, and the best pair of every attacker is found by sorting the pairs.
+            units_n, units_u = numpy.nonzero(alive)
+            unit_rows = rows[units_n, units_u]
+            pairs, turrets = numpy.nonzero(coverage[unit_rows] >= 0)
+            turrets = coverage[unit_rows[pairs], turrets]
+            standing = structure_health[units_n[pairs], turrets] > 0
+            pairs, turrets = pairs[standing], turrets[standing]
+            unit_damage = numpy.zeros((count, width))
+            if pairs.size > 0:
+                pair_rows = unit_rows[pairs]
+                keys = [distances[pair_rows, turrets], health[units_n[pairs], units_u[pairs]]]
+                keys += [unit_keys[pair_rows, k] for k in range(4)] + [units_u[pairs]]
+                chosen = self.__choose(units_n[pairs] * structure_count + turrets, keys)
+                pairs, turrets = pairs[chosen], turrets[chosen]
+                numpy.add.at(unit_damage, (units_n[pairs], units_u[pairs]), turret_damage[turrets])
+
+            attacks = []
+            for reach_index, table in enumerate(targets_in_reach):
+                attackers = numpy.flatnonzero(reach_class[units_n, units_u] == reach_index)
+                pairs, targets = numpy.nonzero(table[unit_rows[attackers]] >= 0)
+                targets = table[unit_rows[attackers[pairs]], targets]
+                pairs = attackers[pairs]
+                standing = structure_health[units_n[pairs], targets] > 0
+                pairs, targets = pairs[standing], targets[standing]
+                if pairs.size > 0:
+                    pair_rows = unit_rows[pairs]
+                    keys = [distances[pair_rows, targets], structure_health[units_n[pairs], targets]]
+                    keys += [structure_keys[targets, k] for k in range(4)] + [targets]
+                    chosen = self.__choose(pairs, keys)
+                    attacks.append((pairs[chosen], targets[chosen]))
+            if attacks:
+                pairs = numpy.concatenate([pairs for pairs, targets in attacks])
+                targets = numpy.concatenate([targets for pairs, targets in attacks])
+                # Damage is dealt in the order the units were deployed, as in the pure Python loop
+                order = numpy.argsort(pairs, kind="stable")
+                pairs, targets = pairs[order], targets[order]
+                damage = damage_f[units_n[pairs], units_u[pairs]]
+                numpy.add.at(structure_health, (units_n[pairs], targets), -damage)
+                numpy.add.at(totals["structure_damage"], units_n[pairs], damage)
+            health -= unit_damage
+
+            died = alive & (health <= 0)
+            totals["units_lost"] += died.sum(axis=1)
+            alive &= ~died
+
+        totals["structures_destroyed"] = ((initial_health > 0)[None, :] & (structure_health <= 0)).sum(axis=1)
+        for field in BatchResult.FIELDS:
+            if field == "units_deployed":
+                continue
+            values = totals[field].tolist()
+            if field not in BatchResult.FLOAT_FIELDS:
+                values = [int(value) for value in values]
+            setattr(result, field, values)
+
+    def __choose(self, groups, keys):
+        """
+        Picks the pair with the lowest keys, compared in order, from each group of pairs. Returns their indices.
+        """
+        order = numpy.lexsort(tuple(reversed(keys)) + (groups,))
+        sorted_groups = groups[order]
+        first = numpy.ones(order.size, dtype=bool)
+        first[1:] = sorted_groups[1:] != sorted_groups[:-1]
+        return order[first]
+
+    def __padded(self, lists):
+        """
+        Packs lists of indices into an array, padding the shorter ones with -1.
+        """
+        table = numpy.full((len(lists), max([len(indices) for indices in lists] + [1])), -1, dtype=numpy.int64)
+        for row, indices in enumerate(lists):
+            table[row, :len(indices)] = indices
+        return table
@@ -0,0 +1,287 @@
+import json
+import sys
+from .game_state import GameState
+from .simulator import ActionSimulator, FrameRecord
+
+
+def load_replay(path):
+    """Reads a .replay file written by the game engine
+
+    The file holds one JSON document per line, the first being the config and the rest the state of every frame.
+
+    Args:
+        path: The location of the replay file
+
+    Returns:
+        The config, and a dict from (turn number, frame number) to the state of that frame
+    """
+    config = None
+    frames = {}
+    with open(path) as replay_file:
+        for line in replay_file:
+            line = line.replace("\n", "").replace("\t", "")
+            if line == "":
+                continue
+            data = json.loads(line)
+            if "debug" in data:
+                config = data
+            else:
+                frames[(data["turnInfo"][1], data["turnInfo"][2])] = data
+    return config, frames
+
+
+def record_from_frame(config, frame_state):
+    """Reads the units and breaches of a recorded frame into a FrameRecord
+
+    Args:
+        config: Contains information about the game
+        frame_state: The state of the frame, as loaded by load_replay
+
+    Returns:
+        The FrameRecord of the frame
+    """
+    unit_information = config["unitInformation"]
+    record = FrameRecord(frame_state["turnInfo"][2])
+    for player_index, key in enumerate(("p1Units", "p2Units")):
+        for type_index, units in enumerate(frame_state[key]):
+            type_config = unit_information[type_index]
+            if "unitCategory" not in type_config:
+                continue
+            unit_type = type_config["shorthand"]
+            for unit in units:
+                x, y, health, unit_id = int(unit[0]), int(unit[1]), float(unit[2]), str(unit[3])
+                if type_config["unitCategory"] == 0:
+                    record.structures[(x, y)] = (unit_type, player_index, health)
+                else:
+                    record.mobiles[unit_id] = (unit_type, player_index, x, y, health)
+    for breach in frame_state.get("events", {}).get("breach", []):
+        record.breaches.add(str(breach[3]))
+    return record
+
+
+def get_spawns(config, frame_state):
+    """Gets the mobile units on the board at frame 0 of an action phase, in the order they spawned
+
+    Units are ordered by the frame's spawn events. Any mobile unit without one follows, in the order it is listed.
+
+    Args:
+        config: Contains information about the game
+        frame_state: The state of frame 0, as loaded by load_replay
+
+    Returns:
+        A list of (unit_id, unit_type, player_index, [x, y]), as taken by ActionSimulator.simulate_frames
+    """
+    record = record_from_frame(config, frame_state)
+    spawns = []
+    for location, type_index, unit_id, player in frame_state.get("events", {}).get("spawn", []):
+        unit_id = str(unit_id)
+        if unit_id in record.mobiles:
+            unit_type, player_index, x, y, health = record.mobiles.pop(unit_id)
+            spawns.append((unit_id, unit_type, player_index, [x, y]))
+    for unit_id, (unit_type, player_index, x, y, health) in record.mobiles.items():
+        spawns.append((unit_id, unit_type, player_index, [x, y]))
+    return spawns
+
+
+class TurnReport:
+    """How far the simulation of one action phase strayed from the recorded one, see FidelityHarness.
+
+    Errors are counted frame by frame, so a unit that is one cell behind for ten frames counts ten position errors.
+
+    Attributes :
+        * turn (int): The turn number of the action phase
+        * recorded_frames (int): The number of frames recorded after frame 0
+        * simulated_frames (int): The number of frames simulated after frame 0
+        * first_divergence (int): The first frame that differs, or None if every frame matched
+        * divergent_frames (int): The number of frames that differ
+        * position_errors (int): Mobile units found on a different cell
+        * health_errors (int): Units whose health differs by more than the tolerance
+        * max_health_error (float): The largest difference in the health of a unit
+        * death_errors (int): Units on the board in only one of the two frames
+        * breach_errors (int): Breaches that happened in only one of the two frames
+
+    """
+    def __init__(self, turn):
+        self.turn = turn
+        self.recorded_frames = 0
+        self.simulated_frames = 0
+        self.first_divergence = None
+        self.divergent_frames = 0
+        self.position_errors = 0
+        self.health_errors = 0
+        self.max_health_error = 0.0
+        self.death_errors = 0
+        self.breach_errors = 0
+
+    @property
+    def matched(self):
+        return self.first_divergence is None
+
+    def __str__(self):
+        if self.matched:
+            return "Turn {}: {} frames matched".format(self.turn, self.recorded_frames)
+        return ("Turn {}: first divergence at frame {}, {} of {} frames differ (simulated {}), positions {}, health {} "
+                "(max {:.2f}), deaths {}, breaches {}").format(self.turn, self.first_divergence, self.divergent_frames,
+                                                              self.recorded_frames, self.simulated_frames, self.position_errors,
+                                                              self.health_errors, self.max_health_error, self.death_errors, self.breach_errors)
+
+
+class FidelityHarness:
+    """Replays the action phases recorded in .replay files through a simulator, and reports where the two diverge.
+
+    Any simulator can be checked if it has a method
+
+        simulate_frames(game_state, spawns)
+
+    taking a GameState of frame 0 of an action phase, with the units that spawned on its map, and the
+    (unit_id, unit_type, player_index, [x, y]) of those mobile units in spawn order. It returns an iterable of
+    FrameRecords, one per frame starting with frame 0, with mobile units keyed by the given ids. ActionSimulator is one.
+
+    Run as a module to check replays from the command line:
+
+        python -m gamelib.fidelity replays/*.replay
+
+    Attributes :
+        * simulator: The simulator to check. If None, an ActionSimulator is made for the config of each replay
+        * tolerance (float): The largest difference in health that is not counted as an error
+
+    """
+    def __init__(self, simulator=None, tolerance=1e-6):
+        self.simulator = simulator
+        self.tolerance = tolerance
+
+    def check_replay(self, path):
+        """Compares every action phase of a replay with its simulation
+
+        Args:
+            path: The location of the replay file
+
+        Returns:
+            A list of TurnReports, by turn. Empty if the file has no config.
+        """
+        config, frames = load_replay(path)
+        if config is None:
+            return []
+        simulator = self.simulator if self.simulator is not None else ActionSimulator(config)
+        turns = sorted(turn for turn, frame in frames if frame == 0)
+        return [self.check_turn(simulator, config, frames, turn) for turn in turns]
+
+    def check_turn(self, simulator, config, frames, turn):
+        """Simulates one recorded action phase and compares it frame by frame
+
+        Args:
+            simulator: The simulator to check
+            config: Contains information about the game
+            frames: The recorded frames, as loaded by load_replay
+            turn: The turn number of the action phase
+
+        Returns:
+            A TurnReport
+        """
+        first_frame = frames[(turn, 0)]
+        recorded = []
+        while (turn, len(recorded)) in frames:
+            recorded.append(record_from_frame(config, frames[(turn, len(recorded))]))
+        game_state = GameState(config, first_frame)
+        game_state.suppress_warnings(True)
+        simulated = list(simulator.simulate_frames(game_state, get_spawns(config, first_frame)))
+        return self.compare(turn, recorded, simulated)
+
+    def compare(self, turn, recorded, simulated):
+        """Compares two lists of FrameRecords frame by frame
+
+        If one list is shorter, its last frame stands in for the frames it is missing.
+
+        Args:
+            turn: The turn number to report
+            recorded: The FrameRecords of the engine
+            simulated: The FrameRecords of the simulator
+
+        Returns:
+            A TurnReport
+        """
+        report = TurnReport(turn)
+        report.recorded_frames = len(recorded) - 1
+        report.simulated_frames = len(simulated) - 1
+        for frame in range(max(len(recorded), len(simulated))):
+            if self.__compare_frame(report, recorded[min(frame, len(recorded) - 1)], simulated[min(frame, len(simulated) - 1)],
+                                    frame < len(recorded) and frame < len(simulated)):
+                report.divergent_frames += 1
+                if report.first_divergence is None:
+                    report.first_divergence = frame
+        return report
+
+    def __compare_frame(self, report, recorded, simulated, count_breaches):
+        """
+        Adds the differences between two FrameRecords to a report, returning True if there were any.
+        """
+        errors = 0
+        for unit_id in recorded.mobiles.keys() | simulated.mobiles.keys():
+            expected = recorded.mobiles.get(unit_id)
+            actual = simulated.mobiles.get(unit_id)
+            if expected is None or actual is None:
+                report.death_errors += 1
+                errors += 1
+                continue
+            if expected[2:4] != actual[2:4]:
+                report.position_errors += 1
+                errors += 1
+            errors += self.__compare_health(report, expected[4], actual[4])
+        for location in recorded.structures.keys() | simulated.structures.keys():
+            expected = recorded.structures.get(location)
+            actual = simulated.structures.get(location)
+            if expected is None or actual is None:
+                report.death_errors += 1
+                errors += 1
+                continue
+            errors += self.__compare_health(report, expected[2], actual[2])
+        if count_breaches:
+            breach_errors = len(recorded.breaches ^ simulated.breaches)
+            report.breach_errors += breach_errors
+            errors += breach_errors
+        return errors > 0
+
+    def __compare_health(self, report, expected, actual):
+        """
+        Counts a health error if two health values differ by more than the tolerance.
+        """
+        difference = abs(expected - actual)
+        report.max_health_error = max(report.max_health_error, difference)
+        if difference > self.tolerance:
+            report.health_errors += 1
+            return 1
+        return 0
+
+
+def summarize(reports):
+    """Totals the TurnReports of one or more replays
+
+    Args:
+        reports: A list of TurnReports
+
+    Returns:
+        A string with the number of turns that matched and the total of each kind of error
+    """
+    matched = sum(1 for report in reports if report.matched)
+    divergences = [report.first_divergence for report in reports if not report.matched]
+    earliest = min(divergences) if divergences else None
+    return ("{} of {} action phases matched, earliest divergence at frame {}, positions {}, health {} (max {:.2f}), "
+            "deaths {}, breaches {}").format(matched, len(reports), earliest, sum(report.position_errors for report in reports),
+                                             sum(report.health_errors for report in reports),
+                                             max([report.max_health_error for report in reports] or [0.0]),
+                                             sum(report.death_errors for report in reports),
+                                             sum(report.breach_errors for report in reports))
+
+
+if __name__ == "__main__":
+    all_reports = []
+    for replay_path in sys.argv[1:]:
+        reports = FidelityHarness().check_replay(replay_path)
+        print(replay_path)
+        for turn_report in reports:
+            if not turn_report.matched:
+                print("  {}".format(turn_report))
+        print("  {}".format(summarize(reports)))
+        all_reports.extend(reports)
+    if len(sys.argv) > 2:
+        print(summarize(all_reports))
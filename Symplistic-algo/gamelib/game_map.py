@@ -1,6 +1,52 @@
 import math
+import copy
+import hashlib
 from .unit import GameUnit
 from .util import debug_write
+from .board import ARENA_SIZE, HALF_ARENA, CELLS, EDGES, CELL_COUNT, IN_BOUNDS, in_bounds, range_stencil
+
+class UnitList(list):
+    """The units at one location of a GameMap, as returned by game_map[x, y].
+
+    A read only list. The map keeps its structure bitboard, version, hash and forks in step with its cells,
+    so changing the list in place would leave them out of date. Change cells with GameMap.add_unit, place_unit,
+    remove_unit, upgrade_unit or game_map[x, y] = units instead.
+    """
+    __slots__ = ()
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("The units at a location are read only, change them with GameMap.add_unit, place_unit, "
+                        "remove_unit, upgrade_unit or game_map[x, y] = units")
+
+    append = extend = insert = remove = pop = clear = sort = reverse = _read_only
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+
+    def __reduce__(self):
+        return UnitList, (list(self),)
+
+
+# One key per cell, structure type, player and upgrade, so the table is bounded by the board and the config
+_ZOBRIST_KEYS = {}
+_MASK_64 = (1 << 64) - 1
+
+
+def _zobrist_key(index, unit_type, player_index, upgraded, health):
+    """
+    The random 64 bit key of a cell state. Derived from the state itself, so it is the same in every process.
+    Health is mixed into the key of the rest of the state with splitmix64 rather than kept in the table,
+    so the table does not grow with every health value seen.
+    """
+    feature = (index, unit_type, player_index, upgraded)
+    key = _ZOBRIST_KEYS.get(feature)
+    if key is None:
+        digest = hashlib.blake2b(repr(feature).encode(), digest_size=8).digest()
+        key = _ZOBRIST_KEYS[feature] = int.from_bytes(digest, "little")
+    # hash() of a number does not depend on the process, unlike that of a string
+    mixed = (key ^ (hash(health) & _MASK_64)) + 0x9E3779B97F4A7C15 & _MASK_64
+    mixed = (mixed ^ (mixed >> 30)) * 0xBF58476D1CE4E5B9 & _MASK_64
+    mixed = (mixed ^ (mixed >> 27)) * 0x94D049BB133111EB & _MASK_64
+    return mixed ^ (mixed >> 31)
+
 
 class GameMap:
     """Holds data about the current game map and provides functions
@@ -9,6 +55,9 @@ class GameMap:
     game_map[x, y] will return a list of Units located at that location, 
     or an empty list if there are no units at the location
 
+    The list is read only, see UnitList. Change cells with add_unit, place_unit, remove_unit, upgrade_unit
+    or game_map[x, y] = units, which keep structure_bits, the structure version and forks up to date.
+
     Attributes :
         * config (JSON): Contains information about the current game rules
         * enable_warnings (bool): If true, debug messages for game_map functions will print out
@@ -18,8 +67,19 @@ class GameMap:
         * TOP_LEFT (int): A constant that represents the top left edge
         * BOTTOM_LEFT (int): Hidden challenge! Can you guess what this constant represents???
         * BOTTOM_RIGHT (int): A constant that represents the bottom right edge
+        * structure_version (int): Incremented whenever a structure is added to, removed from or upgraded on the map
+        * structure_changes (list): The [x, y] location of every such change since the map was created or forked, see get_structure_changes
+        * structure_changes_base (int): The structure_version the map was created or forked at, which structure_changes starts from
+        * structure_bits (int): A bitboard of every cell holding a structure, see gamelib.board. Also usable as a key for the structure layout
+        * zobrist_hash (int): A 64 bit hash of the type, owner, upgrade and health of every structure, updated with each structure change.
+          Equal maps have equal hashes, so it can key a TranspositionTable. Units changed in place, other than by upgrade_unit, are not seen
+          until the cell is set again with game_map[x, y] = units
+        * ZOBRIST_HEALTH_STEP (float): If set, structure health is rounded down to a multiple of it before hashing, so small
+          differences in health do not change zobrist_hash. Set it on the class before any units are added
 
     """
+    ZOBRIST_HEALTH_STEP = None
+
     def __init__(self, config):
         """Initializes constants and game map
 
@@ -29,14 +89,24 @@ class GameMap:
         """
         self.config = config
         self.enable_warnings = True
-        self.ARENA_SIZE = 28
-        self.HALF_ARENA = int(self.ARENA_SIZE / 2)
+        self.ARENA_SIZE = ARENA_SIZE
+        self.HALF_ARENA = HALF_ARENA
         self.TOP_RIGHT = 0
         self.TOP_LEFT = 1
         self.BOTTOM_LEFT = 2
         self.BOTTOM_RIGHT = 3
         self.__map = self.__empty_grid()
-        self.__start = [13,0]
+        self.__start = 0
+        self.structure_version = 0
+        self.structure_changes = []
+        self.structure_changes_base = 0
+        self.structure_bits = 0
+        self.zobrist_hash = 0
+        self.__bitboards = {}
+        self.__cell_keys = {}
+        self.__stencils = {}
+        self.__shared_columns = None
+        self.__shares_units = False
     
     def __getitem__(self, location):
         if len(location) == 2 and self.in_arena_bounds(location):
@@ -46,35 +116,137 @@ class GameMap:
 
     def __setitem__(self, location, val):
         if type(location) == tuple and len(location) == 2 and self.in_arena_bounds(location):
-            self.__map[location[0]][location[1]] = val
+            self.__own_column(location[0])
+            self.__map[location[0]][location[1]] = UnitList(val)
+            self._structure_changed(location[0], location[1])
             return
         self._invalid_coordinates(location)
 
     def __iter__(self):
-        self.__start = [13,0]
+        self.__start = 0
         return self
     
     def __next__(self):
-        location = self.__start
-        if location == [15,27]:
+        if self.__start == len(CELLS):
             raise StopIteration
-        new_location = [location[0]+1, location[1]]
-        while not self.in_arena_bounds(new_location) and not location == [14,27]:
-            if new_location[0] == self.ARENA_SIZE:
-                new_location = [0, new_location[1]+1]
-            else:
-                new_location = [new_location[0]+1, new_location[1]]
-        self.__start = new_location
-        return location 
+        x, y = CELLS[self.__start]
+        self.__start += 1
+        return [x, y]
 
     def __empty_grid(self):
         grid = []
         for x in range(0, self.ARENA_SIZE):
             grid.append([])
             for _ in range(0, self.ARENA_SIZE):
-                grid[x].append([])
+                grid[x].append(UnitList())
         return grid
 
+    def __own_column(self, x):
+        """
+        Copies a column of cells shared with a fork before it is written to.
+        """
+        shared = self.__shared_columns
+        if shared is not None and shared[x]:
+            self.__map[x] = [UnitList(cell) for cell in self.__map[x]]
+            shared[x] = False
+
+    def fork(self):
+        """Creates a copy of the map that shares its cells until either map changes them
+
+        Columns of cells are copied the first time a unit is added, removed or upgraded in them through
+        the GameMap functions, so a fork costs about as much as the cells it changes. Changing the units
+        in the lists returned by game_map[x, y] directly affects both maps.
+
+        Returns:
+            The new GameMap
+
+        """
+        fork = GameMap.__new__(GameMap)
+        fork.__dict__.update(self.__dict__)
+        fork.__map = list(self.__map)
+        fork.__start = 0
+        # Anything following the original is caught up before it forks, so the fork's log starts empty
+        fork.structure_changes = []
+        fork.structure_changes_base = self.structure_version
+        fork.__bitboards = dict(self.__bitboards)
+        fork.__cell_keys = dict(self.__cell_keys)
+        self.__shared_columns = [True] * self.ARENA_SIZE
+        fork.__shared_columns = [True] * self.ARENA_SIZE
+        self.__shares_units = True
+        fork.__shares_units = True
+        return fork
+
+    def get_structure_changes(self, since_version):
+        """Gets the locations of the structure changes made since a version of the map
+
+        Args:
+            since_version: An earlier structure_version of this map
+
+        Returns:
+            A list of [x, y] locations, or None if the version is from before the map was forked and the changes are not kept
+
+        """
+        if since_version < self.structure_changes_base:
+            return None
+        return self.structure_changes[since_version - self.structure_changes_base:]
+
+    def _structure_changed(self, x, y):
+        self.structure_version += 1
+        self.structure_changes.append([x, y])
+
+        index = x * self.ARENA_SIZE + y
+        bit = 1 << index
+        for key, bits in self.__bitboards.items():
+            if bits & bit:
+                self.__bitboards[key] = bits & ~bit
+        self.structure_bits &= ~bit
+        self.zobrist_hash ^= self.__cell_keys.pop(index, 0)
+        for unit in self.__map[x][y]:
+            if unit.stationary:
+                key = (unit.player_index, unit.unit_type)
+                self.__bitboards[key] = self.__bitboards.get(key, 0) | bit
+                self.structure_bits |= bit
+                health = float(unit.health)
+                if self.ZOBRIST_HEALTH_STEP:
+                    health = health // self.ZOBRIST_HEALTH_STEP
+                cell_key = _zobrist_key(index, unit.unit_type, unit.player_index, unit.upgraded, health)
+                self.__cell_keys[index] = cell_key
+                self.zobrist_hash ^= cell_key
+                break
+
+    def get_bitboard(self, player_index=None, unit_type=None):
+        """Gets the cells holding structures as a bitboard, see gamelib.board for helpers that work on bitboards
+
+        Args:
+            player_index: Only include structures of this player, 0 for you 1 for the enemy. All players if None
+            unit_type: Only include structures of this type. Use the constants provided in algo_strategy. All types if None
+
+        Returns:
+            An int with bit x * 28 + y set for every matching structure at [x, y]
+
+        """
+        if player_index is None and unit_type is None:
+            return self.structure_bits
+        bits = 0
+        for (owner, structure_type), structure_bits in self.__bitboards.items():
+            if (player_index is None or owner == player_index) and (unit_type is None or structure_type == unit_type):
+                bits |= structure_bits
+        return bits
+
+    def get_occupied_bits(self):
+        """Gets the cells holding any units, structures or mobile units, as a bitboard
+
+        Returns:
+            An int with bit x * 28 + y set for every location that is not empty
+
+        """
+        bits = 0
+        for x, column in enumerate(self.__map):
+            for y, units in enumerate(column):
+                if units:
+                    bits |= 1 << (x * self.ARENA_SIZE + y)
+        return bits
+
     def _invalid_coordinates(self, location):
         self.warn("{} is out of bounds.".format(str(location)))
 
@@ -89,19 +261,7 @@ class GameMap:
         
         """
         x, y = location
-        half_board = self.HALF_ARENA
-
-        row_size = y + 1
-        startx = half_board - row_size
-        endx = startx + (2 * row_size) - 1
-        top_half_check = (y < self.HALF_ARENA and x >= startx and x <= endx)
-
-        row_size = (self.ARENA_SIZE - 1 - y) + 1
-        startx = half_board - row_size
-        endx = startx + (2 * row_size) - 1
-        bottom_half_check = (y >= self.HALF_ARENA and x >= startx and x <= endx)
-
-        return bottom_half_check or top_half_check
+        return in_bounds(x, y)
 
     def get_edge_locations(self, quadrant_description):
         """Takes in an edge description and returns a list of locations.
@@ -117,8 +277,7 @@ class GameMap:
             self.warn("Passed invalid quadrant_description '{}'. See the documentation for valid inputs for get_edge_locations.".format(quadrant_description))
             return
 
-        edges = self.get_edges()
-        return edges[quadrant_description]
+        return [[x, y] for x, y in EDGES[quadrant_description]]
 
     def get_edges(self):
         """Gets all of the edges and their edge locations
@@ -127,27 +286,7 @@ class GameMap:
             A list with four lists inside of it of locations corresponding to the four edges.
             [0] = top_right, [1] = top_left, [2] = bottom_left, [3] = bottom_right.
         """
-        top_right = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA + num
-            y = self.ARENA_SIZE - 1 - num
-            top_right.append([int(x), int(y)])
-        top_left = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA - 1 - num
-            y = self.ARENA_SIZE - 1 - num
-            top_left.append([int(x), int(y)])
-        bottom_left = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA - 1 - num
-            y = num
-            bottom_left.append([int(x), int(y)])
-        bottom_right = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA + num
-            y = num
-            bottom_right.append([int(x), int(y)])
-        return [top_right, top_left, bottom_left, bottom_right]
+        return [[[x, y] for x, y in edge] for edge in EDGES]
     
     def add_unit(self, unit_type, location, player_index=0):
         """Add a single GameUnit to the map at the given location.
@@ -168,10 +307,58 @@ class GameMap:
 
         x, y = location
         new_unit = GameUnit(unit_type, self.config, player_index, None, location[0], location[1])
+        self.__own_column(x)
         if not new_unit.stationary:
-            self.__map[x][y].append(new_unit)
+            list.append(self.__map[x][y], new_unit)
         else:
-            self.__map[x][y] = [new_unit]
+            self.__map[x][y] = UnitList((new_unit,))
+            self._structure_changed(x, y)
+
+    def place_unit(self, unit):
+        """Add an existing GameUnit to the map at its own x and y, next to any units already there.
+
+        Args:
+            unit: The GameUnit to add
+
+        Used by GameState to add the units it parses. Unlike add_unit, a structure does not replace the units at its location.
+        """
+        x, y = unit.x, unit.y
+        if not self.in_arena_bounds([x, y]):
+            self._invalid_coordinates([x, y])
+            return
+        self.__own_column(x)
+        list.append(self.__map[x][y], unit)
+        if unit.stationary:
+            self._structure_changed(x, y)
+
+    def upgrade_unit(self, location):
+        """Upgrade the structure on the map at the given location.
+
+        Args:
+            location: The location of the structure to upgrade
+
+        Returns:
+            The upgraded structure, or None if there is no structure at the location
+
+        This function does not affect your turn and only changes the data stored in GameMap. Use GameState.attempt_upgrade to upgrade
+        your structures during a turn.
+        """
+        if not self.in_arena_bounds(location):
+            self._invalid_coordinates(location)
+            return
+
+        x, y = location
+        self.__own_column(x)
+        cell = self.__map[x][y]
+        for i, unit in enumerate(cell):
+            if unit.stationary:
+                if self.__shares_units:
+                    # The unit may also be on a fork of this map
+                    unit = copy.copy(unit)
+                    list.__setitem__(cell, i, unit)
+                unit.upgrade()
+                self._structure_changed(x, y)
+                return unit
 
     def remove_unit(self, location):
         """Remove all units on the map in the given location.
@@ -186,14 +373,22 @@ class GameMap:
             self._invalid_coordinates(location)
         
         x, y = location
-        self.__map[x][y] = []
+        had_structure = any(unit.stationary for unit in self.__map[x][y])
+        self.__own_column(x)
+        self.__map[x][y] = UnitList()
+        if had_structure:
+            self._structure_changed(x, y)
 
-    def get_locations_in_range(self, location, radius):
+    def get_locations_in_range(self, location, radius, output_format="list"):
         """Gets locations in a circular area around a location
 
+        For integer locations the cells in range come from a stencil of offsets that is built once per radius,
+        so a query only adds offsets and checks bounds.
+
         Args:
             location: The center of our search area
             radius: The radius of our search area
+            output_format: "list" for [x, y] lists, "tuple" for (x, y) tuples or "index" for flat x * 28 + y indices
 
         Returns:
             The locations that are within our search area
@@ -203,17 +398,42 @@ class GameMap:
             self.warn("Radius {} was passed to get_locations_in_range. Expected integer between 0 and {}".format(radius, self.ARENA_SIZE))
         if not self.in_arena_bounds(location):
             self._invalid_coordinates(location)
+        if output_format not in ("list", "tuple", "index"):
+            self.warn("Passed invalid output_format '{}' to get_locations_in_range. Expected 'list', 'tuple' or 'index'.".format(output_format))
+            return
+
+        x, y = location
+        if type(x) is not int or type(y) is not int:
+            locations = self.__locations_in_range(location, radius)
+        else:
+            stencil = self.__stencils.get(radius)
+            if stencil is None:
+                getHitRadius = self.config["unitInformation"][0]['getHitRadius']
+                stencil = self.__stencils[radius] = range_stencil(radius, getHitRadius)
+            if 0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE:
+                center = x * ARENA_SIZE + y
+                # With y + dy on the board, the flat index is on the board exactly when x + dx is
+                locations = [(x + dx, y + dy) for dx, dy, offset in stencil
+                             if 0 <= y + dy < ARENA_SIZE and 0 <= center + offset < CELL_COUNT and IN_BOUNDS[center + offset]]
+            else:
+                locations = [(x + dx, y + dy) for dx, dy, _ in stencil if in_bounds(x + dx, y + dy)]
+
+        if output_format == "tuple":
+            return locations
+        if output_format == "index":
+            return [i * ARENA_SIZE + j for i, j in locations]
+        return [[i, j] for i, j in locations]
 
+    def __locations_in_range(self, location, radius):
         x, y = location
         locations = []
         search_radius = math.ceil(radius)
         getHitRadius = self.config["unitInformation"][0]['getHitRadius']
         for i in range(int(x - search_radius), int(x + search_radius + 1)):
             for j in range(int(y - search_radius), int(y + search_radius + 1)):
-                new_location = [i, j]
                 # A unit with a given range affects all locations who's centers are within that range + get hit radius
-                if self.in_arena_bounds(new_location) and self.distance_between_locations(location, new_location) < radius + getHitRadius:
-                    locations.append(new_location)
+                if self.in_arena_bounds([i, j]) and self.distance_between_locations(location, [i, j]) < radius + getHitRadius:
+                    locations.append((i, j))
         return locations
 
     def distance_between_locations(self, location_1, location_2):
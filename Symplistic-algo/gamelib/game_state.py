@@ -1,11 +1,17 @@
 import math
-import json
 import sys
+from collections import OrderedDict
 
 from .navigation import ShortestPathFinder
-from .util import send_command, debug_write
+from .overlay import StructureOverlay
+from .threat import ThreatMap
+from .unit_table import UnitTable
+from .simulator import ActionSimulator
+from .batch import BatchSimulator
+from .util import send_turn, debug_write, decode_message
 from .unit import GameUnit
 from .game_map import GameMap
+from .board import ARENA_SIZE, HALF_ARENA, EDGE_OF
 
 def is_stationary(unit_type):
     """
@@ -44,15 +50,24 @@ class GameState:
         * my_time (int): The time you took to submit your previous turn
         * enemy_health (int): Your opponents current remaining health
         * enemy_time (int): Your opponents current remaining time
+        * PATH_CACHE_SIZE (int): The number of paths find_path_to_edge remembers before evicting the least recently used
+        * BUILD_UNIT_TABLE (bool): If the UnitTable returned by get_unit_table is filled while parsing the turn
+        * LAZY_PARSE (bool): If the map and its units are only built when game_map is first used. The turn number, health and resources are always read immediately.
 
     """
+    PATH_CACHE_SIZE = 1024
+    BUILD_UNIT_TABLE = False
+    LAZY_PARSE = False
 
-    def __init__(self, config, serialized_string):
+    def __init__(self, config, serialized_string, previous_state=None):
         """ Setup a turns variables using arguments passed
 
         Args:
             * config (JSON): A json object containing information about the game
-            * serialized_string (string): A string containing information about the game state at the start of this turn
+            * serialized_string (string): A string containing information about the game state at the start of this turn.
+              The dict it decodes to, or the EngineMessage passed to on_turn, is also accepted and is not decoded again.
+            * previous_state (:obj: GameState): The GameState of an earlier turn of the same game. If given, its map is
+              reused and only the locations whose units changed are rebuilt, see __reuse_map.
 
         """
         self.serialized_string = serialized_string
@@ -81,29 +96,58 @@ class GameState:
         ALL_UNITS = [SCOUT, DEMOLISHER, INTERCEPTOR, WALL, SUPPORT, TURRET]
         STRUCTURE_TYPES = [WALL, SUPPORT, TURRET]
 
-        self.ARENA_SIZE = 28
-        self.HALF_ARENA = int(self.ARENA_SIZE / 2)
+        self.ARENA_SIZE = ARENA_SIZE
+        self.HALF_ARENA = HALF_ARENA
         self.MP = 1
         self.SP = 0
         global MP, SP
         MP = self.MP
         SP = self.SP
 
-        self.game_map = GameMap(self.config)
         self._shortest_path_finder = ShortestPathFinder()
+        self._path_cache = OrderedDict()
+        self._threat_maps = [ThreatMap(0), ThreatMap(1)]
+        self._path_estimator = None
         self._build_stack = []
         self._deploy_stack = []
         self._player_resources = [
                 {'SP': 0, 'MP': 0},  # player 0, which is you
                 {'SP': 0, 'MP': 0}]  # player 1, which is the opponent
+        self._unit_table = UnitTable(self.config) if self.BUILD_UNIT_TABLE else None
         self.__parse_state(serialized_string)
+        if previous_state is not None:
+            self.__reuse_map(previous_state)
+        elif not self.LAZY_PARSE:
+            self.__build_map()
+
+    def fork(self):
+        """Creates a copy of this GameState to explore a hypothetical branch, such as one build order in a search
+
+        The config and the parsed turn are shared. The map is forked with GameMap.fork, so its cells are only
+        copied once the branch changes them, and the resources and build and deploy stacks are copied.
+        Pathfinding and threat maps continue from this state's, and the path cache is shared by all forks,
+        as it is keyed by the structure layout.
+
+        Returns:
+            The new GameState
+
+        """
+        fork = GameState.__new__(GameState)
+        fork.__dict__.update(self.__dict__)
+        fork.game_map = self.game_map.fork()
+        fork._shortest_path_finder = self._shortest_path_finder.fork(fork)
+        fork._threat_maps = [threat_map.fork(fork.game_map) for threat_map in self._threat_maps]
+        fork._build_stack = list(self._build_stack)
+        fork._deploy_stack = list(self._deploy_stack)
+        fork._player_resources = [dict(resources) for resources in self._player_resources]
+        return fork
 
     def __parse_state(self, state_line):
         """
         Fills in map based on the serialized game state so that self.game_map[x,y] is a list of GameUnits at that location.
-        state_line is the game state as a json string.
+        state_line is the game state as a json string, or as the dict it decodes to.
         """
-        state = json.loads(state_line)
+        state = decode_message(state_line)
 
         turn_info = state["turnInfo"]
         self.turn_number = int(turn_info[1])
@@ -123,9 +167,94 @@ class GameState:
         p1units = state["p1Units"]
         p2units = state["p2Units"]
 
+        self._unparsed_units = (p1units, p2units)
+
+    def __build_map(self):
+        """
+        Creates game_map and the units parsed from the turn.
+        """
+        p1units, p2units = self._unparsed_units
+        self._unparsed_units = None
+        self.game_map = GameMap(self.config)
         self.__create_parsed_units(p1units, 0)
         self.__create_parsed_units(p2units, 1)
 
+    def __reuse_map(self, previous_state):
+        """
+        Creates game_map by forking the map of previous_state and replacing the units only where they differ from this turn's.
+        Unchanged GameUnits are shared with previous_state, and the pathfinder and threat maps continue from its own,
+        repairing only around the changed locations. previous_state itself is not changed.
+        """
+        p1units, p2units = self._unparsed_units
+        self._unparsed_units = None
+        previous_map = previous_state.game_map
+        # Catch the previous finder and threat maps up with their map, so the forks below can continue from them
+        if previous_state._shortest_path_finder._game_map is previous_map:
+            previous_state._shortest_path_finder.sync_layout(previous_state)
+        for threat_map in previous_state._threat_maps:
+            if threat_map._game_map is previous_map:
+                threat_map.sync(previous_map)
+        self.game_map = previous_map.fork()
+        self._shortest_path_finder = previous_state._shortest_path_finder.fork(self)
+        self._threat_maps = [threat_map.fork(self.game_map) for threat_map in previous_state._threat_maps]
+        self._path_cache = previous_state._path_cache
+
+        # Each location's units as [unit_type, player_index, health, upgraded, pending_removal], applied in the same order as __create_parsed_units
+        typedef = self.config.get("unitInformation")
+        parsed = {}
+        for player_number, units in enumerate([p1units, p2units]):
+            for i, unit_types in enumerate(units):
+                unit_type = typedef[i].get("shorthand")
+                for uinfo in unit_types:
+                    x, y = int(uinfo[0]), int(uinfo[1])
+                    index = x * ARENA_SIZE + y
+                    if unit_type == REMOVE or unit_type == UPGRADE:
+                        # Marked on the same unit as in __create_parsed_units: the first unit of the cell for a
+                        # removal, and the first structure, as GameMap.upgrade_unit picks, for an upgrade
+                        entries = parsed.get(index, ())
+                        structures = [entry for entry in entries if is_stationary(entry[0])]
+                        if structures and unit_type == REMOVE:
+                            entries[0][4] = True
+                        elif structures:
+                            structures[0][3] = True
+                    else:
+                        parsed.setdefault(index, []).append([unit_type, player_number, float(uinfo[2]), False, False])
+
+        game_map = self.game_map
+        occupied = game_map.get_occupied_bits()
+        for index in parsed:
+            occupied |= 1 << index
+        while occupied:
+            lowest = occupied & -occupied
+            occupied ^= lowest
+            index = lowest.bit_length() - 1
+            location = [index // ARENA_SIZE, index % ARENA_SIZE]
+            units = game_map[location]
+            entries = parsed.get(index, ())
+            if len(units) == len(entries) and all(
+                    unit.unit_type == entry[0] and unit.player_index == entry[1] and unit.health == entry[2]
+                    and unit.upgraded == entry[3] and unit.pending_removal == entry[4]
+                    for unit, entry in zip(units, entries)):
+                continue
+            if units:
+                game_map.remove_unit(location)
+            for unit_type, player_number, health, upgraded, pending_removal in entries:
+                unit = GameUnit(unit_type, self.config, player_number, health, location[0], location[1])
+                if upgraded:
+                    unit.upgrade()
+                unit.pending_removal = pending_removal
+                game_map.place_unit(unit)
+
+        if self._unit_table is not None:
+            self._unit_table = UnitTable.from_game_map(game_map)
+
+    def __getattr__(self, name):
+        # Only called for missing attributes, so this costs nothing once game_map has been built
+        if name == "game_map" and self.__dict__.get("_unparsed_units") is not None:
+            self.__build_map()
+            return self.game_map
+        raise AttributeError("'{}' object has no attribute '{}'".format(type(self).__name__, name))
+
     def __create_parsed_units(self, units, player_number):
         """
         Helper function for __parse_state to add units to the map.
@@ -142,12 +271,18 @@ class GameState:
                     # Quick fix will deploy engine fix soon
                     if self.contains_stationary_unit([x,y]):
                         self.game_map[x,y][0].pending_removal = True
+                        if self._unit_table is not None:
+                            self._unit_table.refresh_structure([x,y])
                 elif unit_type == UPGRADE:
                     if self.contains_stationary_unit([x,y]):
-                        self.game_map[x,y][0].upgrade()
+                        self.game_map.upgrade_unit([x,y])
+                        if self._unit_table is not None:
+                            self._unit_table.refresh_structure([x,y])
                 else:
                     unit = GameUnit(unit_type, self.config, player_number, hp, x, y)
-                    self.game_map[x,y].append(unit)
+                    self.game_map.place_unit(unit)
+                    if self._unit_table is not None:
+                        self._unit_table.add_unit(unit)
 
     def __resource_required(self, unit_type):
         return self.SP if is_stationary(unit_type) else self.MP
@@ -174,11 +309,9 @@ class GameState:
     def submit_turn(self):
         """Submit and end your turn.
             Must be called at the end of your turn or the algo will hang.
+            Both command lines are sent in one write, then the debug output buffered during the turn is written.
         """
-        build_string = json.dumps(self._build_stack)
-        deploy_string = json.dumps(self._deploy_stack)
-        send_command(build_string)
-        send_command(deploy_string)
+        send_turn(self._build_stack, self._deploy_stack)
 
     def get_resource(self, resource_type, player_index = 0):
         """Gets a players resources
@@ -333,7 +466,7 @@ class GameState:
         stationary = is_stationary(unit_type)
         blocked = self.contains_stationary_unit(location) or (stationary and len(self.game_map[location[0],location[1]]) > 0)
         correct_territory = location[1] < self.HALF_ARENA
-        on_edge = location in (self.game_map.get_edge_locations(self.game_map.BOTTOM_LEFT) + self.game_map.get_edge_locations(self.game_map.BOTTOM_RIGHT))
+        on_edge = EDGE_OF.get((location[0], location[1])) in (self.game_map.BOTTOM_LEFT, self.game_map.BOTTOM_RIGHT)
 
         if self.enable_warnings:
             fail_reason = ""
@@ -445,7 +578,7 @@ class GameState:
                     if resources[SP] >= costs[SP] and resources[MP] >= costs[MP]:
                         self.__set_resource(SP, 0 - costs[SP])
                         self.__set_resource(MP, 0 - costs[MP])
-                        existing_unit.upgrade()
+                        self.game_map.upgrade_unit([x,y])
                         self._build_stack.append((UPGRADE, x, y))
                         spawned_units += 1
             else:
@@ -479,6 +612,9 @@ class GameState:
         """Gets the path a unit at a given location would take. 
         If final point is not on an edge, it is a self destruct path
 
+        Paths are cached by structure layout, start location and target edge, so repeated
+        queries are cheap until a structure is added to or removed from game_map.
+
         Args:
             start_location: The location of a hypothetical unit
             target_edge: The edge the unit wants to reach. game_map.TOP_LEFT, game_map.BOTTOM_RIGHT, etc. Induced from start_location if None.
@@ -495,8 +631,134 @@ class GameState:
         if target_edge is None:
             target_edge = self.get_target_edge(start_location)
 
-        end_points = self.game_map.get_edge_locations(target_edge)
-        return self._shortest_path_finder.navigate_multiple_endpoints(start_location, end_points, self)
+        self._shortest_path_finder.sync_layout(self)
+        return self._find_cached_path(self._shortest_path_finder, start_location, target_edge)
+
+    def _find_cached_path(self, finder, start_location, target_edge):
+        """
+        Looks up or computes the path from an unblocked start_location on the layout currently loaded in finder.
+        """
+        key = (finder.layout_key, int(start_location[0]), int(start_location[1]), target_edge)
+        cached_path = self._path_cache.get(key)
+        if cached_path is None:
+            end_points = self.game_map.get_edge_locations(target_edge)
+            path = finder.navigate(start_location, end_points)
+            self._path_cache[key] = tuple(tuple(location) for location in path[1:])
+            if len(self._path_cache) > self.PATH_CACHE_SIZE:
+                self._path_cache.popitem(last=False)
+            return path
+
+        self._path_cache.move_to_end(key)
+        return [start_location] + [list(location) for location in cached_path]
+
+    def find_paths_from_edges(self, start_locations, target_edge=None):
+        """Gets the paths units at several locations would take, for example every location on your edges.
+
+        All units heading for the same edge share one distance field, as do all units sealed in the same
+        pocket, so pathing all 28 edge locations costs a handful of breadth first searches instead of one per start.
+
+        Args:
+            start_locations: A list of locations of hypothetical units
+            target_edge: The edge the units want to reach. Induced from each start location if None.
+
+        Returns:
+            A list with the path of each start location in the same order, see find_path_to_edge.
+            The entry is None for start locations that are blocked.
+
+        """
+        return [self.find_path_to_edge(location, target_edge) for location in start_locations]
+
+    def get_pocket_index(self):
+        """Gets the pockets of open cells in the current structure layout, see navigation.PocketIndex.
+        The index is built once and reused until a structure is added or removed.
+
+        Returns:
+            The PocketIndex of the current layout
+
+        """
+        self._shortest_path_finder.sync_layout(self)
+        return self._shortest_path_finder.get_pocket_index()
+
+    def can_reach_edge(self, start_location, target_edge=None):
+        """Checks whether a unit at a location can reach its target edge, or would self destruct instead
+
+        Args:
+            start_location: The location of a hypothetical unit
+            target_edge: The edge the unit wants to reach. Induced from start_location if None.
+
+        Returns:
+            True if the unit can reach the edge, False if it would self destruct or the location is blocked
+
+        """
+        if target_edge is None:
+            target_edge = self.get_target_edge(start_location)
+        return self.get_pocket_index().can_reach_edge(start_location, target_edge)
+
+    def get_critical_cells(self, start_locations, target_edge=None):
+        """Gets the open cells whose blocking would change the path of a unit at any of the given locations
+
+        These are the cells of the units' paths. Blocking a cell off the path leaves the path as it is, and
+        every cell that would cut a unit off from its edge lies on its path, see get_cut_cells.
+
+        Args:
+            start_locations: A single location or list of locations of hypothetical units
+            target_edge: The edge the units want to reach. Induced from each start location if None.
+
+        Returns:
+            A sorted list of locations
+
+        """
+        if type(start_locations[0]) == int:
+            start_locations = [start_locations]
+        critical = set()
+        for path in self.find_paths_from_edges(start_locations, target_edge):
+            if path is not None:
+                critical.update((int(x), int(y)) for x, y in path)
+        return [[x, y] for x, y in sorted(critical)]
+
+    def get_cut_cells(self, start_locations, target_edge=None):
+        """Gets the open cells whose blocking would stop a unit at any of the given locations from reaching its edge
+
+        Units that are already sealed off from their edge contribute nothing. Use this to avoid
+        placing structures that would force your own units to self destruct.
+
+        Args:
+            start_locations: A single location or list of locations of hypothetical units
+            target_edge: The edge the units want to reach. Induced from each start location if None.
+
+        Returns:
+            A sorted list of locations. A start location is only included if it cuts off another start.
+
+        """
+        if type(start_locations[0]) == int:
+            start_locations = [start_locations]
+        starts_by_edge = {}
+        for location in start_locations:
+            if self.contains_stationary_unit(location):
+                continue
+            edge = self.get_target_edge(location) if target_edge is None else target_edge
+            starts_by_edge.setdefault(edge, []).append(location)
+
+        self._shortest_path_finder.sync_layout(self)
+        cut_cells = set()
+        for edge, starts in starts_by_edge.items():
+            cut_cells.update(self._shortest_path_finder.find_cut_cells(starts, edge))
+        return [[index // self.ARENA_SIZE, index % self.ARENA_SIZE] for index in sorted(cut_cells)]
+
+    def create_overlay(self):
+        """Creates a StructureOverlay for testing hypothetical structures without changing game_map
+
+        Use it instead of game_map.add_unit when evaluating placements, for example:
+            overlay = game_state.create_overlay()
+            overlay.add_structure(WALL, [13, 11])
+            path = overlay.find_path_to_edge([13, 0])
+            overlay.discard()
+
+        Returns:
+            A new StructureOverlay layered over this state
+
+        """
+        return StructureOverlay(self)
 
     def contains_stationary_unit(self, location):
         """Check if a location is blocked, return structures unit if it is
@@ -512,6 +774,8 @@ class GameState:
             self.warn('Checked for stationary unit outside of arena bounds')
             return False
         x, y = map(int, location)
+        if not self.game_map.structure_bits >> (x * self.ARENA_SIZE + y) & 1:
+            return False
         for unit in self.game_map[x,y]:
             if unit.stationary:
                 return unit
@@ -555,7 +819,7 @@ class GameState:
             return
 
         attacker_location = [attacking_unit.x, attacking_unit.y]
-        possible_locations = self.game_map.get_locations_in_range(attacker_location, attacking_unit.attackRange)
+        possible_locations = self.game_map.get_locations_in_range(attacker_location, attacking_unit.attackRange, "tuple")
         target = None
         target_stationary = True
         target_distance = sys.maxsize
@@ -617,20 +881,33 @@ class GameState:
     def get_attackers(self, location, player_index):
         """Gets the stationary units threatening a given location
 
+        Integer locations on the board are looked up in the threat maps of the attacking player, see get_threat_map.
+        Other locations are checked against every structure in range. Either way only structures are returned,
+        mobile units that deal damage are not.
+
         Args:
             location: The location of a hypothetical defender
             player_index: The index corresponding to the defending player, 0 for you 1 for the enemy
 
         Returns:
-            A list of units that would attack a unit controlled by the given player at the given location
+            A list of the structures that would attack a unit controlled by the given player at the given location
 
         """
 
         if not player_index == 0 and not player_index == 1:
             self._invalid_player_index(player_index)
-        if not self.game_map.in_arena_bounds(location):
+        in_bounds = self.game_map.in_arena_bounds(location)
+        if not in_bounds:
             self.warn("Location {} is not in the arena bounds.".format(location))
 
+        x, y = location
+        if in_bounds and type(x) is int and type(y) is int:
+            attackers = []
+            for attacker_index in (0, 1):
+                if attacker_index != player_index:
+                    attackers.extend(self.get_threat_map(attacker_index).attackers[x * self.ARENA_SIZE + y])
+            return attackers
+
         attackers = []
         """
         Get locations in the range of TURRET units
@@ -639,9 +916,103 @@ class GameState:
         for unit in self.config["unitInformation"]:
             if unit.get('attackRange', 0) >= max_range:
                 max_range = unit.get('attackRange', 0)
-        possible_locations= self.game_map.get_locations_in_range(location, max_range)
+        possible_locations= self.game_map.get_locations_in_range(location, max_range, "tuple")
         for location_unit in possible_locations:
             for unit in self.game_map[location_unit]:
-                if unit.damage_i + unit.damage_f > 0 and unit.player_index != player_index and self.game_map.distance_between_locations(location, location_unit) <= unit.attackRange:
+                if unit.damage_i + unit.damage_f > 0 and unit.stationary and unit.player_index != player_index and self.game_map.distance_between_locations(location, location_unit) <= unit.attackRange:
                     attackers.append(unit)
         return attackers
+
+    def get_threat_map(self, player_index):
+        """Gets the map of the cells threatened by a player's structures, see ThreatMap
+
+        The map is built the first time it is requested and updated as structures are added, removed or upgraded,
+        so damage estimates along a path become a sum of lookups, see ThreatMap.get_path_damage.
+
+        Args:
+            player_index: The index corresponding to the player whose structures attack, 0 for you 1 for the enemy
+
+        Returns:
+            The ThreatMap of that player's structures, up to date with game_map
+
+        """
+        if not player_index == 0 and not player_index == 1:
+            self._invalid_player_index(player_index)
+            return
+        threat_map = self._threat_maps[player_index]
+        threat_map.sync(self.game_map)
+        return threat_map
+
+    def get_unit_table(self):
+        """Gets every unit of the turn stored column by column, see UnitTable
+
+        If BUILD_UNIT_TABLE is set the table is filled while parsing the units, otherwise it is built from
+        game_map the first time it is requested. Either way it is not updated by later changes to game_map,
+        and forks share it.
+
+        Returns:
+            The UnitTable of this turn's units
+
+        """
+        game_map = self.game_map
+        if self._unit_table is None:
+            self._unit_table = UnitTable.from_game_map(game_map)
+        return self._unit_table
+
+    def simulate_action_phase(self, enemy_build_stack=None, enemy_deploy_stack=None):
+        """Simulates the action phase that would follow this turn, see ActionSimulator
+
+        Your structures, upgrades and mobile units are read from game_map, so call this after your attempt_spawn and
+        attempt_upgrade calls. Structures you marked with attempt_remove are removed at the end of the phase.
+
+        Args:
+            enemy_build_stack: A list of (unit_type, x, y) structures, upgrades and removals you expect from your opponent
+            enemy_deploy_stack: A list of (unit_type, x, y) mobile units you expect your opponent to deploy
+
+        Returns:
+            A SimulationResult. This GameState is not changed.
+
+        """
+        removals = [entry for entry in self._build_stack if entry[0] == REMOVE]
+        simulator = ActionSimulator(self.config)
+        return simulator.simulate(self, [removals, enemy_build_stack or []], [[], enemy_deploy_stack or []])
+
+    def simulate_deployments(self, candidates, player_index=0):
+        """Simulates the action phases of many candidate deployments at once, see BatchSimulator
+
+        Each candidate is deployed on its own against the structures on game_map, so this compares
+        spawn locations and unit mixes without a full simulation of each.
+
+        Args:
+            candidates: A list of deploy stacks, each a list of (unit_type, x, y) mobile units
+            player_index: The player deploying the candidates, 0 for you 1 for the enemy
+
+        Returns:
+            A BatchResult with the outcome of each candidate
+
+        """
+        return BatchSimulator(self, player_index).simulate(candidates)
+
+    def estimate_path_damage(self, path, unit_types, player_index=0):
+        """Estimates the damage a stack of mobile units takes following a path, frame by frame, see BatchSimulator.estimate_path
+
+        Unlike summing get_attackers over the path, this accounts for the time each unit type spends on a cell at its speed,
+        the shields given along the path, and each turret attacking only one unit of the stack per frame. The coverage of the
+        opponent's turrets is worked out once and reused by later calls until a structure changes, so it is cheap to
+        estimate the path from every spawn location each turn.
+
+        Args:
+            path: A list of [x, y] locations, such as one from find_path_to_edge
+            unit_types: The mobile unit types in the stack, one entry per unit, such as [SCOUT] * 5
+            player_index: The player the units belong to, 0 for you 1 for the enemy
+
+        Returns:
+            A PathDamage with the damage taken each frame, the frame each unit dies on and the damage done to structures
+            Compare paths with its danger key rather than total_damage, which is the same for every path that destroys the stack
+
+        """
+        game_map = self.game_map
+        estimator = self._path_estimator
+        if estimator is None or estimator[0] is not game_map or estimator[1] != game_map.structure_version or estimator[2] != player_index:
+            estimator = self._path_estimator = (game_map, game_map.structure_version, player_index, BatchSimulator(self, player_index))
+        return estimator[3].estimate_path(path, unit_types)
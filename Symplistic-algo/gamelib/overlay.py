@@ -0,0 +1,180 @@
+from .navigation import ShortestPathFinder
+from .board import ARENA_SIZE
+from .unit import GameUnit
+
+
+class StructureOverlay:
+    """Hypothetical structure changes layered over a GameState without modifying its game_map.
+
+    Structures added or removed here only exist in the overlay. Path and attacker queries see the
+    base layout plus these changes, so candidates such as 'what if I place a turret here' can be
+    evaluated and thrown away without copying the state or desynchronizing game_map.
+
+    The overlay starts from the base state's blocked mask and distance fields and only repairs
+    them around the cells it changes. Paths are stored in the base state's path cache, so a layout
+    seen by any overlay is only pathed once.
+
+    Attributes :
+        * game_state (:obj: GameState): The state this overlay is layered over
+
+    """
+    def __init__(self, game_state):
+        """ Creates an empty overlay
+
+        Args:
+            * game_state (:obj: GameState): The state to layer hypothetical structures over
+
+        """
+        self.game_state = game_state
+        self._added = {}
+        self._removed = set()
+        self._finder = ShortestPathFinder()
+        self._base_layout_key = None
+        self._dirty = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.discard()
+        return False
+
+    def discard(self):
+        """Throws away every hypothetical change, leaving the overlay equal to the base state
+        """
+        self._added.clear()
+        self._removed.clear()
+        self._dirty = True
+
+    def add_structure(self, unit_type, location, player_index=0):
+        """Places a hypothetical structure, replacing any structure already at the location
+
+        Args:
+            unit_type: The type of the structure. Use the constants provided in algo_strategy.
+            location: The [x, y] location of the structure
+            player_index: The index corresponding to the player controlling the structure, 0 for you 1 for the enemy
+
+        Returns:
+            True if the structure was placed
+
+        """
+        if not self.game_state.game_map.in_arena_bounds(location):
+            self.game_state.warn("Could not add {} to the overlay at {}. Location invalid.".format(unit_type, location))
+            return False
+        x, y = map(int, location)
+        unit = GameUnit(unit_type, self.game_state.config, player_index, None, x, y)
+        if not unit.stationary:
+            self.game_state.warn("Could not add {} to the overlay. Only structures can be added.".format(unit_type))
+            return False
+
+        index = x * ARENA_SIZE + y
+        self._added[index] = unit
+        self._removed.discard(index)
+        self._dirty = True
+        return True
+
+    def remove_structure(self, location):
+        """Removes a real or hypothetical structure. Mobile units at the location are unaffected.
+
+        Args:
+            location: The [x, y] location to clear
+
+        Returns:
+            True if there was a structure to remove
+
+        """
+        if not self.contains_stationary_unit(location):
+            return False
+        x, y = map(int, location)
+        index = x * ARENA_SIZE + y
+        self._added.pop(index, None)
+        if self.game_state.contains_stationary_unit([x, y]):
+            self._removed.add(index)
+        self._dirty = True
+        return True
+
+    def contains_stationary_unit(self, location):
+        """Check if a location is blocked in the overlay, return the structure if it is
+
+        Args:
+            location: The location to check
+
+        Returns:
+            A structures unit if there is a stationary unit at the location, False otherwise
+
+        """
+        if not self.game_state.game_map.in_arena_bounds(location):
+            return self.game_state.contains_stationary_unit(location)
+        x, y = map(int, location)
+        index = x * ARENA_SIZE + y
+        if index in self._added:
+            return self._added[index]
+        if index in self._removed:
+            return False
+        return self.game_state.contains_stationary_unit([x, y])
+
+    def find_path_to_edge(self, start_location, target_edge=None):
+        """Gets the path a unit at a given location would take with the hypothetical structures in place.
+        See GameState.find_path_to_edge.
+        """
+        if self.contains_stationary_unit(start_location):
+            self.game_state.warn("Attempted to perform pathing from blocked starting location {}".format(start_location))
+            return
+
+        if target_edge is None:
+            target_edge = self.game_state.get_target_edge(start_location)
+        return self.game_state._find_cached_path(self._get_finder(), start_location, target_edge)
+
+    def find_paths_from_edges(self, start_locations, target_edge=None):
+        """Gets the paths of several units with the hypothetical structures in place.
+        See GameState.find_paths_from_edges.
+        """
+        return [self.find_path_to_edge(location, target_edge) for location in start_locations]
+
+    def can_reach_edge(self, start_location, target_edge=None):
+        """Checks whether a unit can reach its target edge with the hypothetical structures in place.
+        See GameState.can_reach_edge.
+        """
+        if target_edge is None:
+            target_edge = self.game_state.get_target_edge(start_location)
+        return self._get_finder().get_pocket_index().can_reach_edge(start_location, target_edge)
+
+    def get_attackers(self, location, player_index):
+        """Gets the stationary units threatening a given location with the hypothetical structures in place.
+        See GameState.get_attackers.
+        """
+        changed = self._removed.union(self._added)
+        attackers = [unit for unit in self.game_state.get_attackers(location, player_index)
+                     if not (unit.stationary and unit.x * ARENA_SIZE + unit.y in changed)]
+        distance_between_locations = self.game_state.game_map.distance_between_locations
+        for unit in self._added.values():
+            if (unit.damage_i + unit.damage_f > 0 and unit.player_index != player_index and
+                    distance_between_locations(location, [unit.x, unit.y]) <= unit.attackRange):
+                attackers.append(unit)
+        attackers.sort(key=lambda unit: (unit.x, unit.y))
+        return attackers
+
+    def _get_finder(self):
+        """
+        Returns a pathfinder loaded with this overlay's layout. Without changes the base state's finder is shared.
+        """
+        base_finder = self.game_state._shortest_path_finder
+        base_finder.sync_layout(self.game_state)
+        if not self._added and not self._removed:
+            return base_finder
+        if self._dirty or self._base_layout_key != base_finder.layout_key:
+            changed = self._removed.union(self._added)
+            if len(changed) > self._finder.INCREMENTAL_UPDATE_LIMIT:
+                blocked = base_finder.layout_key
+                for index in self._removed:
+                    blocked &= ~(1 << index)
+                for index in self._added:
+                    blocked |= 1 << index
+                self._finder.load_layout(blocked)
+            else:
+                self._finder.copy_from(base_finder)
+                for index in changed:
+                    self._finder.set_blocked(divmod(index, ARENA_SIZE), index in self._added)
+            self._base_layout_key = base_finder.layout_key
+            self._dirty = False
+        return self._finder
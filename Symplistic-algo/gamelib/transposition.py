@@ -0,0 +1,88 @@
+from collections import OrderedDict
+
+
+class TranspositionTable:
+    """A bounded cache for results computed from a board state, such as paths, damage totals or simulation outcomes.
+
+    Keys are usually built from GameMap.zobrist_hash plus whatever else the result depends on, for example
+    (game_state.game_map.zobrist_hash, start_location, target_edge). Once full, the least recently used entry is evicted.
+
+    Attributes :
+        * max_size (int): The number of entries kept before evicting
+        * hits (int): The number of lookups that found an entry
+        * misses (int): The number of lookups that did not
+
+    """
+    def __init__(self, max_size=4096):
+        """ Creates an empty table
+
+        Args:
+            * max_size (int): The number of entries kept before evicting
+
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        """Looks up an entry
+
+        Args:
+            key: The key the value was stored under
+            default: Returned if there is no entry for the key
+
+        Returns:
+            The stored value, or default
+        """
+        entries = self._entries
+        if key in entries:
+            self.hits += 1
+            entries.move_to_end(key)
+            return entries[key]
+        self.misses += 1
+        return default
+
+    def put(self, key, value):
+        """Stores an entry, evicting the least recently used one if the table is full
+
+        Args:
+            key: A hashable key
+            value: The value to store
+        """
+        entries = self._entries
+        entries[key] = value
+        entries.move_to_end(key)
+        if len(entries) > self.max_size:
+            entries.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        """Looks up an entry, computing and storing it if it is missing
+
+        Args:
+            key: A hashable key
+            compute: A function taking no arguments that returns the value for key
+
+        Returns:
+            The stored or newly computed value
+        """
+        entries = self._entries
+        if key in entries:
+            self.hits += 1
+            entries.move_to_end(key)
+            return entries[key]
+        self.misses += 1
+        value = compute()
+        self.put(key, value)
+        return value
+
+    def clear(self):
+        """Removes every entry
+        """
+        self._entries.clear()